@@ -0,0 +1,170 @@
+"""Async facade for blocking disk, git and HTTP work.
+
+Blocking calls run on dedicated thread pools, one per class of I/O, so they
+don't hold up the event loop (and with it the gateway heartbeat), and a slow
+git pull or web request can't starve disk writes. Calls with the same key, like
+writes to the same file, run one at a time in the order they were made.
+
+    contents = await aio.run(aio.HTTP, requests.get, url)
+    await aio.write_text(fn, text)
+    aio.write_soon(fn, text)  # from sync code, see flush
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+import weakref
+
+
+logger = logging.getLogger('discord.' + __name__)
+
+DISK = 'disk'
+GIT = 'git'
+HTTP = 'http'
+# threads per class, git gets one so pulls and log reads never overlap
+_sizes = {DISK: 2, GIT: 1, HTTP: 4}
+
+
+class _Pool:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.executor = concurrent.futures.ThreadPoolExecutor(size, thread_name_prefix='tdt-' + name)
+        self._lock = threading.Lock()  # the counters are updated from the pool's threads too
+        self.queued = 0      # calls waiting for a thread
+        self.running = 0
+        self.done = 0
+        self.errors = 0
+        self.max_queued = 0
+        self.wait = 0.0      # seconds calls spent waiting for a thread, in total
+        self.busy = 0.0      # seconds spent running calls, in total
+
+    def _call(self, submitted, func, args, kwargs):
+        start = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait += start - submitted
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.done += 1
+                self.busy += time.monotonic() - start
+
+    def start(self, func, args, kwargs):
+        # returns a concurrent.futures.Future, no event loop needed
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        return self.executor.submit(self._call, time.monotonic(), func, args, kwargs)
+
+    def submit(self, func, args, kwargs):
+        return asyncio.wrap_future(self.start(func, args, kwargs))
+
+    def stats(self):
+        with self._lock:
+            return dict(pool=self.name, threads=self.size, queued=self.queued, running=self.running,
+                        done=self.done, errors=self.errors, max_queued=self.max_queued,
+                        wait=self.wait, busy=self.busy)
+
+
+_pools = dict()  # class -> _Pool
+_tails = weakref.WeakKeyDictionary()  # loop -> key -> task of the last call made with key
+_pending = set()  # futures of soon and write_soon
+
+
+def pool(kind):
+    if kind not in _pools:
+        _pools[kind] = _Pool(kind, _sizes.get(kind, 2))
+    return _pools[kind]
+
+
+async def run(kind, func, *args, **kwargs):
+    """Run the blocking func(*args, **kwargs) on the thread pool for kind and return its result"""
+    return await pool(kind).submit(func, args, kwargs)
+
+
+def start(kind, func, *args, **kwargs):
+    """Start func(*args, **kwargs) on the thread pool for kind without waiting for it, also
+    before the event loop runs. Returns a concurrent.futures.Future."""
+    return pool(kind).start(func, args, kwargs)
+
+
+def _chain(key, kind, func, args, kwargs):
+    # queue the call behind the last one with key right away, so calls run in the order they were made
+    tails = _tails.setdefault(asyncio.get_event_loop(), dict())
+    previous = tails.get(key)
+
+    async def call():
+        if previous is not None:
+            await asyncio.wait([previous])  # its result or error is for its own caller
+        return await run(kind, func, *args, **kwargs)
+    task = tails[key] = asyncio.ensure_future(call())
+    return task
+
+
+async def serialized(key, kind, func, *args, **kwargs):
+    """Like run, but only after the calls made earlier with the same key have finished"""
+    # shielded, a caller giving up doesn't take the call out of the queue
+    return await asyncio.shield(_chain(key, kind, func, args, kwargs))
+
+
+def _write_text(fn, text):
+    # write a temporary file and move it into place, so readers never see half a file
+    tmp = fn + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, fn)
+
+
+async def write_text(fn, text):
+    """Write text to fn on the disk threads, after the earlier writes to fn"""
+    await serialized(os.path.realpath(fn), DISK, _write_text, fn, text)
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _done(future):
+    _pending.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error('Background write failed: {}'.format(future.exception()))
+
+
+def soon(key, kind, func, *args, **kwargs):
+    """serialized for sync code: queued if the loop is running, run right away otherwise.
+    Returns the future of the queued call, or None if it already ran."""
+    if _running_loop() is None:
+        func(*args, **kwargs)
+        return None
+    future = _chain(key, kind, func, args, kwargs)
+    _pending.add(future)
+    future.add_done_callback(_done)
+    return future
+
+
+def write_soon(fn, text):
+    """write_text for sync code, see soon"""
+    return soon(os.path.realpath(fn), DISK, _write_text, fn, text)
+
+
+async def flush():
+    """Wait for the writes queued by soon and write_soon"""
+    if _pending:
+        await asyncio.wait(list(_pending))
+
+
+def stats():
+    return [p.stats() for p in _pools.values()]
@@ -2,31 +2,44 @@ import asyncio
 import datetime
 import discord  # type: ignore
 import logging
-import time
+from . import aio
 from . import git_manage
+from . import outbound
 from .param import roles
-from .helpers import localize
+from .helpers import localize, Chunker
 
 logger = logging.getLogger('discord.' + __name__)
 
 
-async def split_send(channel, message, deliminator='\n', n=2000, style=''):
-    """Split a message into chunks and send them in chunks."""
+async def achunk_lines(lines, deliminator='\n', n=2000, style=''):
+    """Async generator of chunks of at most n characters packed from an (async) iterable of lines"""
+    chunker = Chunker(deliminator, n, style)
+    if hasattr(lines, '__aiter__'):
+        async for line in lines:
+            for chunk in chunker.feed(line):
+                yield chunk
+    else:
+        for line in lines:
+            for chunk in chunker.feed(line):
+                yield chunk
+    for chunk in chunker.flush():
+        yield chunk
+
+
+async def split_send(channel, message, deliminator='\n', n=2000, style='', priority=outbound.FUN):
+    """Split a message (string or (async) iterable of lines) into chunks and send them in order.
+    Chunks are queued as soon as they fill up, so streamed lines don't have to be collected first.
+    Returns the sent messages, or None if there was nothing to send."""
+    if isinstance(message, str):
+        if not message:
+            return
+        message = message.split(deliminator)
     out = []
-    if not message:
+    async for chunk in achunk_lines(message, deliminator, n, style):
+        out.append(outbound.send(channel, chunk, priority=priority, merge=False))
+    if not out:
         return
-    if not type(message) in [tuple, list]:
-        message = message.split(deliminator)
-    msg = message.pop(0)
-    while message:
-        tmp = message.pop(0)
-        if len(msg + deliminator + tmp + style * 2) >= n:
-            out.append(await channel.send(style + msg + style))
-            msg = tmp
-        else:
-            msg += deliminator + tmp
-    out.append(await channel.send(style + msg + style))
-    return out
+    return list(await asyncio.gather(*out))
 
 
 async def sleep(dt):
@@ -35,7 +48,7 @@ async def sleep(dt):
         await asyncio.sleep(dt)
     except discord.HTTPException:
         dt -= (datetime.datetime.now() - now).total_seconds()
-        time.sleep(dt)
+        await asyncio.sleep(max(dt, 0))
     return
 
 
@@ -76,7 +89,7 @@ async def wait_until(dt):
 
 async def git_log(channel, *args):
     """Print git log to discord chat."""
-    await split_send(channel, git_manage.git_log_items(), style='```')
+    await split_send(channel, await aio.run(aio.GIT, git_manage.git_log_items), style='```')
 
 
 async def parse_payload(payload, bot, *fields):
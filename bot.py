@@ -1,4 +1,5 @@
 import asyncio
+from collections import OrderedDict
 import datetime
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
@@ -7,12 +8,25 @@ import logging
 import os
 import pytz  # type: ignore
 import sys  # type: ignore # noqa: F401
+import time
 import traceback  # type: ignore # noqa: F401
+from . import aio
 from . import param
 from . import helpers
 from . import async_helpers
 from . import git_manage
-from .config.users import get_all_user_config_files, UserConfig
+from . import guild_index
+from . import metrics
+from . import outbound
+from . import replay
+from .resolver import MemberResolver
+from .role_queue import RoleEditQueue
+from .warmup import Warmup
+from .scheduler import Scheduler
+from .member_jobs import MemberJobs
+from .watchdog import Watchdog
+from .config.users import UserConfig
+from .config.users.store import store as user_store
 from .version import usingV2
 
 
@@ -26,6 +40,11 @@ def cog_list():
     return [i for i in glob(out) if os.path.split(i)[-1][0] != '_']
 
 
+def cog_names():
+    """Extension names of the cogs in cog_list (as submodules of our base module)"""
+    return [__package__ + '.cogs.' + os.path.split(cog)[-1].split('.')[0] for cog in cog_list()]
+
+
 class MainBot(commands.Bot):
     """The class that is the TDTbot"""
     def __init__(self, *args, reissue=None, startup=None, **kwargs):
@@ -41,17 +60,48 @@ class MainBot(commands.Bot):
             # Otherwise we run into issues reusing a closed loop.
             kwargs['loop'] = asyncio.new_event_loop()
         kwargs['case_insensitive'] = True
+        if usingV2 and 'http_trace' not in kwargs:
+            # lets the outbound buckets follow discord's rate limit headers
+            kwargs['http_trace'] = outbound.trace_config()
         super().__init__(*args, **kwargs)
         self._emoji_role_data = []
+        # message_id -> emoji key -> list of enrollments, see enroll_emoji_role
+        self._emoji_role_index = {}
+        # cog name -> its enrollments, dropped when the cog is removed (or reloaded)
+        self._emoji_role_cogs = {}
         self._emoji_dm_targets = {}
-        #self._em
+        # message_id -> helpers.MessageInfo for the most recent messages, see envelope
+        self._envelopes = OrderedDict()
+        self.resolver = MemberResolver(self)
+        # open the user store (importing the JSON configs the first time) off the event loop
+        aio.start(aio.DISK, user_store)
+        self.role_queue = RoleEditQueue()
+        # cogs register their init tasks here, they are run once we're ready
+        self.warmup = Warmup()
+        # persistent timed jobs, cogs register the handlers
+        self.scheduler = Scheduler()
+        # bulk role changes and kicks, resumed after a reboot, see member_jobs.py
+        self.member_jobs = MemberJobs(self)
+        self.warmup.register('member_jobs', self.member_jobs.resume)
+        # handler latencies and event/REST counters, see _run_event, invoke and the stats command
+        self.metrics = metrics.registry()
+        self.http.request = self.metrics.wrap_request(self.http.request)
+        # reports calls that block the event loop
+        self.watchdog = Watchdog(self)
+        # record the gateway events from startup on for offline replays, see replay.py
+        self.recorder = None
+        if param.rc('event_record'):
+            self.recorder = replay.Recorder(self._connection, param.rc('event_record'))
+            self.recorder.start()
         self.usingV2 = usingV2
+        # extension name -> seconds it took to import and set up, see load_cogs
+        self.cog_timings = dict()
         # add all our cogs via load_extension
         if not usingV2:
-            for cog in cog_list():
-                # ensure that cogs is a submodule of our base module
-                cog = __package__ + '.cogs.' + os.path.split(cog)[-1].split('.')[0]
+            for cog in cog_names():
+                start = time.perf_counter()
                 self.load_extension(cog)
+                self.cog_timings[cog] = time.perf_counter() - start
 
         @self.event
         async def on_ready():
@@ -64,17 +114,18 @@ class MainBot(commands.Bot):
             await self.change_presence(activity=activity)
             # add all our cogs via load_extension
             if usingV2:
-                for cog in cog_list():
-                    # ensure that cogs is a submodule of our base module
-                    cog = __package__ + '.cogs.' + os.path.split(cog)[-1].split('.')[0]
-                    await self.load_extension(cog)
+                await self.load_cogs()
+            self.watchdog.start()
+            self.scheduler.start()
+            self.warmup.start()
+            await self.metrics.serve(param.rc('metrics_port'))
             if self.reissue is not None:
                 logger.info('Reissue detected.')
                 now = pytz.utc.localize(datetime.datetime.now())
                 await asyncio.sleep(1)
                 hour, week = helpers.hour, helpers.week
-                look_back = min(now - hour, self.startup, git_manage.last_updated())
-                log = git_manage.git_log_items(look_back=max(look_back, now - week))
+                look_back = min(now - hour, self.startup, await aio.run(aio.GIT, git_manage.last_updated))
+                log = await aio.run(aio.GIT, git_manage.git_log_items, look_back=max(look_back, now - week))
                 logger.info('Reboot complete.')
                 channel = self.find_channel(self.reissue.channel.id)
                 if log:
@@ -94,18 +145,52 @@ class MainBot(commands.Bot):
         @self.event
         async def on_raw_reaction_add(payload):
             """Handle emoji reactions"""
-            for args_, kwargs_ in self._emoji_role_data:
+            for args_, kwargs_ in self._emoji_role_targets(payload):
                 await self.emoji2role(payload, *args_, **kwargs_)
 
         @self.event
         async def on_raw_reaction_remove(payload):
             """Handle emoji reactions"""
-            kwargs = {}
-            for args_, kwargs_ in self._emoji_role_data:
-                kwargs.update(kwargs_)
+            for args_, kwargs_ in self._emoji_role_targets(payload):
+                kwargs = dict(kwargs_)
                 kwargs['delete'] = True
                 await self.emoji2role(payload, *args_, **kwargs)
 
+    def dispatch(self, event_name, *args, **kwargs):
+        self.metrics.event(event_name)
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        # every listener (ours and the cogs') runs through here, time it as its own handler
+        name = coro.__qualname__
+        if '<locals>' in name:
+            name = type(self).__name__ + '.' + coro.__name__
+        with self.metrics.timed('listener', name):
+            await super()._run_event(coro, event_name, *args, **kwargs)
+
+    async def on_error(self, event_method, *args, **kwargs):
+        self.metrics.error()
+        await super().on_error(event_method, *args, **kwargs)
+
+    async def invoke(self, ctx):
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        with self.metrics.timed('command', ctx.command.qualified_name) as stats:
+            await super().invoke(ctx)
+        # invoke hands command errors to on_command_error instead of raising them
+        if ctx.command_failed:
+            stats.errors += 1
+
+    async def close(self):
+        if self.recorder is not None:
+            self.recorder.stop()
+        self.watchdog.stop()
+        # write out the data changed since the last flush
+        param.flush_all()
+        await aio.flush()
+        await self.metrics.stop()
+        await super().close()
+
     async def bot_check(self, ctx):
         """Run a check to see if we should respond to the given command."""
         if ctx.channel.name in param.rc('ignore_list'):
@@ -133,56 +218,234 @@ class MainBot(commands.Bot):
         if hasattr(channel, 'id'):
             return channel
 
+    @property
+    def prefixes(self):
+        """Command prefixes as a tuple (usable with str.startswith)"""
+        prefix = self.command_prefix
+        if isinstance(prefix, str):
+            return (prefix,)
+        try:
+            return tuple(prefix)
+        except TypeError:
+            return ()
+
+    def envelope(self, message):
+        """Return the shared helpers.MessageInfo for a message, classifying it on
+        first request so each listener doesn't redo the same checks"""
+        try:
+            return self._envelopes[message.id]
+        except KeyError:
+            pass
+        info = helpers.MessageInfo(message, self.user, self.prefixes)
+        self._envelopes[message.id] = info
+        while len(self._envelopes) > 256:
+            self._envelopes.popitem(last=False)
+        return info
+
+    async def on_guild_available(self, guild):
+        guild_index.rebuild(guild)
+
+    async def on_guild_join(self, guild):
+        guild_index.rebuild(guild)
+
+    async def on_guild_remove(self, guild):
+        guild_index.drop(guild)
+
+    async def on_guild_channel_create(self, channel):
+        guild_index.channel_added(channel)
+
+    async def on_guild_channel_delete(self, channel):
+        guild_index.channel_removed(channel)
+
+    async def on_guild_channel_update(self, before, after):
+        guild_index.channel_updated(before, after)
+
+    async def on_guild_role_create(self, role):
+        guild_index.role_added(role)
+
+    async def on_guild_role_delete(self, role):
+        guild_index.role_removed(role)
+
+    async def on_guild_role_update(self, before, after):
+        guild_index.role_updated(before, after)
+
+    async def on_guild_emojis_update(self, guild, before, after):
+        guild_index.emojis_updated(guild, after)
+
+    async def on_member_join(self, member):
+        self.resolver.forget(member.id, member.guild)
+
+    async def on_member_remove(self, member):
+        self.resolver.forget(member.id, member.guild)
+
     async def on_command_completion(self, ctx):
         logger.debug('Command "{0.command}" invoked by {0.author}.'.format(ctx))
 
     async def on_command_error(self, ctx):
         logger.error('Command "{0.command}" failed. Invoked by {0.author}.'.format(ctx))
 
-    async def get_user_configs(self):
-        files = get_all_user_config_files()
+    async def get_user_configs(self, has_key=None):
+        return [c async for c in self.iter_user_configs(has_key=has_key)]
 
-        async def get_user(fn):
-            return await self.fetch_user(int(os.path.split(fn)[-1].split('.')[0]))
+    async def iter_user_configs(self, has_key=None, concurrency=16):
+        """Yield the UserConfig of every user in the user store, in the order their users resolve.
+        The configs are read in one query off the event loop and users resolved through the
+        cache, at most concurrency at a time. If has_key is given, only configs containing it
+        are yielded."""
+        semaphore = asyncio.Semaphore(concurrency)
 
-        return [UserConfig(await get_user(f)) for f in files]
+        async def load(user_id, data):
+            async with semaphore:
+                user = await self.get_or_fetch_user(user_id)
+                if user is None:
+                    logger.info('No user found for config {}'.format(user_id))
+                    return None
+                return UserConfig(user, data=data)
+
+        configs = await user_store().aload_all(has_key)
+        tasks = [asyncio.ensure_future(load(user_id, data)) for user_id, data in configs.items()]
+        try:
+            for task in asyncio.as_completed(tasks):
+                config = await task
+                if config is not None:
+                    yield config
+        finally:
+            for task in tasks:
+                task.cancel()
 
     async def get_or_fetch_user(self, user_id, guild=None, fallback=False):
+        """Member of guild if possible, otherwise the user, with the given id.
+        Lookups are cached (including misses) by self.resolver."""
         if isinstance(guild, discord.ext.commands.Context):
             guild = guild.guild
         if isinstance(guild, int):
-            try:
-                guild = [i for i in self.guilds if i.id == guild][0]
-            except IndexError:
-                guild = None
+            guild = self.get_guild(guild)
+        out = None
         if guild is not None:
-            out = guild.get_member(user_id)
-            if out is not None:
-                return out
-            try:
-                out = await guild.fetch_member(user_id)
-            except discord.errors.NotFound:
-                out = None
-            if out is not None:
-                return out
-        out = self.get_user(user_id)
-        if out is not None:
-            return out
-        try:
-            out = await self.fetch_user(user_id)
-        except discord.errors.NotFound:
-            out = None
+            out = await self.resolver.resolve(user_id, guild)
+        if out is None:
+            out = await self.resolver.resolve(user_id)
         if fallback and out is None:
             return user_id
-        return None
+        return out
+
+    async def load_cogs(self):
+        """Load all cogs concurrently (v2), timing each one in self.cog_timings"""
+        async def load(cog):
+            start = time.perf_counter()
+            try:
+                await self.load_extension(cog)
+            except commands.ExtensionError as e:
+                logger.error('Could not load {}: {}'.format(cog, e))
+            self.cog_timings[cog] = time.perf_counter() - start
 
-    def enroll_emoji_role(self, *args, **kwargs):
-        """Enroll a function to handle an emoji reaction"""
+        # on_ready runs again after a reconnect, but the cogs are already loaded
+        start = time.perf_counter()
+        await asyncio.gather(*[load(cog) for cog in cog_names() if cog not in self.extensions])
+        logger.info('Loaded cogs in {:.2f} s'.format(time.perf_counter() - start))
+
+    async def hot_reload(self, pull=False):
+        """Reload the cog modules in this process, keeping the gateway connection and caches.
+
+        Cogs that define export_state() -> dict and import_state(state) hand their
+        in-memory state to their reloaded version. The warm-up tasks the new cogs
+        register are run right away (they should skip work the imported state makes
+        unnecessary). Only cog modules are reloaded, changes elsewhere still need a
+        full reboot.
+        Returns the names of the reloaded extensions."""
+        if pull:
+            await aio.run(aio.GIT, git_manage.update)
+        # write out the buffered changes of the old cogs before they close their files
+        param.flush_all()
+        await aio.flush()
+        states = dict()
+        for name, cog in list(self.cogs.items()):
+            if hasattr(cog, 'export_state'):
+                try:
+                    states[name] = cog.export_state()
+                except Exception as e:
+                    logger.error('Could not export state of {}: {}'.format(name, e))
+            # the new cog reopens these
+            for value in vars(cog).values():
+                if isinstance(value, param.PermaDict):
+                    value.close()
+        reloaded = []
+        for ext in list(self.extensions):
+            try:
+                if usingV2:
+                    await self.reload_extension(ext)
+                else:
+                    self.reload_extension(ext)
+                reloaded.append(ext)
+            except commands.ExtensionError as e:
+                logger.error('Could not reload {}: {}'.format(ext, e))
+        for name, cog in self.cogs.items():
+            if name in states and hasattr(cog, 'import_state'):
+                cog.import_state(states[name])
+        self.warmup.start()
+        logger.info('Hot reloaded ' + ', '.join(reloaded))
+        return reloaded
+
+    def enroll_emoji_role(self, *args, cog=None, **kwargs):
+        """Enroll a function to handle an emoji reaction, for as long as cog (if given) is loaded"""
         if not args:
             raise ValueError("Must provide at least one argument")
         if not isinstance(args[0], dict):
             raise ValueError("First argument must be a dict")
-        self._emoji_role_data.append((args, kwargs))
+        entry = (args, kwargs)
+        if entry in self._emoji_role_data:
+            return
+        self._emoji_role_data.append(entry)
+        if cog is not None:
+            self._emoji_role_cogs.setdefault(cog.qualified_name, []).append(entry)
+        # index by message id and then by every key the dict's emojis can match,
+        # enrollments without a message id are checked against every reaction
+        keys = self._emoji_role_index.setdefault(kwargs.get('message_id'), {})
+        # a fixed emoji overrides the payload's, so it has to see every reaction
+        if kwargs.get('emoji') is not None:
+            index = [None]
+        else:
+            index = [k for e in args[0] for k in helpers.emoji_keys(e)]
+        for key in index:
+            entries = keys.setdefault(key, [])
+            if entry not in entries:
+                entries.append(entry)
+
+    def drop_emoji_roles(self, cog_name):
+        """Remove the emoji role enrollments of a cog"""
+        dropped = self._emoji_role_cogs.pop(cog_name, [])
+        if not dropped:
+            return
+        self._emoji_role_data = [i for i in self._emoji_role_data if not any(i is j for j in dropped)]
+        for message_id, keys in list(self._emoji_role_index.items()):
+            for key, entries in list(keys.items()):
+                entries[:] = [i for i in entries if not any(i is j for j in dropped)]
+                if not entries:
+                    del keys[key]
+            if not keys:
+                del self._emoji_role_index[message_id]
+
+    if usingV2:
+        async def remove_cog(self, name, **kwargs):
+            self.drop_emoji_roles(name)
+            return await super().remove_cog(name, **kwargs)
+    else:
+        def remove_cog(self, name):
+            self.drop_emoji_roles(name)
+            return super().remove_cog(name)
+
+    def _emoji_role_targets(self, payload):
+        """Return the enrollments whose message and emoji match a reaction payload"""
+        out = []
+        for message_id in [payload.message_id, None]:
+            keys = self._emoji_role_index.get(message_id)
+            if not keys:
+                continue
+            for key in helpers.emoji_keys(payload.emoji) + [None]:
+                for entry in keys.get(key, []):
+                    if not any(entry is i for i in out):
+                        out.append(entry)
+        return out
 
     async def emoji2role(self, payload, emoji_dict, emoji=None, message_id=None,
                          member=None, guild=None, min_role=None, delete=False,
@@ -204,7 +467,7 @@ class MainBot(commands.Bot):
             return
         # make sure we have a guild and member
         if guild is None:
-            guild = [g for g in self.guilds if g.id == payload.guild_id][0]
+            guild = self.get_guild(payload.guild_id)
         if isinstance(guild, int):
             guild = self.guilds[guild]
         if member is None:
@@ -240,27 +503,27 @@ class MainBot(commands.Bot):
             key = keys[0]
             role0 = emoji_dict[key]
             role = helpers.find_role(guild, role0)
+            others = []
             if remove is not None:
                 if not isinstance(remove, list) and not isinstance(remove, tuple):
                     remove = [remove]
-
                 for i in remove:
                     if not isinstance(i, discord.Role):
                         i = helpers.find_role(guild, i)
-                    if i == role:
-                        continue
-                    await member.remove_roles(i)
+                    if i is not None and i != role:
+                        others.append(i)
             try:
+                # role changes are merged per member by the queue into one edit
                 if delete:
                     logger.info('Delete (role): {}->{}->{}'.format(key, role0, role))
-                    await member.remove_roles(role)
+                    self.role_queue.change(member, remove=others + [role])
                 else:
                     # if we get here, we've uniquely matched the emoji to a role
                     if send_message is not None:
                         await member.send(send_message)
                         accept_string = helpers.clean_string(accept_string)
                         self._emoji_dm_targets[member.id] = accept_string, target
-                    await member.add_roles(role)
+                    self.role_queue.change(member, add=[role], remove=others)
                 return role
             except AttributeError:
                 logger.info('Role attr err: {}->{}->{}'.format(key, role0, role))
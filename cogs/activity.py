@@ -1,13 +1,17 @@
-import asyncio
 import datetime
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
 import logging
 import pickle
 import os
+from .. import aio
+from .. import member_jobs
 from .. import param
+from .. import warmup
 from ..version import usingV2
 from ..helpers import epoch, int_time, find_role, localize
+from ..history import HistoryCrawler
+from ..day_counts import DayCounts, MESSAGES, REACTIONS
 from ..async_helpers import admin_check, split_send
 from .supporters import supporters_fn
 
@@ -17,47 +21,131 @@ logger = logging.getLogger('discord.' + __name__)
 _days_inactive = 14
 _limit = 5000
 _dbm = os.path.split(os.path.split(os.path.realpath(__file__))[0])[0]
+_crawl_fn = os.path.join(_dbm, 'config', 'activity_history')
 _dbm = os.path.join(_dbm, 'config', 'activity.dbm')
 _epoch = epoch
 
 
 class _ActivityFile(param.IntPermaDict):
-    def update_activity(self, user_id, in_time=None):
-        now = int_time(in_time=in_time)
-        if user_id in self:
+    """Last activity time of every user. The times are kept in memory (self.times), updates
+    are written to the database in batches with the DataContainers, see param.flush_all"""
+    def __init__(self, fn, resolver):
+        self.resolver = resolver
+        super().__init__(fn)
+        self.times = self._load()
+        self._pending = dict()  # user id -> time not written yet
+        self._queued = dict()   # future of a queued write -> the updates it writes
+
+    def _load(self):
+        out = dict()
+        with self.lock:
+            rows = self.db.execute('SELECT key, value FROM items').fetchall()
+        for user_id, value in rows:
             try:
-                self[user_id] = max(now, self[user_id])
+                out[user_id] = pickle.loads(value)
             except pickle.UnpicklingError:
-                self[user_id] = now
-        else:
-            self[user_id] = now
+                pass
+        return out
+
+    def update_activity(self, user_id, in_time=None):
+        now = int_time(in_time=in_time)
+        if now > self.times.get(user_id, 0):
+            self.times[user_id] = self._pending[user_id] = now
+            param.mark_dirty(self)
+
+    def flush(self):
+        """Write the pending updates on aio's disk threads"""
+        if not self._pending or self.closed:
+            return
+        pending, self._pending = self._pending, dict()
+        future = aio.soon(self.fn, aio.DISK, self._write, pending)
+        if future is not None:
+            self._queued[future] = pending
+            future.add_done_callback(lambda f: self._queued.pop(f, None))
+
+    def _write(self, pending):
+        with self.lock:
+            if self.closed:
+                return  # close wrote them
+            with self.batch():
+                for user_id, t in pending.items():
+                    self[user_id] = t
+
+    def close(self):
+        """Write the pending and queued updates right away, cancel the queued writes and close"""
+        with self.lock:
+            if not self.closed:
+                pending = dict()
+                for future, queued in list(self._queued.items()):
+                    future.cancel()
+                    pending.update(queued)
+                pending.update(self._pending)
+                if pending:
+                    self._write(pending)
+                self._pending = dict()
+            super().close()
+
+    def arrays(self):
+        """(user ids, last seen seconds) of everyone in the data, as numpy arrays"""
+        import numpy as np
+        n = len(self.times)
+        return (np.fromiter(self.times.keys(), np.int64, n),
+                np.fromiter(self.times.values(), np.int64, n))
 
     def inactive(self, dt=None, return_dict=False):
         if dt is None:
             dt = datetime.timedelta(days=_days_inactive)
-        dt = int(dt.total_seconds())
-        now = int_time()
+        ids, last = self.arrays()
+        mask = int_time() - last > int(dt.total_seconds())
         if return_dict:
-            return {int(i): self.get(i, 0) for i in self.file
-                    if now - self.get(i, 0) > dt}
-        else:
-            return [int(i) for i in self if now - self.get(i, 0) > dt]
-
-    async def fetch_and_sort(self, guild, inactive=None, dt=None):
-        if inactive is None:
-            inactive = self.inactive(dt=dt, return_dict=True)
-        inactive = sorted(inactive.items(), key=lambda x: x[1])
-        out = []
-        for i in inactive:
-            member = guild.get_member(i[0])
-            if member is None:
-                try:
-                    member = await guild.fetch_member(i[0])
-                except discord.errors.NotFound:
-                    continue
-            if member is not None:
-                out.append([member, _epoch + datetime.timedelta(seconds=i[1])])
-        return out
+            return dict(zip(ids[mask].tolist(), last[mask].tolist()))
+        return ids[mask].tolist()
+
+    async def last_seen(self, guild, dt=None):
+        """_LastSeen of the members of guild inactive for longer than dt"""
+        members = await self.resolver.resolve_many(self.inactive(dt=dt), guild)
+        return _LastSeen([m for m in members.values() if m is not None], self.times)
+
+
+class _LastSeen:
+    """Column table of members: user id, last seen and join time (seconds since epoch,
+    0 if unknown), top role id and position, and whether they are bots. The rows line
+    up with self.members, queries are masks over the columns."""
+    def __init__(self, members, times):
+        import numpy as np
+        n = len(members)
+        self.members = members
+        self.ids = np.fromiter((m.id for m in members), np.int64, n)
+        self.last = np.fromiter((times.get(m.id, 0) for m in members), np.int64, n)
+        self.joined = np.fromiter((int_time(m.joined_at) if m.joined_at else 0 for m in members), np.int64, n)
+        self.top = np.fromiter((m.top_role.id for m in members), np.int64, n)
+        self.top_position = np.fromiter((m.top_role.position for m in members), np.int64, n)
+        self.bot = np.fromiter((m.bot for m in members), bool, n)
+        # (row, role id) pairs for role masks
+        pairs = [(i, r.id) for i, m in enumerate(members) for r in m.roles]
+        self._role_rows = np.array([p[0] for p in pairs], np.int64)
+        self._role_ids = np.array([p[1] for p in pairs], np.int64)
+
+    def has_role(self, *roles):
+        """Mask of the members with any of roles"""
+        import numpy as np
+        mask = np.zeros(len(self.members), bool)
+        mask[self._role_rows[np.isin(self._role_ids, [r.id for r in roles])]] = True
+        return mask
+
+    def top_role_in(self, *roles):
+        import numpy as np
+        return np.isin(self.top, [r.id for r in roles])
+
+    def select(self, mask=None):
+        """Rows in mask (default: all of them), least recently active first"""
+        import numpy as np
+        rows = np.arange(len(self.members)) if mask is None else np.flatnonzero(mask)
+        return rows[np.argsort(self.last[rows], kind='stable')]
+
+    def rows(self, index):
+        """[member, last seen datetime] of the rows in index"""
+        return [[self.members[i], _epoch + datetime.timedelta(seconds=int(self.last[i]))] for i in index]
 
 
 class Activity(commands.Cog):
@@ -65,94 +153,72 @@ class Activity(commands.Cog):
         self.bot = bot
         self._last_member = None
         self._kicks = []
-        self.data = _ActivityFile(_dbm)
+        self.data = _ActivityFile(_dbm, bot.resolver)
+        self._crawl_marks = param.IntPermaDict(_crawl_fn)
+        self.crawler = HistoryCrawler(self._crawl_marks, depth=_limit)
+        # messages and reactions per member per day
+        self.days = DayCounts()
         self._init = False
         self._init_finished = False
         self._debug = debug
         self._cached_search = None
         self._my_role = None
+        bot.warmup.register('activity', self._async_init, priority=warmup.COSMETIC, after=['events'])
+
+    def export_state(self):
+        """State handed to the reloaded cog, see MainBot.hot_reload"""
+        # an unfinished history crawl dies with the old cog, the new one resumes it from its checkpoints
+        return dict(kicks=self._kicks, init=self._init_finished, debug=self._debug,
+                    cached_search=self._cached_search, my_role=self._my_role)
+
+    def import_state(self, state):
+        self._kicks = state['kicks']
+        self._init = self._init_finished = state['init']
+        self._debug = state['debug']
+        self._cached_search = state['cached_search']
+        self._my_role = state['my_role']
+
+    def cog_unload(self):
+        # writes out the activity times, nothing written behind may run after this
+        self.data.close()
+        self._crawl_marks.close()
 
     async def cog_check(self, ctx):
         """Don't allow everyone to access this cog"""
         return await admin_check(ctx)
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._async_init()
-
     async def _async_init(self):
         if self._init:
             return
         self._init = True
-        data = await self._hist_search(limit=100, use_ids=True, save=True)
-        for i in data:
-            self.data.update_activity(i, data[i])
-        data = await self._hist_search(limit=_limit, use_ids=True, save=True)
-        for i in data:
-            self.data.update_activity(i, data[i])
+        await self._crawl_history()
         try:
             self._my_role = (await self.bot.get_or_fetch_user(self.bot.user.id)).top_role
         except AttributeError:
             pass
         self._init_finished = True
 
-    async def _hist_search(self, guild=None, members=None, limit=1000, use_ids=False,
-                           ctx=None, save=None):
+    async def _crawl_history(self, guild=None):
+        """Update the activity data with the messages posted since the last crawl"""
         if guild is None:
-            if ctx is None:
-                guild = [g for g in self.bot.guilds if g.name == "The Dream Team"][0]
-            else:
-                guild = ctx.guild
-        if members is None:
-            members = guild.members
+            guild = [g for g in self.bot.guilds if g.name == "The Dream Team"][0]
+        members = {m.id for m in guild.members}
         data = dict()
-        # get all channels with a history attribute
-        channels = [i for i in guild.channels if hasattr(i, "history")]
-        oldest = datetime.datetime.utcnow()  # store the oldest time parsed
-        old_af = _epoch  # just some really old date
-        for channel in channels:
-            try:
-                # loop through messages in history (limit 1000 messages per channel)
-                async for msg in channel.history(limit=limit):
-                    # update oldest
-                    oldest = min(localize(oldest), localize(msg.created_at))
-                    # add/update data for message author
-                    if msg.author in members:
-                        key = msg.author
-                        if use_ids:
-                            key = key.id
-                        try:
-                            # use the most recent date
-                            data[key] = max(localize(data[key]), localize(msg.created_at))
-                        except KeyError:
-                            data[key] = msg.created_at
-            except discord.Forbidden:
-                # We do not have permission to read this channel's history
-                logger.debug("Cannot read channel {0}.".format(channel))
-        # make sure we have data for each member
-        for member in members:
-            key = member
-            if use_ids:
-                key = key.id
-            if key not in data:
-                # use join date if it's more recent than oldest
-                try:
-                    if localize(member.joined_at) > oldest:
-                        data[key] = member.joined_at
-                    else:
-                        data[key] = old_af
-                        logger.debug('old af: {}'.format(member))
-                except TypeError:
-                    print("no member join date", member)
-                    data[key] = old_af
-                    logger.debug('old af: {}'.format(member))
-        if save is None and self._cached_search is None:
-            save = True
-        if save:
-            self._cached_search = data.copy()
-            self._cached_search['use_ids'] = use_ids
-        return data
+
+        def found(msg):
+            if msg.author.id in members:
+                self.data.update_activity(msg.author.id, msg.created_at)
+                self.days.add_history(msg.author.id, msg.created_at)
+                if msg.author.id not in data or localize(msg.created_at) > localize(data[msg.author.id]):
+                    data[msg.author.id] = msg.created_at
+
+        await self.crawler.crawl([i for i in guild.channels if hasattr(i, "history")], found)
+        # members that never posted count as active when they joined
+        for member in guild.members:
+            if member.id not in self.data.times:
+                self.data.update_activity(member.id, member.joined_at or _epoch)
+        self._cached_search = data
+        self._cached_search['use_ids'] = True
 
     @commands.command()
     async def inactivity(self, ctx, role: discord.Role = None, dt: int = None):
@@ -163,13 +229,12 @@ class Activity(commands.Cog):
             dt = datetime.timedelta(seconds=-1)
         else:
             dt = datetime.timedelta(days=dt)
-        items = await self.data.fetch_and_sort(ctx.guild, dt=dt)
+        table = await self.data.last_seen(ctx.guild, dt=dt)
         if role in ['none', 'None']:
             role = None
-        if role is not None:
-            items = [i for i in items if role in i[0].roles]
-        msg = ['{0.display_name} {1}'.format(i[0], i[1].date().isoformat())
-               for i in items]
+        items = table.rows(table.select(table.has_role(role) if role is not None else None))
+        msg = ('{0.display_name} {1}'.format(i[0], i[1].date().isoformat())
+               for i in items)
         await split_send(ctx, msg, style='```')
 
     @commands.command()
@@ -194,35 +259,33 @@ class Activity(commands.Cog):
         await ctx.send("Hold on while I purge the activity data.")
         com = find_role(ctx.guild, roles.community)
         com_p = find_role(ctx.guild, roles.community_plus)
-        items = await self.data.fetch_and_sort(ctx.guild, dt=datetime.timedelta(days=30))
-        items = [i for i in items if i[0].top_role in [com, com_p]]
+        table = await self.data.last_seen(ctx.guild, dt=datetime.timedelta(days=30))
+        mask = table.top_role_in(*[r for r in [com, com_p] if r is not None])
 
         output = []
-        errors = []
+
+        if skip_supporters:
+            import numpy as np
+            support = param.IntPermaDict(supporters_fn)
+            supporter = np.isin(table.ids, support.keys())
+            support.close()
+            if self._debug:
+                output += ['{0.display_name} in supporters (last active {1})'.format(m, date.isoformat())
+                           for m, date in table.rows(table.select(mask & supporter))]
+            mask &= ~supporter
+        items = table.rows(table.select(mask))
 
         recruit = find_role(ctx.guild, roles.recruit)
+        ops = []
         for m, date in items:
-            if skip_supporters:
-                support = param.IntPermaDict(supporters_fn)
-                if m.id in support:
-                    if self._debug:
-                        output.append('{0.display_name} in supporters (last active {1})'.format(m, date.isoformat()))
-                    continue
-            if not self._debug:
-                _roles = [r for r in m.roles if r > recruit]
-
-                try:
-                    if self._my_role and m.top_role > self._my_role:
-                        raise discord.Forbidden()
-                    await m.remove_roles(*_roles)
-                    await m.add_roles(recruit)
-                    output.append('{0.display_name} demoted (last active {1})'.format(m, date))
-                except discord.Forbidden:
-                    errors.append('⚠️{0.display_name} cannot be demoted (last active {1})'.format(m, date))
-            else:
-                output.append('{0.display_name} (not) demoted (last active {1})'.format(m, date))
-        await split_send(ctx, errors + output)
-        return
+            if self._my_role and m.top_role > self._my_role:
+                output.insert(0, '⚠️{0.display_name} cannot be demoted (last active {1})'.format(m, date))
+                continue
+            ops.append(member_jobs.roles_op(m, add=[recruit], remove=[r for r in m.roles if r > recruit],
+                                            reason='Inactivity', note='last active {}'.format(date.date())))
+        if output:
+            await split_send(ctx, output)
+        await self._run_job(ctx, 'purge', ops)
 
     @commands.command()
     async def full_purge(self, ctx, role: discord.Role = None):
@@ -233,39 +296,38 @@ class Activity(commands.Cog):
         if not self._debug:
             await self._async_init()
         recruit = find_role(ctx.guild, roles.recruit)
-        items = await self.data.fetch_and_sort(ctx.guild)
-        if role is not None:
-            items = [i for i in items if role in i[0].roles]
-
-        lowers = []
-        output = []
-
-        for i in items:
-            if i[0].top_role == recruit:
-                output.append(await self._clear_roles(*i))
-            elif i[0].top_role <= recruit:
-                if i[0].top_role.name not in ['Lone Wolf'] and not i[0].bot:
-                    lowers.append(i)
-                elif not i[0].bot:
-                    logger.info('Skipping', i)
-        await split_send(ctx, output)
+        table = await self.data.last_seen(ctx.guild)
+        mask = table.has_role(role) if role is not None else True
+        recruits = mask & (table.top == recruit.id)
+        below = mask & ~recruits & (table.top_position <= recruit.position) & ~table.bot
+        lone_wolves = table.top_role_in(*[r for r in ctx.guild.roles if r.name == 'Lone Wolf'])
+        for i in table.rows(table.select(below & lone_wolves)):
+            logger.info('Skipping {}'.format(i))
+        lowers = table.rows(table.select(below & ~lone_wolves))
+
+        ops = [member_jobs.roles_op(m, remove=[r for r in m.roles if r.name not in ['@everyone', 'Nitro Booster']],
+                                    reason='Inactivity', note='last active {}'.format(date.date()))
+               for m, date in table.rows(table.select(recruits))]
+        await self._run_job(ctx, 'full_purge', ops)
 
         for i in lowers:
             await self._prompt_kick(*i)
 
-        return
-
-    async def _clear_roles(self, m, dt, debug=None):
-        if debug is None:
-            debug = self._debug
-        _roles = [r for r in m.roles if r.name not in ['@everyone', 'Nitro Booster']]
-        if not debug:
-            await m.remove_roles(_roles, reason='Inactivity')
-        date = dt.date().isoformat()
-        if not debug:
-            return '{0.display_name} demoted (last active {1})'.format(m, date)
-        else:
-            return '{0.display_name} (not) demoted (last active {1})'.format(m, date)
+    async def _run_job(self, ctx, title, ops):
+        """Run the member operations as a job, in debug mode only show what it would do"""
+        jobs = self.bot.member_jobs
+        job = jobs.plan(ctx.guild, title, ops)
+        if self._debug:
+            await split_send(ctx, jobs.diff(job) or ['Nothing to do.'], style='```')
+            await ctx.send('Dry run, start it with `{}member_job {} run` (until the next reboot).'.format(
+                ctx.prefix, job['id']))
+            return
+        job = await jobs.run(job, ctx.channel)
+        failed = jobs.failures(job)
+        if failed:
+            await split_send(ctx, ['⚠️' + i for i in failed])
+        if job['state'] == member_jobs.CANCELLED:
+            await ctx.send(jobs.summary(job))
 
     async def _prompt_kick(self, m, dt, channel=None):
         if channel is None:
@@ -279,14 +341,15 @@ class Activity(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message(self, message):
+        # the history crawl is started by the warm-up, not by the first message
         self.data.update_activity(message.author.id)
-        if not self._init:
-            await self._async_init()
+        self.days.add(message.author.id, MESSAGES)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
         """Parse reactions"""
         self.data.update_activity(payload.user_id)
+        self.days.add(payload.user_id, REACTIONS)
         # if reaction is to a kick quarry
         ids = [k[0].id for k in self._kicks]
         if payload.message_id in ids:
@@ -307,10 +370,46 @@ class Activity(commands.Cog):
                         await msg.add_reaction('👌')
                         return
 
+    @commands.command()
+    async def activity_by_role(self, ctx, weeks: int = 4, n: int = 15):
+        """<weeks (optional:4)> <n (optional:15)> messages per week of the n most active roles, newest week first"""
+        import numpy as np
+        per_week = self.days.weekly(weeks)
+        # one extra all-zero row for the members without counts (row -1)
+        per_week = np.vstack([per_week, np.zeros((1, per_week.shape[1]), per_week.dtype)])
+        lines = []
+        for role in ctx.guild.roles:
+            if role.is_default() or not role.members:
+                continue
+            sums = per_week[self.days.rows_of([m.id for m in role.members])].sum(axis=0)
+            lines.append((int(sums.sum()), role.name, sums))
+        lines = sorted(lines, key=lambda x: x[0], reverse=True)[:n]
+        fmt = '{:24}' + ' {:>6}' * per_week.shape[1]
+        msg = [fmt.format('role', *['-{}w'.format(i) if i else 'this' for i in range(per_week.shape[1])])]
+        msg += [fmt.format(name[:24], *sums.tolist()) for _, name, sums in lines]
+        await split_send(ctx, msg, style='```')
+
+    @commands.command()
+    async def activity_drop(self, ctx, percent: int = 80, days: int = 30, minimum: int = 10):
+        """<percent (optional:80)> <days (optional:30)> <minimum (optional:10)> members whose messages
+        in the last days dropped by at least percent from the days before (with at least minimum then)"""
+        import numpy as np
+        recent = self.days.totals(0, days)
+        before = self.days.totals(days, 2 * days)
+        rows = np.flatnonzero((before >= max(minimum, 1)) & (recent * 100 <= before * (100 - percent)))
+        rows = rows[np.argsort(recent[rows] / before[rows], kind='stable')]
+        msg = []
+        for row in rows:
+            member = ctx.guild.get_member(int(self.days.ids[row]))
+            if member is not None:
+                msg.append('{}: {} -> {} messages'.format(member.display_name, before[row], recent[row]))
+        await split_send(ctx, msg or ['Nobody.'], style='```')
+
     @commands.command()
     async def activity_init_status(self, ctx):
         """Shows the status of the activity init."""
-        await ctx.send('init = {0._init}, init_finished = {0._init_finished}.'.format(self))
+        await ctx.send('init = {0._init}, init_finished = {0._init_finished}, crawled {1.messages} messages '
+                       'with {1.requests} history requests.'.format(self, self.crawler))
 
     @commands.command()
     async def parse_cached(self, ctx, member: discord.Member = None):
@@ -331,7 +430,7 @@ class Activity(commands.Cog):
         if member is None:
             member = ctx.author
         name = member.display_name
-        value = self.data[member.id]
+        value = self.data.times[member.id]
         date = _epoch + datetime.timedelta(seconds=value)
         msg = ' '.join([str(i) for i in [name, value, date]])
         await ctx.send(msg)
@@ -1,8 +1,8 @@
+import asyncio
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
 import os
 import logging
-import time
 from typing import Union
 from ..param import PermaDict
 from ..helpers import emotes_equal, find_channel
@@ -67,8 +67,15 @@ class AdminTools(commands.Cog):
             await rxns[0].clear()
 
     @commands.command()
-    async def reboot(self, ctx):
-        """Reboots this bot"""
+    async def reboot(self, ctx, mode: str = None):
+        """<"hot" (optional)> Reboots this bot. A hot reboot pulls updates and reloads
+        the cogs without disconnecting."""
+        if mode == 'hot':
+            await ctx.send("Ok. Pulling updates and reloading cogs.")
+            reloaded = await self.bot.hot_reload(pull=True)
+            msg = 'Reloaded ' + ', '.join([i.split('.')[-1] for i in reloaded])
+            await ctx.send(msg)
+            return
         await ctx.send("Ok. I will reboot now.")
         logger.info('\nRebooting\n\n\n\n')
         self.bot.reissue = ctx
@@ -93,15 +100,12 @@ class AdminTools(commands.Cog):
         await channel.send(message)
 
     def _add_sticky(self, msg):
-        self.stickies[msg.channel.id] = self.stickies.get(msg.channel.id, []) + [msg.id]
+        self.stickies.update(msg.channel.id, lambda ids: ids + [msg.id], [])
 
     def _rm_sticky(self, message_id, channel_id):
-        try:
-            self.stickies[channel_id].pop(message_id)
-        except IndexError:
-            pass
-        if not self.stickies[channel_id]:
-            self.stickies.delete(channel_id)
+        with self.stickies.batch():
+            if not self.stickies.update(channel_id, lambda ids: [i for i in ids if i != message_id], []):
+                self.stickies.delete(channel_id)
 
     @commands.command()
     async def sticky(self, ctx, message, channel: discord.TextChannel = None,
@@ -123,20 +127,9 @@ class AdminTools(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message(self, message):
-        sleep = False
-        if message.author == self.bot.user:
-            sleep = True
-        else:
-            try:
-                if message.content.startswith(self.bot.command_prefix):
-                    sleep = True
-            except TypeError:
-                for prefix in self.bot.command_prefix:
-                    if message.content.startswith(prefix):
-                        sleep = True
-                        break
-        if sleep:
-            time.sleep(1)
+        info = self.bot.envelope(message)
+        if info.is_self or info.is_command:
+            await asyncio.sleep(1)
         if message.channel.id in self.stickies:
             if message.id in self.stickies[message.channel.id]:
                 return
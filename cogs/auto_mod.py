@@ -1,9 +1,10 @@
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
-import asyncio
 from .. import param  # roles
 from ..helpers import find_role
 from ..async_helpers import split_send
+from .. import outbound
+from .. import warmup
 from ..version import usingV2
 import logging
 import re
@@ -41,6 +42,14 @@ class AutoMod(commands.Cog):
         self._mentions = None
         self._coc_link = None
         self._last_spam = None
+        bot.warmup.register('auto_mod', self._async_init, priority=warmup.MODERATION)
+
+    def export_state(self):
+        """State handed to the reloaded cog, see MainBot.hot_reload"""
+        return dict(last_spam=self._last_spam)
+
+    def import_state(self, state):
+        self._last_spam = state['last_spam']
 
     async def _async_init(self):
         if self._init:
@@ -49,11 +58,6 @@ class AutoMod(commands.Cog):
         self.mentions
         self._init = True
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._async_init()
-
     @property
     def mentions(self):
         if self._mentions is None:
@@ -77,26 +81,22 @@ class AutoMod(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message(self, message):
+        info = self.bot.envelope(message)
         # ignore messages from this bot
-        if message.author == self.bot.user:
+        if info.is_self:
             return
         if message.channel.id == param.channels.banning_channel:
             msg = ["Auto banning message ({:}):".format(message.channel.mention),
                    "```{:}```".format(message.content),
                    "From: {:} ({:}, {:})".format(message.author.mention, message.author.name, message.author.id),
                    ]
-            await split_send(self.log_channel, msg)
+            await split_send(self.log_channel, msg, priority=outbound.MODERATION)
             await message.delete()
             await message.author.ban(reason="Auto ban: message in banning channel")
             return
         # ignore commands
-        try:
-            if message.content.startswith(self.bot.command_prefix):
-                return
-        except TypeError:
-            for prefix in self.bot.command_prefix:
-                if message.content.startswith(prefix):
-                    return
+        if info.is_command:
+            return
         for search in _searches:
             if re.search(search, message.content):
                 if self._last_spam:
@@ -126,10 +126,10 @@ class AutoMod(commands.Cog):
                        "In: {:} ({:})".format(message.channel.mention, message.channel.name),
                        "{:}".format(self.mentions),
                        ]
-                log_msg = (await split_send(self.log_channel, msg))[-1]
+                log_msg = (await split_send(self.log_channel, msg, priority=outbound.MODERATION))[-1]
                 msg = "I have parsed this message as spam as against the Code of Conduct (CoC) and deleted it.\n"
                 msg += "Please read the CoC: " + await self.fetch_coc_link()
-                await message.channel.send(msg, reference=message)
+                await outbound.send(message.channel, msg, reference=message, priority=outbound.MODERATION)
                 self._last_spam = _Spam(message.author.id, message.content, log_msg, 1)
                 await message.delete()
                 return
@@ -149,10 +149,12 @@ class AutoMod(commands.Cog):
                 if not BAN_TDT:
                     msg += "\n\nPlease check their account for legitimacy."
                     msg += "\nYou can right click (or long press) on the mention to initiate a ban."
-                    await self.log_channel.send(msg.format(member.mention, member.id))
+                    await outbound.send(self.log_channel, msg.format(member.mention, member.id),
+                                        priority=outbound.MODERATION)
                 else:
                     msg += "\nBanning them now."
-                    await self.log_channel.send(msg.format(member.mention, member.id))
+                    await outbound.send(self.log_channel, msg.format(member.mention, member.id),
+                                        priority=outbound.MODERATION)
                     await member.ban(reason="Intimidating TDT")
                 break
 
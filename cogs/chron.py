@@ -6,7 +6,7 @@ from discord.ext import commands  # type: ignore
 import logging
 from .. import param
 # from ..helpers import *
-from ..async_helpers import admin_check, wait_until
+from ..async_helpers import admin_check
 from ..version import usingV2
 
 logger = logging.getLogger('discord.' + __name__)
@@ -17,6 +17,7 @@ _mesome = param.users.mesome
 class ChronTask:
     def __init__(self, cog, freq, offset, func, *args, context=True, **kwargs):
         self.cog = cog
+        self.name = '{}:{}'.format(freq.lower(), getattr(func, '__name__', func))
         self.freq = freq.lower()
         if isinstance(offset, dict):
             offset = datetime.timedelta(**offset)
@@ -33,8 +34,24 @@ class ChronTask:
         self.context = context
         self.tz = pytz.timezone(param.rc('timezone'))
 
+    def next_run(self):
+        """Next time (UTC) this task is due"""
+        dt = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.freq == 'monthly':
+            next = (dt.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        elif self.freq == 'weekly':
+            next = dt + datetime.timedelta(days=7-dt.weekday())
+        elif self.freq == 'daily':
+            next = dt + datetime.timedelta(days=1)
+        else:
+            raise ValueError('Invalid frequency')
+        next = self.tz.localize(next + self.offset)
+        return next.astimezone(pytz.utc).replace(tzinfo=None)
+
     def enroll(self):
-        self.cog.bot.loop.create_task(self.proc())
+        """Schedule the next run, unless it is already scheduled (e.g. from before a reboot)"""
+        self.cog.bot.scheduler.schedule('chron:' + self.name, 'chron.run', self.next_run(),
+                                        replace=False, name=self.name)
 
     async def proc(self):
         args = self.args[:]
@@ -43,23 +60,13 @@ class ChronTask:
         if self.context:
             if not args:
                 args.append(self.context)
-            elif not isinstance(args[0], discord.Context):
+            elif not isinstance(args[0], commands.Context):
                 args.insert(0, self.context)
-        dt = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        if self.freq == 'monthly':
-            next = dt.replace(month=dt.month + 1, day=1)
-        elif self.freq == 'weekly':
-            next = dt + datetime.timedelta(days=7-dt.weekday())
-        elif self.freq == 'daily':
-            next = dt + datetime.timedelta(days=1)
-        else:
-            raise ValueError('Invalid frequency')
-        next = self.tz.localize(next + self.offset)
-        next = next.astimezone(pytz.utc).replace(tzinfo=None)
-        await wait_until(next)
-        await self.func(args, **self.kwargs)
-        await asyncio.sleep(2)
-        self.enroll()
+        try:
+            await self.func(*args, **self.kwargs)
+        finally:
+            await asyncio.sleep(2)
+            self.enroll()
 
 
 class Chron(commands.Cog):
@@ -71,6 +78,8 @@ class Chron(commands.Cog):
             ChronTask(self, 'monthly', dict(hours=9), self.list_supporters),
             ChronTask(self, 'weekly', dict(hours=9, days=6), 'aar'),
         ]
+        bot.warmup.register('chron', self._async_init)
+        bot.scheduler.handler('chron.run', self._run_job)
 
     @property
     def channel(self):
@@ -86,10 +95,11 @@ class Chron(commands.Cog):
         """Don't allow everyone to access this cog"""
         return await admin_check(ctx)
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._async_init()
+    async def _run_job(self, name):
+        for task in self.tasks:
+            if task.name == name:
+                return await task.proc()
+        logger.warning('No chron task named {}'.format(name))
 
     async def _async_init(self):
         if self._init:
@@ -3,12 +3,12 @@ from discord.ext import commands  # type: ignore
 import datetime
 import logging
 import os
-import requests
 from urllib import request
 from urllib.parse import urlparse, parse_qs
+from .. import aio
 from .. import param
 from ..param import PermaDict, channels
-from ..helpers import int_time, parse_message
+from ..helpers import int_time
 from ..async_helpers import admin_check, split_send
 # from ..twitter import tweet
 from ..version import usingV2
@@ -42,10 +42,18 @@ def twitch_url(channel=None):
 
 # https://stackoverflow.com/a/67969583/2275975
 def ttv_streaming(channel=None):
+    import requests
     contents = requests.get(twitch_url(channel)).content.decode('utf-8')
     return 'isLiveBroadcast' in contents
 
 
+def tdt_video(url):
+    """Whether the YouTube video at url is from the TDT channel"""
+    with request.urlopen(url) as response:
+        # set the correct charset below
+        return _channel_tag in response.read().decode('utf-8')
+
+
 # https://stackoverflow.com/a/54383711/2275975
 # noinspection PyTypeChecker
 def extract_video_id(url):
@@ -100,10 +108,11 @@ class Content(commands.Cog):
         if yt_id in self.videos:
             return False
         now = int_time()
-        self.videos[yt_id] = now
-        del_list = [i for i in self.videos.keys() if self.videos[i] < now - _month]
-        for i in del_list:
-            self.videos.pop(i)
+        with self.videos.batch():
+            self.videos[yt_id] = now
+            for i, t in self.videos.items():
+                if t < now - _month:
+                    self.videos.delete(i)
         return True
 
     @commands.Cog.listener()
@@ -112,50 +121,39 @@ class Content(commands.Cog):
         # ignore messages outside listening_channels
         if message.channel.id not in _listening_channels:
             return
+        info = self.bot.envelope(message)
         # ignore commands
-        try:
-            if message.content.startswith(self.bot.command_prefix):
-                return
-        except TypeError:
-            for prefix in self.bot.command_prefix:
-                if message.content.startswith(prefix):
-                    return
+        if info.is_command:
+            return
         # ignore messages from this bot
-        if message.author == self.bot.user:
+        if info.is_self:
             return
-        data = parse_message(message)
-        for i in data['urls']:
+        for i in info.urls:
             i = i.rstrip('/').strip()
             # if twitch url is streaming
             if i == twitch_url():
-                if ttv_streaming(i):
+                if await aio.run(aio.HTTP, ttv_streaming, i):
                     now = datetime.datetime.utcnow()
                     if self._ttv_cooldown is not None:
                         if self._ttv_cooldown > now:
                             continue
                     await self.channel.send(i + ' now streaming')
-                    tweet('We are live!\n' + i)
+                    await aio.run(aio.HTTP, tweet, 'We are live!\n' + i)
                     self._ttv_cooldown = now + _ttv_cooldown
                 continue
             yt_id = extract_video_id(i)
             if yt_id:
                 continue
-                tdt_channel = False
-                with request.urlopen(i) as response:
-                    # set the correct charset below
-                    tdt_channel = _channel_tag in response.read().decode('utf-8')
-                if tdt_channel:
-                    if self._add_yt_id(yt_id):
+                if await aio.run(aio.HTTP, tdt_video, i):
+                    if await self.videos.run(self._add_yt_id, yt_id):
                         await self.channel.send('watching ' + i)
-                        tweet(i)
+                        await aio.run(aio.HTTP, tweet, i)
                 continue
 
     @commands.command()
     async def clear_yt_data(self, ctx):
         """Clear YouTube data"""
-        keys = self.videos.keys()
-        for key in keys:
-            self.videos.delete(key)
+        self.videos.clear()
 
     @commands.command()
     async def print_yt_data(self, ctx):
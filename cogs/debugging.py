@@ -1,9 +1,11 @@
+import datetime
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
 import logging
 from ..helpers import find_channel
 from ..async_helpers import admin_check, split_send
-from .. import git_manage
+from .. import aio
+from .. import outbound
 from ..version import usingV2
 
 
@@ -60,12 +62,128 @@ class Debugging(commands.Cog):
     @commands.command()
     async def reload_cogs(self, ctx, option=None):
         """Reloads all cogs that were added as extensions"""
-        if option == 'pull':
-            git_manage.update()
-        msg = 'Reloading ' + ', '.join([i.split('.')[-1] for i in self.bot.extensions])
-        for i in self.bot.extensions:
-            self.bot.reload_extension(i)
-        await ctx.send(msg.rstrip(', '))
+        reloaded = await self.bot.hot_reload(pull=option == 'pull')
+        await ctx.send('Reloaded ' + ', '.join([i.split('.')[-1] for i in reloaded]))
+
+    @commands.command()
+    async def role_queue_stats(self, ctx):
+        """Shows how many role API calls the role edit queue has saved"""
+        stats = self.bot.role_queue.stats()
+        msg = 'Role changes requested: {requested}, edits issued: {issued}, ' \
+              'no-op flushes: {skipped}, calls saved: {saved}, pending members: {pending}'
+        await ctx.send(msg.format(**stats))
+
+    @commands.command()
+    async def outbound_stats(self, ctx):
+        """Shows how many messages the outbound scheduler has sent and merged"""
+        msg = 'Messages sent: {sent}, merged into other messages: {merged}, ' \
+              'busy channels: {channels}, queued: {queued}'
+        await ctx.send(msg.format(**outbound.scheduler().stats()))
+
+    # discord.py rejects cog methods named cog_*, the command keeps its name
+    @commands.command(name='cog_timings')
+    async def load_timings(self, ctx):
+        """Shows how long each cog took to load, slowest first"""
+        timings = sorted(self.bot.cog_timings.items(), key=lambda x: x[1], reverse=True)
+        msg = ['{:7.3f} s  {}'.format(t, name.split('.')[-1]) for name, t in timings]
+        msg.append('{:7.3f} s  sum'.format(sum(self.bot.cog_timings.values())))
+        await split_send(ctx, msg, style='```')
+
+    @commands.command()
+    async def warmup(self, ctx):
+        """Shows the state of the startup warm-up tasks, in run order"""
+        msg = ['{:16} {:8} {}'.format(name, state, '' if t is None else '{:.2f} s'.format(t))
+               for name, state, t in self.bot.warmup.status()]
+        await split_send(ctx, msg or ['No warm-up tasks.'], style='```')
+
+    @commands.command()
+    async def jobs(self, ctx, prefix: str = ''):
+        """<prefix (optional)> Shows scheduler stats and the pending jobs whose keys start with prefix"""
+        stats = self.bot.scheduler.stats()
+        msg = ['Pending: {pending}, ran: {ran}, skipped: {skipped}, handlers: {handlers}'.format(**stats)]
+        jobs = sorted(self.bot.scheduler.jobs.items(), key=lambda x: x[1]['when'])
+        fmt = '{} {} ({})'
+        for key, job in jobs:
+            if key.startswith(prefix):
+                when = datetime.datetime.utcfromtimestamp(job['when']).isoformat(' ', 'minutes')
+                msg.append(fmt.format(when, key, job['handler']))
+        await split_send(ctx, msg, style='```')
+
+    @commands.command()
+    async def member_jobs(self, ctx):
+        """Shows the bulk member jobs (purges, role adds) and their progress"""
+        jobs = self.bot.member_jobs
+        msg = [jobs.summary(jobs.get(job_id)) for job_id in jobs.ids()]
+        await split_send(ctx, msg or ['No member jobs.'], style='```')
+
+    @commands.command()
+    async def member_job(self, ctx, job_id: str, action: str = 'diff'):
+        """<job id> <diff|run|cancel|forget> shows the pending changes of a member job, runs
+        (or resumes) it, stops it or deletes it"""
+        jobs = self.bot.member_jobs
+        job = jobs.get(job_id)
+        if job is None:
+            await ctx.send('No member job {}.'.format(job_id))
+            return
+        if action == 'run':
+            job = await jobs.run(job, ctx.channel)
+            await split_send(ctx, ['⚠️' + i for i in jobs.failures(job)] or [jobs.summary(job)])
+        elif action == 'cancel':
+            job = jobs.cancel(job_id)
+            await ctx.send(jobs.summary(job) if job is not None else 'No member job {}.'.format(job_id))
+        elif action == 'forget':
+            jobs.forget(job_id)
+            await ctx.send('Deleted member job {}.'.format(job_id))
+        else:
+            await split_send(ctx, [jobs.summary(job)] + jobs.diff(job), style='```')
+
+    @commands.command()
+    async def stats(self, ctx, sort: str = 'p95', n: int = 25):
+        """<sort (optional:p95)> <n (optional:25)> Shows handler latencies, errors and REST calls
+        (sort by calls, errors, rest, p50, p95, p99, max or total)"""
+        m = self.bot.metrics
+        if sort not in ['calls', 'errors', 'rest', 'p50', 'p95', 'p99', 'max', 'total']:
+            await ctx.send('Unknown sort key "{}".'.format(sort))
+            return
+
+        def ms(value):
+            return '-' if value is None else '{:.0f}'.format(value * 1000)
+
+        events = sum(m.events.values())
+        header = '{:>6} {:>4} {:>5} {:>6} {:>6} {:>6}  {}'
+        lag = 'Loop lag p50 {} ms, p99 {} ms, max {} ms, stalls: {}'
+        msg = ['Events: {}, REST requests: {}, handlers: {}'.format(events, m.rest, len(m.handlers)),
+               lag.format(ms(m.loop_lag.percentile(0.5)), ms(m.loop_lag.percentile(0.99)), ms(m.loop_lag.max),
+                          m.stalls),
+               header.format('calls', 'err', 'rest', 'p50', 'p95', 'p99', 'handler (ms)')]
+        for row in m.rows(sort)[:n]:
+            msg.append('{:6} {:4} {:5} {:>6} {:>6} {:>6}  {}'.format(
+                row['calls'], row['errors'], row['rest'], ms(row['p50']), ms(row['p95']), ms(row['p99']),
+                row['name']))
+        await split_send(ctx, msg, style='```')
+
+    @commands.command()
+    async def io_stats(self, ctx):
+        """Shows the queues of the thread pools running blocking disk, git and HTTP calls"""
+        fmt = '{:5} {:>7} {:>6} {:>7} {:>6} {:>6} {:>8} {:>8}'
+        msg = [fmt.format('pool', 'threads', 'queued', 'running', 'done', 'errors', 'wait s', 'busy s')]
+        for p in aio.stats():
+            msg.append(fmt.format(p['pool'], p['threads'], '{}/{}'.format(p['queued'], p['max_queued']),
+                                  p['running'], p['done'], p['errors'], '{:.1f}'.format(p['wait']),
+                                  '{:.1f}'.format(p['busy'])))
+        await split_send(ctx, msg, style='```')
+
+    @commands.command()
+    async def event_record(self, ctx, option: str = None):
+        """<stop (optional)> Shows or stops the gateway event recording (see the event_record param)"""
+        recorder = self.bot.recorder
+        if recorder is None:
+            await ctx.send('Not recording, set the event_record param and reboot to record.')
+            return
+        if option == 'stop':
+            recorder.stop()
+        state = 'Recording' if recorder.recording else 'Recorded'
+        await ctx.send('{} {} events to {}.'.format(state, recorder.count, recorder.fn))
 
     @commands.command()
     async def print(self, ctx, *args):
@@ -124,13 +242,15 @@ class Debugging(commands.Cog):
             channel = find_channel(ctx.guild, channel)
         else:
             channel = ctx.channel
-        hist = [h async for h in channel.history(limit=n)]
-        msg = ["Item {0:d} {1.id}\n{1.content}".format(i + 1, m)
-               for i, m in enumerate(hist)]
-        if not msg:
-            msg = ["No history available."]
-        print(msg)
-        await split_send(ctx, msg)
+
+        async def rows():
+            i = 0
+            async for m in channel.history(limit=n):
+                i += 1
+                yield "Item {0:d} {1.id}\n{1.content}".format(i, m)
+
+        if not await split_send(ctx, rows()):
+            await ctx.send("No history available.")
 
     @commands.command()
     async def channel_pins(self, ctx, channel: discord.TextChannel = None):
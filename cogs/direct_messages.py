@@ -5,8 +5,9 @@ import logging
 import os
 from .. import param
 from ..config import UserConfig
-from ..helpers import find_role, emotes_equal, clean_string
+from ..helpers import find_role, find_emoji, emotes_equal, clean_string
 from ..async_helpers import admin_check, parse_payload, split_send
+from .. import outbound
 from ..version import usingV2
 
 
@@ -33,24 +34,20 @@ class DirectMessages(commands.Cog):
         self._init = False
         self._init_finished = False
         self._chancla = None
-        my_config = self._get_config()
-        if "ignore" not in my_config:
-            my_config["ignore"] = []
+        bot.warmup.register('direct_messages', self._async_init)
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._async_init()
+    def export_state(self):
+        """State handed to the reloaded cog, see MainBot.hot_reload"""
+        return dict(kicks=self._kicks)
+
+    def import_state(self, state):
+        self._kicks = state['kicks']
 
     async def _async_init(self):
         if self._init:
             return
         self._init = True
-        guild = self.bot.tdt()
-        try:
-            self._chancla = [e for e in guild.emojis if e.name == "Chancla"][0]
-        except IndexError:
-            pass
+        self._chancla = find_emoji(self.bot.tdt(), "Chancla")
         self._init_finished = True
 
     @property
@@ -64,15 +61,17 @@ class DirectMessages(commands.Cog):
             return False
         return ctx.channel == self.channel
 
-    def _get_config(self, user=None):
-        """Get a user's config file"""
+    async def _get_config(self, user=None):
+        """Get a user's config file, read off the event loop the first time"""
         if user is None:
             user = self.bot.user
         try:
             return self._configs[user.id]
         except KeyError:
-            self._configs[user.id] = UserConfig(user)
-            return self._configs[user.id]
+            config = self._configs.setdefault(user.id, await UserConfig.aload(user))
+            if user == self.bot.user:
+                config.set_if_not_set("ignore", [])
+            return config
 
     def __getitem__(self, item):
         return self.data[item]
@@ -123,13 +122,14 @@ class DirectMessages(commands.Cog):
         else:
             users = [user]
         out = []
-        config = self._get_config()
+        config = await self._get_config()
         for user in users:
             if user.id in config['ignore']:
                 out.append("{} already in ignore list".format(user))
                 continue
             config['ignore'].append(user.id)
             out.append("Added {} to ignore list".format(user))
+        config.mark_dirty()
         await split_send(ctx, out)
 
     @commands.command()
@@ -147,19 +147,20 @@ class DirectMessages(commands.Cog):
         else:
             users = [user]
         out = []
-        config = self._get_config()
+        config = await self._get_config()
         for user in users:
             try:
                 config['ignore'].remove(user.id)
                 out.append("Removed {} from ignore list".format(user))
-            except KeyError:
+            except ValueError:
                 out.append("{} not in ignore list".format(user))
+        config.mark_dirty()
         await split_send(ctx, out)
 
     @commands.command()
     async def dm_ignore_list(self, ctx):
         """Prints the list of ignored users"""
-        config = self._get_config()
+        config = await self._get_config()
         users = [self.bot.get_user(i) for i in config['ignore']]
         lines = ["{}".format(i) for i in users]
         await split_send(ctx, lines, style='```')
@@ -168,20 +169,16 @@ class DirectMessages(commands.Cog):
     async def on_message(self, message):
         """Listen for DMs and post them in the bot log channel"""
         await self._async_init()
+        info = self.bot.envelope(message)
         # ignore messages from this bot
-        if message.author == self.bot.user:
+        if info.is_self:
             return
         # ignore commands
-        try:
-            if message.content.startswith(self.bot.command_prefix):
-                return
-        except TypeError:
-            for prefix in self.bot.command_prefix:
-                if message.content.startswith(prefix):
-                    return
+        if info.is_command:
+            return
         # if DM
-        if isinstance(message.channel, discord.DMChannel):
-            config = self._get_config()
+        if info.is_dm:
+            config = await self._get_config()
             if message.author.id in config['ignore']:
                 return
             channel = self.bot.find_channel(param.rc('log_channel'))
@@ -212,7 +209,7 @@ class DirectMessages(commands.Cog):
                 roles = [find_role(channel.guild, i).mention for i in ["devoted"]]
                 msg = ' '.join(roles) + '\n'
             msg += 'From: {0.author.mention}\n"{0.content}"'.format(message)
-            sent = [await channel.send(msg)]
+            sent = [await outbound.send(channel, msg, priority=outbound.ALERT, merge=False)]
             urls = []
             if message.attachments:
                 msg = '\nAttachments:\n'
@@ -220,11 +217,12 @@ class DirectMessages(commands.Cog):
                 for attachment in message.attachments:
                     if attachment.url and attachment.url not in urls:
                         urls.append(attachment.url)
-                sent.append(await channel.send(msg))
+                sent.append(await outbound.send(channel, msg, priority=outbound.ALERT, merge=False))
             if urls:
-                sent.extend(await split_send(channel, urls))
-            for i in sent:
-                self[i.id] = message.channel.id
+                sent.extend(await split_send(channel, urls, priority=outbound.ALERT))
+            with self.data.batch():
+                for i in sent:
+                    self[i.id] = message.channel.id
             await sent[-1].add_reaction(_tdt_bruh)
             if "spicy clips" in message.content.lower():
                 await sent[-1].add_reaction('🌶️')
@@ -240,7 +238,7 @@ class DirectMessages(commands.Cog):
                         channel = self.bot.get_channel(cid)
                         if not channel:
                             channel = await self.bot.fetch_channel(cid)
-                        await channel.send(message.content)
+                        await outbound.send(channel, message.content, priority=outbound.ALERT, merge=False)
                         await message.add_reaction('✅')
                         # check for discord links in message
                         if "https://discord.gg" in message.content:
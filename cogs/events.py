@@ -10,13 +10,15 @@ import traceback
 from typing import Union
 
 from .. import param
-from ..helpers import parse_timezone, minute, day, localize, delocalize
+from ..helpers import parse_timezone, minute, day, localize, delocalize, find_emoji
 from ..async_helpers import admin_check, wait_until, split_send
+from .. import outbound
 from ..version import usingV2
 
 
 logger = logging.getLogger('discord.' + __name__)
 _stale_emoji = '🔕'
+_alert_catch_up = 10 * 60  # alerts more than 10 min late (e.g. after downtime) are dropped
 _prototype = "**<Prototype Event Name>**\n"\
              "What: <a bots example event>\n"\
              "Who: <@TDTbot>\n"\
@@ -235,8 +237,8 @@ class _Event(dict):
                         return
         else:
             if self._comments:
-                await split_send(self.log_channel, self._comments)
-        msg = await self.log_channel.send(log)
+                await split_send(self.log_channel, self._comments, priority=outbound.ALERT)
+        msg = await outbound.send(self.log_channel, log, priority=outbound.ALERT, merge=False)
         self.children.append(msg)
 
     async def make_stale(self):
@@ -285,15 +287,18 @@ class _Event(dict):
         return False
 
     async def alert(self, dt_min=None, channel=None, eta=None, wait=True, prefix=None):
-        """Schedule/send event alerts mentioning all attendees.
+        """Send event alerts mentioning all attendees (alerts are scheduled by set_alerts).
         option dt_min is time before event in minutes.
         """
         if channel is None:
             channel = getattr(self.cog, 'channel', param.rc('event_channel'))
         channel = self.cog.bot.find_channel(channel)
         dt = localize(self['datetime']) - datetime.timedelta(minutes=dt_min)
-        if dt < localize(datetime.datetime.utcnow()):
-            dt_min = (localize(self['datetime']) - localize(datetime.datetime.utcnow())).seconds // 60
+        now = localize(datetime.datetime.utcnow())
+        # scheduled alerts fire at or just after dt and keep their dt_min, only really late ones say
+        # how long is actually left
+        if dt < now and (wait or (now - dt).total_seconds() > _alert_catch_up):
+            dt_min = max(0, int((localize(self['datetime']) - now).total_seconds()) // 60)
         if prefix is None:
             prefix = 'Your event "{0.name}"'.format(self)
         if eta is None:
@@ -324,16 +329,17 @@ class _Event(dict):
         if wait:
             await wait_until(dt)
         msg = ' '.join([prefix, eta] + [i.mention for i in await self.attendees()])
-        msg = await channel.send(msg)
+        msg = await outbound.send(channel, msg, priority=outbound.ALERT, merge=False)
         self.children.append(msg)
         if dt == 0:  # todo: fix this
             await self.make_stale()
         if dt_min == 0 and self.past():
             await self.make_stale()
-            await self._clear(wait=None)
+            self.schedule_clear()
 
     def set_alerts(self, dts=None, channel=None):
-        """Set multiple alerts for list of dt (in minutes)"""
+        """Schedule alerts for list of dt (in minutes) before the event. The jobs are
+        keyed by event and dt, so setting them again (e.g. after a reboot) doesn't add any."""
         if self._pending_alerts:
             return
         if dts is None:
@@ -347,7 +353,10 @@ class _Event(dict):
                 logger.info('new: ' + str(tmp))
             dts = tmp
         for dt in dts:
-            self.cog.bot.loop.create_task(self.alert(dt, channel=channel))
+            when = localize(self['datetime']) - datetime.timedelta(minutes=dt)
+            self.cog.bot.scheduler.schedule('event:{}:alert:{}'.format(self['id'], dt), 'events.alert', when,
+                                            catch_up=_alert_catch_up, message_id=self['id'], dt_min=dt,
+                                            channel=getattr(channel, 'id', channel))
         self._pending_alerts = True
 
     async def log_and_alert(self, dts=None, event_chanel=None, log_channel=None):
@@ -355,23 +364,20 @@ class _Event(dict):
         await self.record_log(log_channel=log_channel)
         self.set_alerts(dts=dts, channel=event_chanel)
 
-    async def _clear(self, wait=0):
-        if wait != 0:
-            if wait is None:
-                wait = datetime.timedelta(days=1)
-            if isinstance(wait, float):
-                wait = datetime.timedelta(hours=wait)
-            if isinstance(wait, datetime.timedelta):
-                wait = localize(self['datetime']) + wait
-            await wait_until(wait)
-        for msg in self.children:
-            await msg.delete()
-        self.children = []
-        msg = await self.message()
-        await msg.delete()
-        keys = self.keys()[:]
-        for i in keys:
-            del self[i]
+    def schedule_clear(self, wait=None):
+        """Schedule deletion of the event post and its alerts, wait (timedelta or hours)
+        after the event starts (a day by default)"""
+        if wait is None:
+            wait = datetime.timedelta(days=1)
+        if isinstance(wait, (int, float)):
+            wait = datetime.timedelta(hours=wait)
+        # messages are stored by id so the job still works after a reboot
+        messages = [[msg.channel.id, msg.id] for msg in self.children]
+        messages.append([self._message_channel.id, self['id']])
+        # the event stays listed until the job has deleted its messages
+        self.cog.bot.scheduler.schedule('event:{}:clear'.format(self['id']), 'events.clear',
+                                        localize(self['datetime']) + wait, message_id=self['id'],
+                                        messages=messages)
 
 
 class Events(commands.Cog):
@@ -386,6 +392,20 @@ class Events(commands.Cog):
         self._log_channel = log_channel
         self._events = []
         self._hist_checked = False
+        bot.warmup.register('events', self._warm_history)
+        bot.scheduler.handler('events.alert', self._alert_job)
+        bot.scheduler.handler('events.clear', self._clear_job)
+
+    def export_state(self):
+        """State handed to the reloaded cog, see MainBot.hot_reload"""
+        return dict(events=self._events, hist_checked=self._hist_checked)
+
+    def import_state(self, state):
+        # scheduled alerts keep running on these event objects, now reporting to this cog
+        self._events = state['events']
+        for event in self._events:
+            event.cog = self
+        self._hist_checked = state['hist_checked']
 
     @property
     def channel(self):
@@ -434,6 +454,34 @@ class Events(commands.Cog):
                 return channel.name == self.channel
         return channel == self.channel
 
+    async def _find_event(self, message_id):
+        events = [e for e in self._events if e['id'] == message_id]
+        if not events and not self._hist_checked:
+            # jobs can come due before the history has been read after a reboot
+            await self._warm_history()
+            events = [e for e in self._events if e['id'] == message_id]
+        return events[0] if events else None
+
+    async def _alert_job(self, message_id, dt_min, channel=None):
+        event = await self._find_event(message_id)
+        if event is None:
+            logger.info('Alert for unknown event {}'.format(message_id))
+            return
+        await event.alert(dt_min, channel=channel, wait=False)
+
+    async def _clear_job(self, message_id, messages):
+        for channel_id, msg_id in messages:
+            channel = self.bot.find_channel(channel_id)
+            if channel is None:
+                continue
+            try:
+                await channel.get_partial_message(msg_id).delete()
+            except discord.HTTPException:
+                pass
+        for event in [e for e in self._events if e['id'] == message_id]:
+            event.children = []
+            self._events.remove(event)
+
     async def enroll_event_if_valid(self, event):
         # if this is a valid event
         if event:
@@ -446,20 +494,16 @@ class Events(commands.Cog):
     @commands.Cog.listener()
     async def on_message(self, message):
         """Parse messages for new event post"""
+        info = self.bot.envelope(message)
         # ignore all messages from our bot
-        if message.author == self.bot.user:
+        if info.is_self:
             return
         # if we have not already parsed the history, do so
         if not self._hist_checked:
             await self.check_history()
         # ignore commands when checking for events
-        try:
-            if message.content.startswith(self.bot.command_prefix):
-                return
-        except TypeError:
-            for prefix in self.bot.command_prefix:
-                if message.content.startswith(prefix):
-                    return
+        if info.is_command:
+            return
         # if message in event channel, then try to parse it
         if self.is_event_channel(message.channel):
             # if event is stale ignore it
@@ -485,6 +529,11 @@ class Events(commands.Cog):
         not_recent = (localize(datetime.datetime.now()) - localize(message.created_at)) > dt
         await self.enroll_event_if_valid(_Event(message, self, from_hist=not_recent))
 
+    async def _warm_history(self):
+        """Warm-up task, the history only needs to be checked once"""
+        if not self._hist_checked:
+            await self.check_history()
+
     async def check_history(self, channel=None):
         """Check event channel history for any events we missed before we were
         initiated"""
@@ -553,11 +602,6 @@ class Events(commands.Cog):
             logger.error(''.join(traceback.format_tb(e.__traceback__)))
             raise e
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self.check_history()
-
     @commands.command()
     async def read_events(self, ctx):
         """Read and parse the events channel for events. This shouldn't need to be
@@ -603,13 +647,9 @@ class Events(commands.Cog):
         if before is None:
             msg = _prototype
             msg = await self.channel.send('```' + msg + '```')
-            emoji = 'rebel_skuratnum_200x200'
-            try:
-                rxn = [e for e in self.channel.guild.emojis if e.name == emoji][0]
-                if rxn:
-                    await msg.add_reaction(rxn)
-            except IndexError:
-                pass
+            rxn = find_emoji(self.channel.guild, 'rebel_skuratnum_200x200')
+            if rxn:
+                await msg.add_reaction(rxn)
             return
         if ctx.channel == self.channel:
             await asyncio.sleep(5)
@@ -700,7 +740,7 @@ class Events(commands.Cog):
                     if not channel:
                         await person.create_dm()
                         channel = person.dm_channel
-                    await channel.send(role + suf)
+                    await outbound.send(channel, role + suf, priority=outbound.GAME)
                     sent.append(person.display_name)
 
         if sent:
@@ -2,7 +2,6 @@ import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
 import datetime
 import logging
-import numpy as np
 from ..helpers import parse_message, find_role
 from ..async_helpers import split_send
 from ..config import UserConfig
@@ -21,7 +20,12 @@ _emoji = '<:StrangeCoin:319276617727737866>'
 class _Entry:
     # emotes = ['1️⃣', '2️⃣', '3️⃣', '4️⃣', '5️⃣']
     emotes = ['👎', '👍']
-    _scores = np.arange(len(emotes), dtype=int) + (0 if len(emotes) == 2 else 1)
+
+    @property
+    def _scores(self):
+        # numpy is only imported once there is something to score
+        import numpy as np
+        return np.arange(len(self.emotes), dtype=int) + (0 if len(self.emotes) == 2 else 1)
 
     def __init__(self, message_id, author_id, cog):
         self.id = message_id
@@ -70,6 +74,7 @@ class _Entry:
     async def votes(self, message=None):
         if message is None:
             message = await self.message()
+        import numpy as np
         voted = []
         votes = np.zeros(len(self.emotes), dtype=int)
         for rxn in message.reactions:
@@ -86,6 +91,7 @@ class _Entry:
             await msg.add_reaction(i)
 
     async def score_stats(self, message=None):
+        import numpy as np
         votes = await self.votes(message=message)
         try:
             mean = np.average(self._scores, weights=votes)
@@ -116,13 +122,15 @@ class FashionContest(commands.Cog):
         self._channel = _channel
         self._entries = None
         self._bot_config = None
-        self.bot.enroll_emoji_role({_emoji: _role}, message_id=_rule_id)
+        self.bot.enroll_emoji_role({_emoji: _role}, message_id=_rule_id, cog=self)
 
-    @property
-    def bot_config(self):
+    async def bot_config(self):
+        """The bot's config, read off the event loop the first time"""
         if self._bot_config is None:
-            self._bot_config = UserConfig(self.bot.user)
-            self._bot_config.set_if_not_set(_bot_key, [])
+            config = await UserConfig.aload(self.bot.user)
+            if self._bot_config is None:
+                self._bot_config = config
+                self._bot_config.set_if_not_set(_bot_key, [])
         return self._bot_config
 
     @property
@@ -147,15 +155,16 @@ class FashionContest(commands.Cog):
             self._entries.append(entry)
         except AttributeError:
             self._entries = [entry]
-        if entry.key not in self.bot_config[_bot_key]:
-            self.bot_config[_bot_key] += [entry.key]
+        bot_config = await self.bot_config()
+        if entry.key not in bot_config[_bot_key]:
+            bot_config[_bot_key] += [entry.key]
 
     @property
     def role(self):
         return find_role(self.channel.guild, _role)
 
     async def _get_saved_entries(self):
-        saved = self.bot_config[_bot_key]
+        saved = (await self.bot_config())[_bot_key]
         for i in saved:
             message_id, author_id = [int(j) for j in i.split(':')]
             try:
@@ -172,15 +181,15 @@ class FashionContest(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message(self, message):
-        if message.author == self.bot.user:
+        info = self.bot.envelope(message)
+        if info.is_self:
             return
         if not await self._can_run(message):
             return
         # if self._entries is None:
         #    await self._get_saved_entries()
         # await message.channel.send(str(message))
-        data = parse_message(message)
-        for i in data['type']:
+        for i in info.type:
             if i.startswith('image/'):
                 await self.enroll_entry(_Entry(message.id, message.author.id, self))
 
@@ -3,6 +3,7 @@ from discord.ext import commands  # type: ignore
 import logging
 from ..async_helpers import admin_check, git_log
 from ..version import usingV2
+from .. import aio
 from .. import git_manage
 
 
@@ -21,7 +22,7 @@ class GitTools(commands.Cog):
     @commands.command()
     async def git_pull(self, ctx):
         """Do a git pull on own code"""
-        git_manage.update()
+        await aio.run(aio.GIT, git_manage.update)
         await ctx.send("Pulled own code")
 
     @commands.command()
@@ -1,14 +1,14 @@
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
-import asyncio
 import datetime
 import pytz
 import logging
 import os
 from .. import param
 from ..param import channels
-from ..helpers import find_role
+from ..helpers import find_role, find_emoji
 from ..async_helpers import admin_check, split_send
+from .. import warmup
 from ..version import usingV2
 
 
@@ -27,21 +27,13 @@ class _ActivityFile(param.IntPermaDict):
         self.cog = cog
         super().__init__(fn)
 
-    def _clear_old(self, key):
+    def _clear_old(self, rows):
         old = (datetime.datetime.utcnow() - _tmax).timestamp()
-        if key in self:
-            pops = [i for i in self[key] if i[1] < old]
-            for p in pops:
-                self[key].pop(p)
+        return [i for i in rows if i[1] >= old]
 
     def update_pings(self, msg, _roles):
-        user_id = msg.author.id
-        self._clear_old(user_id)
         entry = [msg.id, msg.created_at.timestamp()] + _roles
-        if user_id in self:
-            self[user_id].append(entry)
-        else:
-            self[user_id] = [entry]
+        self.update(msg.author.id, lambda rows: self._clear_old(rows) + [entry], [])
 
     def _get_role_id(self, role):
         if isinstance(role, int):
@@ -93,18 +85,11 @@ class LFG(commands.Cog):
         self._init_finished = False
         self._debug = debug
         self._cached_search = None
+        bot.warmup.register('lfg', self._async_init, priority=warmup.COSMETIC, after=['events'])
 
     def _get_emoji(self, role, guild):
-        emoji = _role2emoji.get(role, role)
-        try:
-            return [e for e in guild.emojis if e.name == emoji][0]
-        except IndexError:
-            return ''
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._async_init()
+        emoji = find_emoji(guild, _role2emoji.get(role, role))
+        return emoji if emoji else ''
 
     async def _async_init(self):
         if self._init:
@@ -125,16 +110,14 @@ class LFG(commands.Cog):
         roles_tagged = []
         for role in message.role_mentions:
             try:
-                emoji = _role2emoji[role.id]
-                emoji = [e for e in message.guild.emojis if e.name == emoji][0]
+                emoji = find_emoji(message.guild, _role2emoji[role.id])
+            except KeyError:
+                continue
+            if emoji:
                 await message.add_reaction(emoji)
                 roles_tagged.append(role.id)
-            except KeyError:
-                pass
-            except IndexError:
-                pass
         if roles_tagged:
-            self.data.update_pings(message, roles_tagged)
+            await self.data.run(self.data.update_pings, message, roles_tagged)
 
     @commands.command()
     @commands.check(admin_check)
@@ -2,6 +2,7 @@ import discord  # type: ignore
 from discord.ext import commands  # type: ignore
 import logging
 # from typing import Tuple
+from .. import member_jobs
 from .. import param
 from ..param import messages, roles, rc
 from ..helpers import emotes_equal, find_channel
@@ -33,9 +34,9 @@ class MainCommands(commands.Cog):
         self.bot = bot
         self._last_member = None
         self._kicks = []
-        self.bot.enroll_emoji_role({'👍': "Wit Challengers"}, message_id=809302963990429757)
-        self.bot.enroll_emoji_role({'🏆': "Tourney Challengers"}, message_id=822744897505067018)
-        self.bot.enroll_emoji_role(param.emoji2role, message_id=param.messages.CoC)
+        self.bot.enroll_emoji_role({'👍': "Wit Challengers"}, message_id=809302963990429757, cog=self)
+        self.bot.enroll_emoji_role({'🏆': "Tourney Challengers"}, message_id=822744897505067018, cog=self)
+        self.bot.enroll_emoji_role(param.emoji2role, message_id=param.messages.CoC, cog=self)
         try:
             with open(rc('art_file'), 'r') as f:
                 msg = f.read()
@@ -47,12 +48,12 @@ class MainCommands(commands.Cog):
                                        # Testing ##
                                        # send_message=msg,
                                        # accept_string='',
-                                       target=param.roles.artist)
+                                       target=param.roles.artist, cog=self)
         except FileNotFoundError:
             logger.warning("Cannot find art file for emoji role, skipping.")
         _roles = ['alpha', 'beta', 'gamma', 'omega']
         _dict = {i: i for i in _roles}
-        self.bot.enroll_emoji_role(_dict, message_id=messages.wolfpack, remove=_roles, min_role='Recruit')
+        self.bot.enroll_emoji_role(_dict, message_id=messages.wolfpack, remove=_roles, min_role='Recruit', cog=self)
 
     @commands.command()
     async def guild(self, ctx):
@@ -135,17 +136,13 @@ class MainCommands(commands.Cog):
     @commands.Cog.listener()
     async def on_message(self, message):
         """Template for message listeners"""
+        info = self.bot.envelope(message)
         # ignore messages from this bot
-        if message.author == self.bot.user:
+        if info.is_self:
             return
         # ignore commands
-        try:
-            if message.content.startswith(self.bot.command_prefix):
-                return
-        except TypeError:
-            for prefix in self.bot.command_prefix:
-                if message.content.startswith(prefix):
-                    return
+        if info.is_command:
+            return
         # Do something with the message below
         return
 
@@ -206,23 +203,22 @@ class MainCommands(commands.Cog):
             users = [u async for u in rxns[0].users()]
         except IndexError:
             users = []
-        n = 0
-        errors = []
-        for user in users:
-            try:
-                await user.add_roles(role)
-                n += 1
-            except Exception as e:
-                err = "Cannot add {} role to user {} with error {}."
-                errors.append(err.format(role, user, e))
+        # the job checkpoints its progress and shows it in one status message
+        jobs = self.bot.member_jobs
+        job = jobs.plan(ctx.guild, 'add_roles', [member_jobs.roles_op(u, add=[role]) for u in users])
+        job = await jobs.run(job, ctx.channel)
+        errors = ["Cannot add {} role to user {}".format(role, i) for i in jobs.failures(job)]
         if errors:
             await split_send(ctx, errors, style='```')
+        n = jobs.counts(job)[member_jobs.DONE]
         out = 'Added role {} to {} player{} who reacted with {} to message {}.'
-        out.format(role, n, 's' if n > 1 else 0, emote, msg.id)
+        out = out.format(role, n, 's' if n != 1 else '', emote, msg.id)
+        if job['state'] == member_jobs.CANCELLED:
+            out += ' The job was cancelled.'
         try:
-            msg.reply(out, mention_author=False)
-        except (discord.HTTPException, discord.Forbidden, discord.InvalidArgument):
-            ctx.send(out)
+            await msg.reply(out, mention_author=False)
+        except (AttributeError, discord.HTTPException):
+            await ctx.send(out)
 
     @commands.command()
     async def source(self, ctx):
@@ -1,7 +1,6 @@
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
 import logging
-from ..helpers import parse_message
 from ..async_helpers import admin_check
 from .. import param
 from ..version import usingV2
@@ -42,12 +41,13 @@ class MessageParse(commands.Cog):
     async def on_message(self, message):
         if self._stfu:
             return
-        if message.author == self.bot.user:
+        info = self.bot.envelope(message)
+        if info.is_self:
             return
         if not await self._can_run(message):
             return
         # await message.channel.send(str(message))
-        data = parse_message(message)
+        data = info.parsed
         for key in sorted(data.keys()):
             if data[key]:
                 await message.channel.send(key + ":\n```" + str(data[key]) + '```')
@@ -75,6 +75,18 @@ class Roast(commands.Cog):
         self._react_snipe = dict()
         self._roasts = []
 
+    def export_state(self):
+        """State handed to the reloaded cog, see MainBot.hot_reload"""
+        return dict(last_roast=self._last_roast, snipes=self._snipes, botting=self._botting,
+                    react_snipe=self._react_snipe, roasts=self._roasts)
+
+    def import_state(self, state):
+        self._last_roast = state['last_roast']
+        self._snipes = state['snipes']
+        self._botting = state['botting']
+        self._react_snipe = state['react_snipe']
+        self._roasts = state['roasts']
+
     def _log_roast(self, mid):
         while sys.getsizeof(self._roasts) > 1048576:
             self._roasts.pop(0)
@@ -162,16 +174,12 @@ class Roast(commands.Cog):
     @commands.Cog.listener()
     async def on_message(self, message):
         """Parse messages to see if we should roast even without a command"""
+        info = self.bot.envelope(message)
         # ignore commands
-        try:
-            if message.content.startswith(self.bot.command_prefix):
-                return
-        except TypeError:
-            for prefix in self.bot.command_prefix:
-                if message.content.startswith(prefix):
-                    return
+        if info.is_command:
+            return
         # ignore messages from this bot
-        if message.author == self.bot.user:
+        if info.is_self:
             return
         # if author in botting
         try:
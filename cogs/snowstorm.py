@@ -1,12 +1,13 @@
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
-import asyncio
 import datetime
 import random
 from .. import param
 from ..helpers import find_role
 from ..config import UserConfig
+from ..config.users.store import store as user_store
 from ..async_helpers import split_send, sleep, admin_check
+from .. import warmup
 from ..version import usingV2
 import logging
 
@@ -136,6 +137,7 @@ class Snowstorm(commands.Cog):
         self._channel = None
         self._log = None
         self.bot.enroll_emoji_role({_enroll: _role}, message_id=_rule_id)
+        bot.warmup.register('snowstorm', self._async_init, priority=warmup.GAME)
 
     @property
     def role(self):
@@ -396,11 +398,6 @@ class Snowstorm(commands.Cog):
         logger.info('TrickOrTreat.channel')
         self.bot.loop.create_task(self.finish_count(**kwargs))
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._async_init()
-
     async def _async_init(self):
         if not self._init:
             self._init = True
@@ -446,19 +443,20 @@ class Snowstorm(commands.Cog):
         role = self.role
         if role is None:
             return await self.alt_rankings(ctx)
-        data = {m: self.get_score(m) for m in role.members}
+        # one query for the stored scores instead of a config per member
+        scores = await user_store().avalues(_score)
+        data = {m: scores.get(m.id, _start) for m in role.members}
         users = sorted(data.keys(), key=lambda u: (data[u], u.display_name), reverse=True)
         summary = ['{0.display_name} : {1}'.format(u, data[u]) for u in users]
-        print(role, data, role.members, self.channel.guild)
         channel = self.channel if self._game_on else ctx
         await split_send(channel, summary, style='```')
 
     @commands.command()
     async def alt_rankings(self, ctx):
         """Show current rankings for trick or treat"""
-        configs = await self.bot.get_user_configs()
-        players = [c for c in configs if _score in c]
-        data = {await self._member(p.user): p[_score] for p in players}
+        scores = dict(await user_store().atop(_score))
+        members = await self.bot.resolver.resolve_many(list(scores), self.channel.guild)
+        data = {m: scores[i] for i, m in members.items() if m is not None}
         users = sorted(data.keys(), key=lambda u: (data[u], u.display_name), reverse=True)
         summary = ['{0.display_name} : {1}'.format(u, data[u]) for u in users]
         channel = self.channel if self._game_on else ctx
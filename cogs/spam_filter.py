@@ -1,9 +1,10 @@
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
-import asyncio
 from ..param import roles
 from ..helpers import find_role
 from ..async_helpers import admin_check
+from .. import outbound
+from .. import warmup
 from ..version import usingV2
 import logging
 import re
@@ -23,6 +24,7 @@ class SpamFilter(commands.Cog):
         self._admin = None
         self._debug = _startup_debugging
         self._log_channel = None
+        bot.warmup.register('spam_filter', self._async_init, priority=warmup.MODERATION)
 
     async def _async_init(self):
         if self._init:
@@ -57,29 +59,25 @@ class SpamFilter(commands.Cog):
             self._admin = find_role(self.tdt, roles.admin)
         return self._admin
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._async_init()
-
     async def reply_to_spam(self, message):
         """Reply to a spam post"""
-        await message.channel.send(spam_msg.format(self.admin.mention), reference=message)
+        await outbound.send(message.channel, spam_msg.format(self.admin.mention), reference=message,
+                            priority=outbound.MODERATION)
 
     async def log_spam(self, message):
         msg = "Spam message detected:\n{0.content}\n{0.link}"
-        return await self.log_channel.send(msg.format(message))
+        return await outbound.send(self.log_channel, msg.format(message), priority=outbound.MODERATION, merge=False)
 
     @commands.Cog.listener()
     async def on_message(self, message):
         """Parse messages for spam posts"""
         # ignore all messages from our bot
-        if message.author == self.bot.user:
+        if self.bot.envelope(message).is_self:
             return
         if not self._init:
             await self._async_init()
         if not isinstance(message.author, discord.Member):
-            message.author = await self.bot.get_or_fetch_user(message.author.id)
+            message.author = await self.bot.get_or_fetch_user(message.author.id, self.tdt)
         if not re.search(r'https://dis[discorle]{3,6}(.gift|[.]?com)+/[\w]+( |$)', message.content):
             return
         low_role = False
@@ -132,9 +132,13 @@ class Supporters(commands.Cog):
                       id         - user id number
                       name       - user name
                       <prefix>_r - reverse order (e.g. id_r)"""
-        keys = self.data.keys()
-        members = {key: await self.bot.get_or_fetch_user(key, ctx, fallback=True)
-                   for key in keys if key}
+        keys = [key for key in self.data.keys() if key]
+        # in DMs, look the supporters up in the main guild
+        guild = ctx.guild or self.bot.get_guild(param.guilds.tdt)
+        members = await self.bot.resolver.resolve_many(keys, guild)
+        for key in keys:
+            if members[key] is None:
+                members[key] = await self.bot.get_or_fetch_user(key, fallback=True)
         if sort_by is not None:
             reverse = False
             if sort_by.endswith('_r'):
@@ -18,15 +18,12 @@ from .. import param
 from ..param import messages, channels
 from ..helpers import find_role, second, day
 from ..config import UserConfig
-from ..async_helpers import split_send, sleep, admin_check, wait_until
+from ..config.users.store import store as user_store
+from ..async_helpers import split_send, sleep, admin_check
+from .. import outbound
+from .. import warmup
 from ..version import usingV2
 import logging
-try:
-    import ephem
-    moon = ephem.Moon()
-except ImportError:
-    moon = None
-    print("ephem not installed, moon phase will not be available")
 
 
 logger = logging.getLogger("discord." + __name__)
@@ -68,6 +65,23 @@ for i in _alts.values():
     _all_alts.extend(i)
 
 
+_moon = None
+
+
+def moon():
+    """ephem.Moon, or None if ephem is not installed (imported on first use)"""
+    global _moon
+    if _moon is None:
+        try:
+            import ephem
+        except ImportError:
+            logger.warning("ephem not installed, moon phase will not be available")
+            _moon = False
+        else:
+            _moon = ephem.Moon()
+    return _moon or None
+
+
 def sign(x):
     return bool(x > 0) - bool(x < 0)
 
@@ -92,6 +106,7 @@ def get_phase(dt=None):
     # to conveniently extract the percent time between one new moon and the next
     # This corresponds (somewhat roughly) to the phase of the moon.
 
+    import ephem
     if dt is None:
         dt = datetime.datetime.now()
     date = ephem.Date(dt)
@@ -129,13 +144,33 @@ class TrickOrTreat(commands.Cog):
         self._rule_id = _rule_id
         self._enrolled = False
         self._lock = False
+        bot.warmup.register('trick_or_treat', self._async_init, priority=warmup.GAME)
+        bot.scheduler.handler('trick_or_treat.send', self.send_message)
+        bot.scheduler.handler('trick_or_treat.count', self.finish_count)
+        bot.scheduler.handler('trick_or_treat.start', self._post_or_fetch_start_message)
+
+    def export_state(self):
+        """State handed to the reloaded cog, see MainBot.hot_reload"""
+        return dict(init=self._init, awaiting=self._awaiting, last=self._last, game_on=self._game_on,
+                    rule_id=self._rule_id, lock=self._lock)
+
+    def import_state(self, state):
+        # the active message id is re-read from the bot's config when needed
+        self._init = state['init']
+        self._awaiting = state['awaiting']
+        self._last = state['last']
+        self._game_on = state['game_on']
+        self._rule_id = state['rule_id']
+        self._lock = state['lock']
+        # the enrollment went with the old cog
+        self._enroll_emoji_role()
 
     def _enroll_emoji_role(self):
         if self._enrolled:
             return
         if not self._rule_id:
             return
-        self.bot.enroll_emoji_role({_enroll: _role}, message_id=self._rule_id)
+        self.bot.enroll_emoji_role({_enroll: _role}, message_id=self._rule_id, cog=self)
         self._enrolled = True
 
     async def _post_or_fetch_start_message(self):
@@ -243,15 +278,18 @@ class TrickOrTreat(commands.Cog):
         if set_timer == 0:
             set_timer = .01
         if set_timer:
-            # launch task for delayed count tally/finish
-            self.bot.loop.create_task(self.finish_count(dt=set_timer, mid=msg.id, nlast=nlast))
+            # schedule the delayed count tally/finish
+            self.count_later(dt=set_timer, mid=msg.id, nlast=nlast)
 
-    def send_later(self, **kwargs):
-        """Non-async wrapper for send_message"""
+    def send_later(self, dt=0, **kwargs):
+        """Schedule send_message in dt seconds (True for a random time)"""
         if not self.game_on:
             return
+        if dt is True:
+            dt = random_time()
         logger.info('TrickOrTreat.send_later')
-        self.bot.loop.create_task(self.send_message(**kwargs))
+        self.bot.scheduler.schedule('trick_or_treat:send', 'trick_or_treat.send', datetime.timedelta(seconds=dt),
+                                    replace=False, **kwargs)
 
     async def _get_message(self):
         """Get active game message id"""
@@ -278,6 +316,13 @@ class TrickOrTreat(commands.Cog):
             self._configs[user.id] = UserConfig(user)
             return self._configs[user.id]
 
+    async def _load_configs(self, *users):
+        """Read the configs of users that aren't cached yet off the event loop"""
+        users = [u for u in users if u.id not in self._configs]
+        configs = await asyncio.gather(*[UserConfig.aload(u) for u in users])
+        for user, config in zip(users, configs):
+            self._configs.setdefault(user.id, config)
+
     def apply_delta(self, user, delta):
         """Update user's score by delta"""
         config = self._get_config(user)
@@ -297,12 +342,9 @@ class TrickOrTreat(commands.Cog):
                 return out[0]
         except AttributeError:
             pass
-        try:
-            out = await self.channel.guild.fetch_member(user.id)
-            if not out:
-                return user
-        except discord.HTTPException:
-            pass
+        out = await self.bot.resolver.resolve(user.id, self.channel.guild)
+        if out:
+            return out
         out = self.channel.guild.get_member_named(user.name)
         if out:
             return out
@@ -364,6 +406,7 @@ class TrickOrTreat(commands.Cog):
                     except discord.HTTPException:
                         pass
             voters = set(trickers + treaters)
+            await self._load_configs(*voters)
             noa_voters = [u for u in voters if u.id not in _all_alts]
             ntot, noa_tot = len(voters), len(set(noa_trick + noa_treat))
             if ntot > noa_tot:
@@ -433,9 +476,10 @@ class TrickOrTreat(commands.Cog):
                     self.apply_delta(u, delt)
             # based on moon phase swap trickers/treaters
             phase = .5
-            if moon:
-                moon.compute()
-                phase = moon.phase * 0.01
+            luna = moon()
+            if luna:
+                luna.compute()
+                phase = luna.phase * 0.01
             else:
                 print("No moon phase data")
             trickers = [await self._member(u) for u in trickers]
@@ -443,11 +487,11 @@ class TrickOrTreat(commands.Cog):
             msg = "{:}The light of the moon brings forth a treat for the tricksters, and a trick for the treaters.{:}"
             if random.random() < .05 * phase:
                 a = b = ""
-                if moon:
+                if luna:
                     luna = phase_to_emoji()
                     a = luna + " "
                     b = " " + luna
-                await self.channel.send(msg.format(a, b))
+                await outbound.send(self.channel, msg.format(a, b), priority=outbound.GAME)
                 tmp = trickers
                 trickers = treaters
                 treaters = tmp
@@ -460,13 +504,13 @@ class TrickOrTreat(commands.Cog):
             summary = [fmt.format(u, *self.apply_delta(u, deltas[u]))
                        for u in users if deltas[u]]
             # print("summary", summary)
-            await self.channel.send(txt)
-            await split_send(self.channel, summary, style='```')
+            await outbound.send(self.channel, txt, priority=outbound.GAME)
+            await split_send(self.channel, summary, style='```', priority=outbound.GAME)
             self._set_msg_id(0)
             if self._game_on == "auto" and datetime.datetime.now(_utc) > _stop_time:
                 self._awaiting = None
                 msg = "Thank you all for playing this year. Here is the final tally:"
-                await self.channel.send(msg)
+                await outbound.send(self.channel, msg, priority=outbound.GAME)
                 await self.rankings(self.channel)
                 self._game_on = False
                 logger.info('Finish TrickOrTreat.finish_count (Finished Game)')
@@ -479,19 +523,21 @@ class TrickOrTreat(commands.Cog):
         finally:
             self._lock = False
 
-    def count_later(self, **kwargs):
+    def count_later(self, dt=0, **kwargs):
+        """Schedule finish_count in dt seconds (True for a random time). One count per message
+        is scheduled at a time, so it's safe to call again (e.g. after a reboot)"""
         if not self.game_on:
             return
-        logger.info('TrickOrTreat.channel')
+        logger.info('TrickOrTreat.count_later')
         if kwargs.get('nlast', None) is not None:
             self._get_config()[_nlast] = kwargs.get('nlast')
-        self.bot.loop.create_task(self.finish_count(**kwargs))
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        # print("on_ready")
-        await asyncio.sleep(5)
-        await self._async_init()
+        if dt is True:
+            dt = random_time()
+        mid = kwargs.get('mid', 0)
+        if self._awaiting is None:
+            self._awaiting = mid
+        self.bot.scheduler.schedule('trick_or_treat:count:{}'.format(mid), 'trick_or_treat.count',
+                                    datetime.timedelta(seconds=dt), replace=False, **kwargs)
 
     async def _async_init(self):
         # print("_async_init")
@@ -500,10 +546,10 @@ class TrickOrTreat(commands.Cog):
             if not self._rule_id:
                 if self.game_on:
                     await self._post_or_fetch_start_message()
-                elif datetime.datetime.now() < _start_time:
-                    await wait_until(_start_time)
-                    await asyncio.sleep(1)
-                    await self._post_or_fetch_start_message()
+                elif datetime.datetime.now(_utc) < _start_time:
+                    # don't hold up the warm-up until the game starts
+                    self.bot.scheduler.schedule('trick_or_treat:start', 'trick_or_treat.start',
+                                                _start_time + second, replace=False)
             self._init = True
             if not await self._get_message():
                 await self.send_message(dt=3)
@@ -522,7 +568,7 @@ class TrickOrTreat(commands.Cog):
     async def on_message(self, message):
         """Parse messages"""
         # ignore all messages from our bot
-        if message.author == self.bot.user:
+        if self.bot.envelope(message).is_self:
             return
         if not self.game_on:
             return
@@ -533,6 +579,7 @@ class TrickOrTreat(commands.Cog):
         """<member (optional)> shows trick or treat points"""
         if member is None:
             member = ctx.author
+        await self._load_configs(member)
         txt = "{:} has {:} points.".format(member.display_name, self.get_score(member))
         await ctx.send(txt)
 
@@ -548,19 +595,20 @@ class TrickOrTreat(commands.Cog):
         role = self.role
         if role is None:
             return await self.alt_rankings(ctx)
-        data = {m: self.get_score(m) for m in role.members}
+        # one query for the stored scores instead of a config per member
+        scores = await user_store().avalues(_score)
+        data = {m: scores.get(m.id, _start) for m in role.members}
         users = sorted(data.keys(), key=lambda u: (data[u], u.display_name), reverse=True)
         summary = ['{0.display_name} : {1}'.format(u, data[u]) for u in users]
-        print(role, data, role.members, self.channel.guild)
         channel = self.channel if self.game_on else ctx
         await split_send(channel, summary, style='```')
 
     @commands.command()
     async def alt_rankings(self, ctx):
         """Show current rankings for trick or treat"""
-        configs = await self.bot.get_user_configs()
-        players = [c for c in configs if _score in c]
-        data = {await self._member(p.user): p[_score] for p in players}
+        scores = dict(await user_store().atop(_score))
+        members = await self.bot.resolver.resolve_many(list(scores), self.channel.guild)
+        data = {m: scores[i] for i, m in members.items() if m is not None}
         users = sorted(data.keys(), key=lambda u: (data[u], u.display_name), reverse=True)
         summary = ['{0.display_name} : {1}'.format(u, data[u]) for u in users]
         channel = self.channel if self.game_on else ctx
@@ -572,7 +620,7 @@ class TrickOrTreat(commands.Cog):
         """<n> <member (optional:caller)> sets trick or treat points"""
         if member is None:
             member = ctx.author
-        UserConfig(member)[_score] = n
+        (await UserConfig.aload(member))[_score] = n
         await ctx.send('Set score of {:} to {:}.'.format(member, n))
 
     @commands.command()
@@ -634,6 +682,7 @@ if usingV2:
     async def setup(bot):
         if _game_on:
             cog = TrickOrTreat(bot)
+            await cog._load_configs(bot.user)
             await bot.add_cog(cog)
 else:
     def setup(bot):
@@ -26,10 +26,10 @@ class Listener:
         self.pin_tresh = pin_tresh
         self.del_thresh = del_thresh
 
-    def voting_message(self, message):
+    def voting_message(self, message, info=None):
         if 'any' in self.kinds:
             return True
-        data = parse_message(message)
+        data = parse_message(message) if info is None else info.parsed
         for i in data['type']:
             for kind in self.kinds:
                 try:
@@ -43,9 +43,9 @@ class Listener:
             return True
         return False
 
-    async def init_votes(self, message, check_first=True):
+    async def init_votes(self, message, check_first=True, info=None):
         if check_first:
-            if not self.voting_message(message):
+            if not self.voting_message(message, info=info):
                 return
         for e in self.emojis:
             await message.add_reaction(e)
@@ -102,18 +102,14 @@ class VoteListener(commands.Cog):
             listener = self.listeners[message.channel.id]
         except KeyError:
             return
+        info = self.bot.envelope(message)
         # ignore commands
-        try:
-            if message.content.startswith(self.bot.command_prefix):
-                return
-        except TypeError:
-            for prefix in self.bot.command_prefix:
-                if message.content.startswith(prefix):
-                    return
+        if info.is_command:
+            return
         # ignore messages from this bot
-        if message.author == self.bot.user:
+        if info.is_self:
             return
-        await listener.init_votes(message)
+        await listener.init_votes(message, info=info)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
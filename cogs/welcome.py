@@ -1,6 +1,5 @@
 import discord  # type: ignore # noqa: F401
 from discord.ext import commands  # type: ignore
-import asyncio
 import datetime
 from ..helpers import find_channel, find_role, localize
 from ..param import rc, channels, messages, roles, emoji2role
@@ -79,6 +78,7 @@ class Welcome(commands.Cog):
         self._log_channel = None
         self._welcome_channel = None
         self._init = False
+        bot.warmup.register('welcome', self._async_init)
 
     async def _async_init(self):
         if self._init:
@@ -86,11 +86,6 @@ class Welcome(commands.Cog):
         await self.clean_manual_page(None)
         self._init = True
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._async_init()
-
     async def cog_check(self, ctx):
         """Don't allow everyone to access this cog"""
         return await admin_check(ctx)
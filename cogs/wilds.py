@@ -7,7 +7,8 @@ import random
 from .. import param
 from ..helpers import find_role
 from ..config import UserConfig
-from ..async_helpers import split_send, sleep, admin_check, wait_until
+from ..async_helpers import split_send, sleep, admin_check
+from .. import warmup
 from ..version import usingV2
 import logging
 
@@ -26,6 +27,7 @@ _dday = datetime.timedelta(days=1)
 _dhour = datetime.timedelta(hours=1)
 _dmin = datetime.timedelta(minutes=1)
 _dsec = datetime.timedelta(seconds=1)
+_bounty_catch_up = 3 * 3600  # post a missed daily bounty if we are back within 3 hours
 
 
 def time_mod(time, delta, epoch=None, tz=None):
@@ -262,6 +264,8 @@ class Wilds(commands.Cog):
         self._init = False
         self._active_message_id = None
         self._configs = dict()
+        bot.warmup.register('wilds', self._do_init, priority=warmup.GAME)
+        bot.scheduler.handler('wilds.daily_bounty', self.post_daily_bounty)
 
     def __getitem__(self, key):
         try:
@@ -281,15 +285,13 @@ class Wilds(commands.Cog):
             return item in self._participants
 
     def init_daily_bounties(self):
-        self.bot.loop.create_task(self.post_daily_bounty(tomorrow=True))
+        """Schedule the next daily bounty post (if it isn't already)"""
+        tz = pytz.timezone(param.rc('timezone'))
+        self.bot.scheduler.schedule('wilds:daily_bounty', 'wilds.daily_bounty', next_time(_dday, tz=tz),
+                                    catch_up=_bounty_catch_up, replace=False)
 
-    async def post_daily_bounty(self, additional=False, tomorrow=False):
+    async def post_daily_bounty(self, additional=False):
         tz = pytz.timezone(param.rc('timezone'))
-        if tomorrow:
-            nt = next_time(_dday, tz=tz)
-            # now = datetime.datetime.now()
-            # print(nt, '|',  now, '|',  nt - now, '|', tz)
-            await wait_until(nt)
         now = datetime.datetime.now().astimezone(tz).replace(tzinfo=None)
         if additional:
             date = now.strftime("%B %d, %Y (%X)")
@@ -302,7 +304,7 @@ class Wilds(commands.Cog):
                 await c.send_multiple(self.channel, self._get_config(self.bot.user),
                                       self.bot.loop, 3)
         if not additional:
-            await self.post_daily_bounty(tomorrow=True)
+            self.init_daily_bounties()
 
     @property
     def message_id(self):
@@ -337,11 +339,6 @@ class Wilds(commands.Cog):
             return
         await self._do_init()
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await asyncio.sleep(5)
-        await self._do_init()
-
     def _is_stale(self, m):
         if m.author != self.bot.user:
             return False
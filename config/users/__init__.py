@@ -1,22 +1,30 @@
 import os
-from glob import glob
 from ...param import DataContainer
+from .store import store, encode
 
 
 _dir = os.path.split(os.path.realpath(__file__))[0]
 
 
 class UserConfig(DataContainer):
-    def __init__(self, discord_user, guild=None):
+    """Config of a user, kept in the user store (see store.py)"""
+    def __init__(self, discord_user, guild=None, data=None):
+        # the file name still identifies the config, see DataContainer
         fn = os.path.join(_dir, str(discord_user.id) + '.json')
         self.user = discord_user
         self.guild = guild
-        super().__init__(fn)
+        super().__init__(fn, data=data)
+
+    @classmethod
+    async def aload(cls, discord_user, guild=None):
+        """The UserConfig of discord_user, read on aio's disk threads instead of the event loop"""
+        return cls(discord_user, guild=guild, data=await store().aload(discord_user.id))
 
     def _gen_data(self, *args):
         return
 
+    def _load_own_data(self):
+        return store().load(self.user.id)
 
-def get_all_user_config_files():
-    out = os.path.join(os.path.split(__file__)[0], '*.json')
-    return glob(out)
+    def _write(self):
+        self._writing(store().save_soon(self.user.id, encode(self.data)))
@@ -0,0 +1,199 @@
+"""SQLite store of the per-user configs.
+
+Every UserConfig entry is a (user id, key) row holding the JSON value, plus the
+value as a number when it is one, so questions across users ("top 10 by this
+year's score", "everyone with a score") are single indexed queries instead of
+reading a JSON file per user. The database runs in WAL mode, writes go through
+aio's disk threads in order and reads made with the async helpers wait for the
+changes still buffered in UserConfigs. On the event loop, UserConfig.aload reads
+a user's config on the disk threads as well.
+
+The JSON files in this directory are imported the first time the store is
+opened (and again with `python3 -m TDTbot.config.users.store --force`). The
+bot opens the store on aio's disk threads when it starts, see MainBot.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+from glob import glob
+from ... import aio
+from ... import param
+
+
+logger = logging.getLogger('discord.' + __name__)
+_dir = os.path.split(os.path.realpath(__file__))[0]
+_fn = os.path.join(os.path.split(_dir)[0], 'users.sqlite3')
+
+_schema = """
+CREATE TABLE IF NOT EXISTS user_config (
+    user_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    num REAL,
+    PRIMARY KEY (user_id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS user_config_key_num ON user_config (key, num);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _num(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def encode(data):
+    """Rows (key, JSON value, numeric value) of a config's data, see UserStore.save"""
+    return [(k, json.dumps(v), _num(v)) for k, v in data.items()]
+
+
+class UserStore:
+    def __init__(self, fn=_fn):
+        self.fn = fn
+        self._lock = threading.Lock()  # the connection is used from the loop and aio's disk threads
+        self._pending = dict()  # user id -> rows queued by save_soon and not saved yet
+        self.db = sqlite3.connect(fn, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.db:
+            self.db.executescript(_schema)
+        if self._meta('json_migrated') is None:
+            self.migrate_json()
+
+    def _meta(self, key):
+        with self._lock:
+            row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def load(self, user_id):
+        """The config data of a user (empty if there is none), including the changes queued by save_soon"""
+        with self._lock:
+            rows = self._pending.get(user_id)
+            if rows is not None:
+                return {k: json.loads(v) for k, v, _ in rows}
+            rows = self.db.execute('SELECT key, value FROM user_config WHERE user_id = ?', (user_id,)).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def load_all(self, has_key=None):
+        """user id -> config data of every user, or of the users having has_key"""
+        sql = 'SELECT user_id, key, value FROM user_config'
+        args = ()
+        if has_key is not None:
+            sql += ' WHERE user_id IN (SELECT user_id FROM user_config WHERE key = ?)'
+            args = (has_key,)
+        out = dict()
+        with self._lock:
+            rows = self.db.execute(sql, args).fetchall()
+        for user_id, k, v in rows:
+            out.setdefault(user_id, dict())[k] = json.loads(v)
+        return out
+
+    def values(self, key):
+        """user id -> value of key, for the users having it"""
+        with self._lock:
+            rows = self.db.execute('SELECT user_id, value FROM user_config WHERE key = ?', (key,)).fetchall()
+        return {user_id: json.loads(v) for user_id, v in rows}
+
+    def top(self, key, n=None, ascending=False):
+        """[(user id, value)] of the users with the n highest (or lowest) numeric values of key"""
+        sql = 'SELECT user_id, value FROM user_config WHERE key = ? AND num IS NOT NULL ORDER BY num {} LIMIT ?'
+        with self._lock:
+            rows = self.db.execute(sql.format('ASC' if ascending else 'DESC'),
+                                   (key, -1 if n is None else n)).fetchall()
+        return [(user_id, json.loads(v)) for user_id, v in rows]
+
+    def save(self, user_id, rows):
+        """Replace the stored config of a user by the rows made by encode, in one transaction"""
+        with self._lock, self.db:
+            self.db.execute('DELETE FROM user_config WHERE user_id = ?', (user_id,))
+            self.db.executemany('INSERT OR REPLACE INTO user_config (user_id, key, value, num) VALUES (?, ?, ?, ?)',
+                                [(user_id, k, v, n) for k, v, n in rows])
+
+    def save_soon(self, user_id, rows):
+        """save from sync code, queued on aio's disk threads if the loop is running (see aio.soon).
+        load returns the queued rows until they're saved."""
+        with self._lock:
+            self._pending[user_id] = rows
+        return aio.soon(self.fn, aio.DISK, self._save_pending, user_id, rows)
+
+    def _save_pending(self, user_id, rows):
+        self.save(user_id, rows)
+        with self._lock:
+            if self._pending.get(user_id) is rows:
+                del self._pending[user_id]
+
+    async def _after_writes(self, func, *args):
+        # write out the buffered UserConfig changes and read once they are in
+        param.flush_all()
+        return await aio.serialized(self.fn, aio.DISK, func, *args)
+
+    async def aload(self, user_id):
+        """load on aio's disk threads, after the writes queued before"""
+        return await aio.serialized(self.fn, aio.DISK, self.load, user_id)
+
+    async def aload_all(self, has_key=None):
+        return await self._after_writes(self.load_all, has_key)
+
+    async def avalues(self, key):
+        return await self._after_writes(self.values, key)
+
+    async def atop(self, key, n=None, ascending=False):
+        return await self._after_writes(self.top, key, n, ascending)
+
+    def migrate_json(self, directory=_dir):
+        """Import the user config JSON files in directory, returns the number of users imported"""
+        n = 0
+        with self._lock, self.db:
+            for fn in glob(os.path.join(directory, '*.json')):
+                try:
+                    user_id = int(os.path.split(fn)[-1].split('.')[0])
+                    with open(fn, 'r') as f:
+                        data = json.load(f)
+                except (IOError, ValueError) as e:
+                    logger.warning('Skipping {}: {}'.format(fn, e))
+                    continue
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO user_config (user_id, key, value, num) VALUES (?, ?, ?, ?)',
+                    [(user_id, k, v, num) for k, v, num in encode(data)])
+                n += 1
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(n),))
+        logger.info('Imported {} user config files into {}'.format(n, self.fn))
+        return n
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def store():
+    """The user store, opened on first use (by the first caller, the others wait for it)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UserStore()
+    return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import the user config JSON files into the user store.')
+    parser.add_argument('--force', default=False, action='store_true',
+                        help='import again, overwriting the stored values of the same keys')
+    args = parser.parse_args(argv)
+    s = UserStore()
+    if args.force:
+        s.migrate_json()
+    print('{} users in {}'.format(len(s.load_all()), s.fn))
+    s.close()
+
+
+if __name__ == '__main__':
+    main()
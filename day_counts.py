@@ -0,0 +1,205 @@
+"""Messages and reactions per member per day, in memory-mapped numpy files.
+
+DayCounts keeps a uint16 count per member, day and kind (MESSAGES, REACTIONS)
+for the last `days` days, in a ring of day columns: the column of a day is its
+number (days since 1970-01-01 UTC) modulo `days`, and the columns of days
+that fall out of the window are zeroed when a new day starts. Member rows are
+added as members show up, the files double in size (in place) when they're
+full. A count is a store into the mapped memory, the files are synced with the
+DataContainers (see param.flush_all), the time of the last count every second.
+
+The mapped memory survives the bot crashing, the kernel writes it back. After
+the machine crashes the files can be up to a sync behind, so the messages of
+those seconds are missed (counts) or counted twice by the history crawl
+(time of the last count, see add_history).
+
+    config/activity_days.npy      counts, shape (capacity, days, 2)
+    config/activity_days_ids.npy  user id of every row
+    config/activity_days_meta.npy last day, rows used, start and last count time
+
+Questions are answered with array operations over the counts, no Discord API:
+
+    per_week = day_counts.weekly(4)           # rows x weeks, newest week first
+    rows = day_counts.rows_of(member_ids)     # -1 for members without counts
+"""
+import datetime
+import os
+import time
+from . import aio
+from . import param
+
+
+_dir = os.path.join(os.path.split(os.path.realpath(__file__))[0], 'config')
+MESSAGES = 0
+REACTIONS = 1
+_max = 65535  # counts saturate at the uint16 maximum
+_meta_every = 1.0  # seconds between syncs of the time of the last count
+
+
+def _timestamp(when):
+    # unix time of a datetime (naive ones are UTC) or number
+    if isinstance(when, datetime.datetime):
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=datetime.timezone.utc)
+        return when.timestamp()
+    return when
+
+
+def day_number(when=None):
+    """Days since 1970-01-01 UTC of a datetime or unix time, default now"""
+    return int(_timestamp(time.time() if when is None else when) // 86400)
+
+
+def _extend(fn, n):
+    # make the first axis of the .npy file fn n long: numpy leaves room in the header for a longer
+    # shape and the new rows (zeros) are appended by making the file longer, nothing is copied
+    import io
+    import numpy as np
+    from numpy.lib import format
+    with open(fn, 'r+b') as f:
+        version = format.read_magic(f)
+        read, write = {(1, 0): (format.read_array_header_1_0, format.write_array_header_1_0),
+                       (2, 0): (format.read_array_header_2_0, format.write_array_header_2_0)}[version]
+        shape, fortran_order, dtype = read(f)
+        offset = f.tell()
+        header = io.BytesIO()
+        write(header, dict(descr=format.dtype_to_descr(dtype), fortran_order=fortran_order,
+                           shape=(n,) + shape[1:]))
+        if fortran_order or len(header.getvalue()) != offset:
+            raise ValueError('Cannot extend {} in place'.format(fn))
+        f.truncate(offset + n * int(np.prod(shape[1:], dtype='int64')) * dtype.itemsize)
+        f.seek(0)
+        f.write(header.getvalue())
+
+
+class DayCounts:
+    def __init__(self, name='activity_days', days=400, capacity=1024, directory=_dir):
+        self.fn = os.path.join(directory, name + '.npy')
+        self._ids_fn = os.path.join(directory, name + '_ids.npy')
+        self._meta_fn = os.path.join(directory, name + '_meta.npy')
+        self.days = days
+        self._capacity = capacity
+        self.counts = None  # opened on first use, numpy is only imported then
+        self.ids = None
+        self.meta = None
+        self._rows = dict()  # user id -> row
+        self.opened = None
+        self.resume_after = None  # time of the last count before this run
+        self._meta_synced = 0.0
+
+    def _open(self):
+        if self.counts is not None:
+            return
+        from numpy.lib.format import open_memmap
+        if os.path.exists(self.fn):
+            self.counts = open_memmap(self.fn, 'r+')
+            self.ids = open_memmap(self._ids_fn, 'r+')
+            self.meta = open_memmap(self._meta_fn, 'r+')
+            self.days = self.counts.shape[1]
+        else:
+            self.counts = open_memmap(self.fn, 'w+', 'uint16', (self._capacity, self.days, 2))
+            self.ids = open_memmap(self._ids_fn, 'w+', 'int64', (self._capacity,))
+            # last day, rows used, time counting started, time of the last count
+            self.meta = open_memmap(self._meta_fn, 'w+', 'int64', (4,))
+            self.meta[:] = [day_number(), 0, int(time.time()), 0]
+        self._rows = {int(i): row for row, i in enumerate(self.ids[:self.meta[1]])}
+        self.opened = time.time()
+        self.resume_after = int(self.meta[3])
+
+    @property
+    def n(self):
+        """Rows in use"""
+        self._open()
+        return int(self.meta[1])
+
+    def _grow(self):
+        # the files are extended in place and mapped again, flushes still queued for the old
+        # mappings sync the same file
+        from numpy.lib.format import open_memmap
+        capacity = 2 * self.counts.shape[0]
+        for attr, fn in [('counts', self.fn), ('ids', self._ids_fn)]:
+            getattr(self, attr).flush()
+            _extend(fn, capacity)
+            setattr(self, attr, open_memmap(fn, 'r+'))
+
+    def _row(self, user_id):
+        row = self._rows.get(user_id)
+        if row is None:
+            row = self.n
+            if row == self.counts.shape[0]:
+                self._grow()
+            self.ids[row] = user_id
+            self.meta[1] = row + 1
+            self._rows[user_id] = row
+        return row
+
+    def _advance(self, day):
+        # zero the columns of the days between the last day and day, they're reused
+        last = int(self.meta[0])
+        if day <= last:
+            return
+        for d in range(last + 1, min(day, last + self.days) + 1):
+            self.counts[:, d % self.days, :] = 0
+        self.meta[0] = day
+
+    def add(self, user_id, kind=MESSAGES, when=None, n=1):
+        """Count n messages (or reactions) of user_id on the day of when (default now)"""
+        self._open()
+        day = day_number(when)
+        self._advance(day)
+        if day <= self.meta[0] - self.days:
+            return
+        row, col = self._row(user_id), day % self.days
+        self.counts[row, col, kind] = min(_max, int(self.counts[row, col, kind]) + n)
+        if when is None:
+            now = time.time()
+            self.meta[3] = int(now)
+            if now - self._meta_synced >= _meta_every:
+                self._meta_synced = now
+                aio.soon(self._meta_fn, aio.DISK, self.meta.flush)
+        param.mark_dirty(self)
+
+    def add_history(self, user_id, created_at, kind=MESSAGES):
+        """Count a message found in the channel history unless it was counted when it came in:
+        messages from before counting started, and from the second of the last count before this
+        run (resume_after, included) until this run started (opened, excluded). The messages of
+        that second can be counted twice, none of the gap are missed."""
+        self._open()
+        t = _timestamp(created_at)
+        if t < self.meta[2] or self.resume_after <= t < self.opened:
+            self.add(user_id, kind=kind, when=t)
+
+    def flush(self):
+        """Sync the files on aio's disk threads"""
+        if self.counts is not None:
+            aio.soon(self.fn, aio.DISK, self._sync)
+
+    def _sync(self):
+        # the arrays as they are when the sync runs, _grow can replace them
+        for a in [self.counts, self.ids, self.meta]:
+            a.flush()
+
+    def rows_of(self, user_ids):
+        """Rows of user_ids as a numpy array, -1 for users without counts"""
+        import numpy as np
+        self._open()
+        return np.fromiter((self._rows.get(i, -1) for i in user_ids), np.int64, len(user_ids))
+
+    def _columns(self, start, end):
+        # columns of the days start to end (exclusive) days ago, as far back as the days kept
+        import numpy as np
+        self._open()
+        self._advance(day_number())
+        today = int(self.meta[0])
+        return (today - np.arange(start, min(end, self.days))) % self.days
+
+    def totals(self, start, end, kind=MESSAGES):
+        """Counts of every row summed over the days start to end (exclusive) days ago"""
+        return self.counts[:self.n, self._columns(start, end), kind].sum(axis=1, dtype='int64')
+
+    def weekly(self, weeks, kind=MESSAGES):
+        """Counts of every row per week, rows x weeks, week 0 is the last seven days"""
+        cols = self._columns(0, 7 * weeks)
+        weeks = len(cols) // 7
+        out = self.counts[:self.n, cols[:7 * weeks], kind].astype('int64')
+        return out.reshape(self.n, weeks, 7).sum(axis=2)
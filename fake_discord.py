@@ -0,0 +1,658 @@
+"""Local stand-in for the subset of Discord's REST API the bot uses.
+
+FakeDiscord is an aiohttp app keeping guilds, members, channels, messages,
+reactions, pins and an audit log in memory. It answers the routes behind
+fetch_message, history, reaction users, role and member edits, purge, pins,
+audit logs and fetch_member the way Discord does, including per-route
+rate-limit headers and 429s, with a configurable latency. Every request is
+logged and counted per route, so tests and benchmarks can tell how many REST
+calls a flow (a trick-or-treat round, an activity purge) makes.
+
+The state is seeded from gateway payloads (READY, GUILD_CREATE, member
+chunks, messages and reactions), e.g. a recording made for replay.py, and
+discord.py is pointed at the server with patch_discord() until the server
+stops (or the function it returns is called):
+
+    server = FakeDiscord(latency=0.05)
+    server.seed_recording('logs/events-20261018-120000.jsonl.gz')
+    await server.start()
+    server.patch_discord()
+    ...
+    await server.stop()
+
+or run standalone with python3 -m TDTbot.fake_discord --seed <recording>.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import random
+import time
+from aiohttp import web
+from . import replay
+
+
+logger = logging.getLogger('discord.' + __name__)
+_discord_epoch = 1420070400000  # ms, start of discord snowflakes
+_seq = 0
+
+# (requests, per seconds) per route, the rest get _default_limit
+LIMITS = {
+    'POST /channels/{channel_id}/messages': (5, 5.0),
+    'DELETE /channels/{channel_id}/messages/{message_id}': (5, 1.0),
+    'POST /channels/{channel_id}/messages/bulk-delete': (1, 1.0),
+    'PUT /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me': (1, 0.25),
+    'DELETE /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me': (1, 0.25),
+    'DELETE /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/{member_id}': (1, 0.25),
+    'PATCH /guilds/{guild_id}/members/{user_id}': (10, 10.0),
+    'PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}': (10, 10.0),
+    'DELETE /guilds/{guild_id}/members/{user_id}/roles/{role_id}': (10, 10.0),
+    'GET /guilds/{guild_id}/audit-logs': (5, 5.0),
+}
+_default_limit = (50, 1.0)
+_global_limit = (50, 1.0)
+
+
+def snowflake():
+    """A new unique discord id for now"""
+    global _seq
+    _seq += 1
+    return (int(time.time() * 1000) - _discord_epoch) << 22 | _seq % 4096
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _emoji_key(emoji):
+    """Route form of an emoji: name:id for custom ones, the character otherwise"""
+    if isinstance(emoji, dict):
+        return '{name}:{id}'.format(**emoji) if emoji.get('id') else emoji['name']
+    return emoji
+
+
+def _json(data, status=200):
+    # discord.py only decodes bodies of type application/json, json_response adds a charset
+    return web.Response(body=json.dumps(data).encode(), status=status, content_type='application/json')
+
+
+def _error(status, message, code=0):
+    return _json(dict(message=message, code=code), status=status)
+
+
+class _Window:
+    """Fixed rate-limit window, reset `per` seconds after its first request"""
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset = 0
+
+    def hit(self, now):
+        """Take a request, returns the seconds to wait if the window is used up"""
+        if now >= self.reset:
+            self.remaining = self.limit
+            self.reset = now + self.per
+        if self.remaining <= 0:
+            return self.reset - now
+        self.remaining -= 1
+        return 0
+
+
+class FakeDiscord:
+    def __init__(self, latency=0.0, jitter=0.0, limits=None, rate_limits=True):
+        self.latency = latency  # seconds added to every request
+        self.jitter = jitter    # plus up to this many random seconds
+        self.limits = dict(LIMITS if limits is None else limits)
+        self.rate_limits = rate_limits
+        self.user = dict(id=str(snowflake()), username='TDTbot', discriminator='0000', avatar=None, bot=True)
+        self.users = dict()      # id -> user
+        self.guilds = dict()     # id -> guild (without channels and members)
+        self.members = dict()    # guild id -> user id -> member
+        self.channels = dict()   # id -> channel
+        self.messages = dict()   # channel id -> message id -> message
+        self.reactions = dict()  # (message id, emoji key) -> list of user ids
+        self.pins = dict()       # channel id -> list of message ids
+        self.audit_log = dict()  # guild id -> list of entries, newest first
+        self.requests = collections.Counter()  # 'METHOD /route/{param}' -> requests
+        self.rate_limited = collections.Counter()  # same, for the ones answered with 429
+        self.log = collections.deque(maxlen=10000)  # (time, method, route, url, status, seconds)
+        self._windows = dict()  # (route, major parameter) -> _Window
+        self._global = _Window(*_global_limit)
+        self._runner = None
+        self.url = None
+        self._base = None  # discord.py's API url while patched
+
+    # seeding from gateway payloads
+
+    def seed(self, t, data):
+        """Add the state carried by gateway event t (as recorded by replay.Recorder)"""
+        if t == 'READY':
+            self.user = data['user']
+            self.users[data['user']['id']] = data['user']
+        elif t == 'GUILD_CREATE':
+            guild = {k: v for k, v in data.items() if k not in ['channels', 'members', 'threads', 'presences']}
+            self.guilds[data['id']] = guild
+            for channel in data.get('channels', []):
+                channel = dict(channel, guild_id=data['id'])
+                self.channels[channel['id']] = channel
+                self.messages.setdefault(channel['id'], dict())
+            for member in data.get('members', []):
+                self._add_member(data['id'], member)
+        elif t in ['GUILD_MEMBERS_CHUNK']:
+            for member in data['members']:
+                self._add_member(data['guild_id'], member)
+        elif t in ['GUILD_MEMBER_ADD', 'GUILD_MEMBER_UPDATE']:
+            old = self.members.get(data['guild_id'], dict()).get(data['user']['id'], dict())
+            self._add_member(data['guild_id'], dict(old, **{k: v for k, v in data.items() if k != 'guild_id'}))
+        elif t == 'GUILD_MEMBER_REMOVE':
+            self.members.get(data['guild_id'], dict()).pop(data['user']['id'], None)
+        elif t == 'MESSAGE_CREATE':
+            message = {k: v for k, v in data.items() if k != 'member'}
+            self.messages.setdefault(data['channel_id'], dict())[data['id']] = message
+            self.users[data['author']['id']] = data['author']
+        elif t == 'MESSAGE_UPDATE':
+            message = self.messages.get(data['channel_id'], dict()).get(data['id'])
+            if message is not None:
+                message.update({k: v for k, v in data.items() if k != 'member'})
+        elif t == 'MESSAGE_DELETE':
+            self.messages.get(data['channel_id'], dict()).pop(data['id'], None)
+        elif t == 'MESSAGE_DELETE_BULK':
+            for i in data['ids']:
+                self.messages.get(data['channel_id'], dict()).pop(i, None)
+        elif t in ['MESSAGE_REACTION_ADD', 'MESSAGE_REACTION_REMOVE']:
+            message = self.messages.get(data['channel_id'], dict()).get(data['message_id'])
+            if message is not None:
+                self._react(message, data['emoji'], data['user_id'], t == 'MESSAGE_REACTION_ADD')
+
+    def seed_recording(self, fn, events=('READY', 'GUILD_CREATE', 'GUILD_MEMBERS_CHUNK')):
+        """Seed from a replay.py recording, by default only from its startup events"""
+        for dt, t, data in replay.read(fn):
+            if events is None or t in events:
+                self.seed(t, data)
+
+    def _add_member(self, guild_id, member):
+        self.users[member['user']['id']] = member['user']
+        self.members.setdefault(guild_id, dict())[member['user']['id']] = member
+
+    def _react(self, message, emoji, user_id, add):
+        users = self.reactions.setdefault((message['id'], _emoji_key(emoji)), [])
+        if add and user_id not in users:
+            users.append(user_id)
+        elif not add and user_id in users:
+            users.remove(user_id)
+        reactions = [r for r in message.get('reactions', []) if _emoji_key(r['emoji']) != _emoji_key(emoji)]
+        if users:
+            if not isinstance(emoji, dict):
+                emoji = dict(id=None, name=emoji)
+            reactions.append(dict(emoji=emoji, count=len(users), me=self.user['id'] in users))
+        message['reactions'] = reactions
+
+    def _audit(self, guild_id, action_type, target_id, changes=(), reason=None):
+        entry = dict(id=str(snowflake()), user_id=self.user['id'], target_id=target_id,
+                     action_type=action_type, changes=list(changes), reason=reason)
+        self.audit_log.setdefault(guild_id, []).insert(0, entry)
+
+    # server
+
+    def patch_discord(self):
+        """Send discord.py's REST requests to this server, until stop or unpatch_discord (returned)"""
+        import discord  # type: ignore
+        if self._base is None:
+            self._base = discord.http.Route.BASE
+        discord.http.Route.BASE = self.url
+        return self.unpatch_discord
+
+    def unpatch_discord(self):
+        """Send discord.py's REST requests to discord again"""
+        if self._base is not None:
+            import discord  # type: ignore
+            discord.http.Route.BASE, self._base = self._base, None
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Serve on host:port (0 picks a free port), the base url is in self.url"""
+        app = web.Application(middlewares=[self._middleware])
+        for method, path, handler in self._routes():
+            app.router.add_route(method, path, handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        self.url = 'http://{}:{}'.format(host, port)
+        logger.info('Fake discord serving on ' + self.url)
+        return self.url
+
+    async def stop(self):
+        self.unpatch_discord()
+        if self._runner is not None:
+            runner, self._runner = self._runner, None
+            await runner.cleanup()
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        start = time.monotonic()
+        resource = request.match_info.route.resource
+        route = request.method + ' ' + (resource.canonical if resource is not None else request.path)
+        self.requests[route] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        headers = dict()
+        if self.rate_limits and resource is not None:
+            response, headers = self._rate_limit(route, request)
+        else:
+            response = None
+        if response is None:
+            try:
+                response = await handler(request)
+            except KeyError as e:
+                response = _error(404, 'Unknown {}'.format(e.args[0]), 10000)
+        response.headers.update(headers)
+        status = response.status
+        self.log.append((time.time(), request.method, route, str(request.rel_url), status,
+                         time.monotonic() - start))
+        logger.debug('{} {} -> {}'.format(request.method, request.rel_url, status))
+        return response
+
+    def _rate_limit(self, route, request):
+        """Returns a 429 response or None, and the rate-limit headers"""
+        now = time.time()
+        major = ''
+        for key in ['channel_id', 'guild_id', 'webhook_id']:
+            if key in request.match_info:
+                major = request.match_info[key]
+                break
+        limit, per = self.limits.get(route, _default_limit)
+        window = self._windows.get((route, major))
+        if window is None:
+            window = self._windows[route, major] = _Window(limit, per)
+        wait = self._global.hit(now)
+        is_global = wait > 0
+        if not is_global:
+            wait = window.hit(now)
+        headers = {'X-RateLimit-Limit': str(window.limit),
+                   'X-RateLimit-Remaining': str(window.remaining),
+                   'X-RateLimit-Reset': '{:.3f}'.format(window.reset),
+                   'X-RateLimit-Reset-After': '{:.3f}'.format(max(0, window.reset - now)),
+                   'X-RateLimit-Bucket': '{:x}'.format(hash(route) & 0xffffffff)}
+        if not wait:
+            return None, headers
+        self.rate_limited[route] += 1
+        headers['Retry-After'] = str(int(wait) + 1)
+        headers['X-RateLimit-Scope'] = 'global' if is_global else 'user'
+        if is_global:
+            headers['X-RateLimit-Global'] = 'true'
+        body = dict(message='You are being rate limited.', retry_after=round(wait, 3), code=0)
+        body['global'] = is_global
+        return _json(body, status=429), headers
+
+    def _routes(self):
+        c = '/channels/{channel_id}'
+        m = c + '/messages/{message_id}'
+        g = '/guilds/{guild_id}'
+        return [
+            ('GET', '/gateway', self._gateway),
+            ('GET', '/gateway/bot', self._gateway),
+            ('GET', '/users/@me', self._me),
+            ('GET', '/oauth2/applications/@me', self._application),
+            ('GET', '/users/{user_id}', self._get_user),
+            ('POST', '/users/@me/channels', self._create_dm),
+            ('GET', g, self._get_guild),
+            ('GET', g + '/channels', self._guild_channels),
+            ('GET', g + '/roles', self._guild_roles),
+            ('GET', g + '/members', self._list_members),
+            ('GET', g + '/members/{user_id}', self._get_member),
+            ('PATCH', g + '/members/{user_id}', self._edit_member),
+            ('DELETE', g + '/members/{user_id}', self._kick),
+            ('PUT', g + '/members/{user_id}/roles/{role_id}', self._add_role),
+            ('DELETE', g + '/members/{user_id}/roles/{role_id}', self._remove_role),
+            ('GET', g + '/audit-logs', self._audit_logs),
+            ('GET', c, self._get_channel),
+            ('GET', c + '/messages', self._history),
+            ('POST', c + '/messages', self._send),
+            ('POST', c + '/messages/bulk-delete', self._bulk_delete),
+            ('GET', m, self._get_message),
+            ('PATCH', m, self._edit_message),
+            ('DELETE', m, self._delete_message),
+            ('GET', c + '/pins', self._get_pins),
+            ('PUT', c + '/pins/{message_id}', self._pin),
+            ('DELETE', c + '/pins/{message_id}', self._unpin),
+            ('PUT', m + '/reactions/{emoji}/@me', self._add_reaction),
+            ('DELETE', m + '/reactions/{emoji}/@me', self._remove_own_reaction),
+            ('DELETE', m + '/reactions/{emoji}/{member_id}', self._remove_reaction),
+            ('GET', m + '/reactions/{emoji}', self._reaction_users),
+            ('DELETE', m + '/reactions', self._clear_reactions),
+            ('POST', c + '/typing', self._no_content),
+        ]
+
+    # lookups, a KeyError becomes a 404
+
+    def _channel(self, request):
+        channel_id = request.match_info['channel_id']
+        if channel_id not in self.channels:
+            raise KeyError('Channel')
+        return self.channels[channel_id]
+
+    def _message(self, request):
+        self._channel(request)
+        try:
+            return self.messages[request.match_info['channel_id']][request.match_info['message_id']]
+        except KeyError:
+            raise KeyError('Message')
+
+    def _member(self, request):
+        try:
+            return self.members[request.match_info['guild_id']][request.match_info['user_id']]
+        except KeyError:
+            raise KeyError('Member')
+
+    @staticmethod
+    async def _payload(request):
+        if request.content_type.startswith('multipart/'):
+            form = await request.post()
+            return json.loads(form.get('payload_json', '{}'))
+        if request.can_read_body:
+            return await request.json()
+        return dict()
+
+    # handlers
+
+    async def _no_content(self, request):
+        return web.Response(status=204)
+
+    async def _gateway(self, request):
+        # only REST is faked, there is no gateway to connect to
+        return _json(dict(url='ws://127.0.0.1:9', shards=1))
+
+    async def _me(self, request):
+        return _json(self.user)
+
+    async def _application(self, request):
+        # fetched by Client.login
+        return _json(dict(id=self.user['id'], name=self.user['username'], description='', icon=None,
+                          bot_public=False, bot_require_code_grant=False, owner=self.user, verify_key='',
+                          flags=0))
+
+    async def _get_user(self, request):
+        try:
+            return _json(self.users[request.match_info['user_id']])
+        except KeyError:
+            return _error(404, 'Unknown User', 10013)
+
+    async def _create_dm(self, request):
+        payload = await self._payload(request)
+        user = self.users.get(str(payload.get('recipient_id')))
+        if user is None:
+            return _error(404, 'Unknown User', 10013)
+        for channel in self.channels.values():
+            if channel['type'] == 1 and channel['recipients'][0]['id'] == user['id']:
+                return _json(channel)
+        channel = dict(id=str(snowflake()), type=1, recipients=[user], last_message_id=None)
+        self.channels[channel['id']] = channel
+        self.messages[channel['id']] = dict()
+        return _json(channel)
+
+    async def _get_guild(self, request):
+        try:
+            return _json(self.guilds[request.match_info['guild_id']])
+        except KeyError:
+            return _error(404, 'Unknown Guild', 10004)
+
+    async def _guild_channels(self, request):
+        guild_id = request.match_info['guild_id']
+        return _json([c for c in self.channels.values() if c.get('guild_id') == guild_id])
+
+    async def _guild_roles(self, request):
+        return _json(self.guilds[request.match_info['guild_id']].get('roles', []))
+
+    async def _list_members(self, request):
+        members = sorted(self.members.get(request.match_info['guild_id'], dict()).values(),
+                         key=lambda x: int(x['user']['id']))
+        after = int(request.query.get('after', 0))
+        limit = int(request.query.get('limit', 1))
+        return _json([i for i in members if int(i['user']['id']) > after][:limit])
+
+    async def _get_member(self, request):
+        try:
+            return _json(self._member(request))
+        except KeyError:
+            return _error(404, 'Unknown Member', 10007)
+
+    async def _edit_member(self, request):
+        member = self._member(request)
+        payload = await self._payload(request)
+        if 'roles' in payload:
+            old, new = set(member.get('roles', [])), set(str(i) for i in payload['roles'])
+            changes = []
+            if new - old:
+                changes.append({'key': '$add', 'new_value': [{'id': i} for i in sorted(new - old)]})
+            if old - new:
+                changes.append({'key': '$remove', 'new_value': [{'id': i} for i in sorted(old - new)]})
+            member['roles'] = sorted(new)
+            self._audit(request.match_info['guild_id'], 25, member['user']['id'], changes,
+                        request.headers.get('X-Audit-Log-Reason'))
+        if 'nick' in payload:
+            member['nick'] = payload['nick']
+        return _json(member)
+
+    async def _change_role(self, request, add):
+        member = self._member(request)
+        role_id = request.match_info['role_id']
+        roles = set(member.get('roles', []))
+        if add != (role_id in roles):
+            roles.symmetric_difference_update([role_id])
+            member['roles'] = sorted(roles)
+            key = '$add' if add else '$remove'
+            self._audit(request.match_info['guild_id'], 25, member['user']['id'],
+                        [{'key': key, 'new_value': [{'id': role_id}]}], request.headers.get('X-Audit-Log-Reason'))
+        return web.Response(status=204)
+
+    async def _add_role(self, request):
+        return await self._change_role(request, True)
+
+    async def _remove_role(self, request):
+        return await self._change_role(request, False)
+
+    async def _kick(self, request):
+        member = self._member(request)
+        del self.members[request.match_info['guild_id']][member['user']['id']]
+        self._audit(request.match_info['guild_id'], 20, member['user']['id'],
+                    reason=request.headers.get('X-Audit-Log-Reason'))
+        return web.Response(status=204)
+
+    async def _audit_logs(self, request):
+        entries = self.audit_log.get(request.match_info['guild_id'], [])
+        if 'action_type' in request.query:
+            entries = [e for e in entries if e['action_type'] == int(request.query['action_type'])]
+        if 'user_id' in request.query:
+            entries = [e for e in entries if e['user_id'] == request.query['user_id']]
+        if 'before' in request.query:
+            entries = [e for e in entries if int(e['id']) < int(request.query['before'])]
+        entries = entries[:int(request.query.get('limit', 50))]
+        users = {e['target_id']: self.users.get(e['target_id']) for e in entries}
+        users[self.user['id']] = self.user
+        return _json(dict(audit_log_entries=entries, users=[u for u in users.values() if u],
+                          webhooks=[], threads=[], integrations=[], application_commands=[],
+                          auto_moderation_rules=[], guild_scheduled_events=[]))
+
+    async def _get_channel(self, request):
+        try:
+            return _json(self._channel(request))
+        except KeyError:
+            return _error(404, 'Unknown Channel', 10003)
+
+    async def _history(self, request):
+        try:
+            self._channel(request)
+        except KeyError:
+            return _error(404, 'Unknown Channel', 10003)
+        messages = sorted(self.messages[request.match_info['channel_id']].values(),
+                          key=lambda x: int(x['id']), reverse=True)
+        limit = int(request.query.get('limit', 50))
+        query = request.query
+        if 'before' in query:
+            messages = [i for i in messages if int(i['id']) < int(query['before'])]
+        elif 'after' in query:
+            # the oldest ones after the id, still sent newest first
+            messages = [i for i in messages if int(i['id']) > int(query['after'])][-limit:]
+        elif 'around' in query:
+            older = [i for i in messages if int(i['id']) <= int(query['around'])]
+            newer = [i for i in messages if int(i['id']) > int(query['around'])]
+            messages = newer[-(limit // 2):] + older[:limit - limit // 2] if limit > 1 else older[:1]
+        return _json(messages[:limit])
+
+    async def _send(self, request):
+        try:
+            channel = self._channel(request)
+        except KeyError:
+            return _error(404, 'Unknown Channel', 10003)
+        payload = await self._payload(request)
+        message = dict(id=str(snowflake()), channel_id=channel['id'], author=self.user,
+                       content=payload.get('content') or '', embeds=payload.get('embeds') or [],
+                       attachments=[], mentions=[], mention_roles=[], mention_everyone=False,
+                       pinned=False, tts=False, type=0, flags=0, timestamp=_now(), edited_timestamp=None,
+                       reactions=[])
+        if 'message_reference' in payload:
+            message['message_reference'] = payload['message_reference']
+        if channel.get('guild_id'):
+            message['guild_id'] = channel['guild_id']
+        self.messages[channel['id']][message['id']] = message
+        channel['last_message_id'] = message['id']
+        return _json(message)
+
+    async def _get_message(self, request):
+        try:
+            return _json(self._message(request))
+        except KeyError:
+            return _error(404, 'Unknown Message', 10008)
+
+    async def _edit_message(self, request):
+        try:
+            message = self._message(request)
+        except KeyError:
+            return _error(404, 'Unknown Message', 10008)
+        if message['author']['id'] != self.user['id']:
+            return _error(403, 'Cannot edit a message authored by another user', 50005)
+        payload = await self._payload(request)
+        for key in ['content', 'embeds']:
+            if key in payload:
+                message[key] = payload[key] or ([] if key == 'embeds' else '')
+        message['edited_timestamp'] = _now()
+        return _json(message)
+
+    async def _delete_message(self, request):
+        try:
+            message = self._message(request)
+        except KeyError:
+            return _error(404, 'Unknown Message', 10008)
+        del self.messages[message['channel_id']][message['id']]
+        return web.Response(status=204)
+
+    async def _bulk_delete(self, request):
+        channel = self._channel(request)
+        payload = await self._payload(request)
+        messages = payload.get('messages', [])
+        if not 2 <= len(messages) <= 100:
+            return _error(400, 'Bulk delete needs 2 to 100 messages', 50016)
+        for i in messages:
+            self.messages[channel['id']].pop(str(i), None)
+        return web.Response(status=204)
+
+    async def _get_pins(self, request):
+        channel = self._channel(request)
+        messages = self.messages[channel['id']]
+        return _json([messages[i] for i in reversed(self.pins.get(channel['id'], []))
+                      if i in messages])
+
+    async def _pin(self, request):
+        message = self._message(request)
+        pins = self.pins.setdefault(message['channel_id'], [])
+        if len(pins) >= 50:
+            return _error(400, 'Maximum number of pins reached (50)', 30003)
+        if message['id'] not in pins:
+            pins.append(message['id'])
+        message['pinned'] = True
+        return web.Response(status=204)
+
+    async def _unpin(self, request):
+        message = self._message(request)
+        pins = self.pins.get(message['channel_id'], [])
+        if message['id'] in pins:
+            pins.remove(message['id'])
+        message['pinned'] = False
+        return web.Response(status=204)
+
+    async def _add_reaction(self, request):
+        try:
+            message = self._message(request)
+        except KeyError:
+            return _error(404, 'Unknown Message', 10008)
+        self._react(message, request.match_info['emoji'], self.user['id'], True)
+        return web.Response(status=204)
+
+    async def _remove_own_reaction(self, request):
+        message = self._message(request)
+        self._react(message, request.match_info['emoji'], self.user['id'], False)
+        return web.Response(status=204)
+
+    async def _remove_reaction(self, request):
+        message = self._message(request)
+        self._react(message, request.match_info['emoji'], request.match_info['member_id'], False)
+        return web.Response(status=204)
+
+    async def _reaction_users(self, request):
+        message = self._message(request)
+        users = self.reactions.get((message['id'], request.match_info['emoji']), [])
+        after = int(request.query.get('after', 0))
+        limit = int(request.query.get('limit', 25))
+        ids = sorted(int(i) for i in users if int(i) > after)[:limit]
+        unknown = dict(username='unknown', discriminator='0000', avatar=None)
+        return _json([self.users.get(str(i), dict(unknown, id=str(i))) for i in ids])
+
+    async def _clear_reactions(self, request):
+        message = self._message(request)
+        for key in [k for k in self.reactions if k[0] == message['id']]:
+            del self.reactions[key]
+        message['reactions'] = []
+        return web.Response(status=204)
+
+    def report(self):
+        """Requests per route, most requested first"""
+        out = ['{} requests, {} rate limited'.format(sum(self.requests.values()), sum(self.rate_limited.values()))]
+        for route, n in self.requests.most_common():
+            limited = self.rate_limited.get(route)
+            out.append('{:7} {}{}'.format(n, route, ' ({} rate limited)'.format(limited) if limited else ''))
+        return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a fake discord REST API.')
+    parser.add_argument('-p', '--port', type=int, default=8555)
+    parser.add_argument('-s', '--seed', default=None, help='replay.py recording to take the guilds from')
+    parser.add_argument('-l', '--latency', type=float, default=0.0, help='seconds added to each request')
+    parser.add_argument('-j', '--jitter', type=float, default=0.0, help='up to this many random seconds more')
+    parser.add_argument('--no-rate-limits', dest='rate_limits', default=True, action='store_false')
+    parser.add_argument('-v', '--verbose', default=False, action='store_true')
+    args = parser.parse_args(argv)
+    from . import log_init
+    log_init.init_logging(verbose=args.verbose)
+    server = FakeDiscord(latency=args.latency, jitter=args.jitter, rate_limits=args.rate_limits)
+    if args.seed:
+        server.seed_recording(args.seed)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(server.start(port=args.port))
+    print('Serving on {0}, set discord.http.Route.BASE = "{0}"'.format(server.url))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.stop())
+        loop.close()
+    print('\n'.join(server.report()))
+
+
+if __name__ == '__main__':
+    main()
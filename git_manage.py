@@ -1,19 +1,28 @@
-import git  # type: ignore
 import os
 import datetime
 import humanize  # type: ignore
 import pytz
 
 directory = os.path.split(os.path.realpath(__file__))[0]
-own_repo = git.Repo(directory)
+_own_repo = None
+
+
+def own_repo():
+    """This package's repo (GitPython is imported on first use, it is slow to import)"""
+    global _own_repo
+    if _own_repo is None:
+        import git  # type: ignore
+        _own_repo = git.Repo(directory)
+    return _own_repo
 
 
 def update(repo=None):
     """Update TDTbot module with a git pull... to git good."""
     if repo is None:
-        repo = own_repo
+        repo = own_repo()
     elif hasattr(repo, 'lower'):
         if os.path.isdir(repo):
+            import git  # type: ignore
             repo = git.Repo(repo)
     repo.remote().pull()
 
@@ -23,7 +32,7 @@ def git_log_items(repo=None, look_back=None):
     "look_back" (datetime) defaults to 7 days ago"""
     now = pytz.utc.localize(datetime.datetime.utcnow())
     if repo is None:
-        repo = own_repo
+        repo = own_repo()
     if look_back is None:
         look_back = datetime.timedelta(days=7)
     if isinstance(look_back, datetime.timedelta):
@@ -42,5 +51,5 @@ def git_log_items(repo=None, look_back=None):
 
 def last_updated(repo=None):
     if repo is None:
-        repo = own_repo
+        repo = own_repo()
     return repo.head.commit.committed_datetime
@@ -0,0 +1,142 @@
+"""In-memory id/name index of the channels, roles and emojis in each guild.
+
+helpers.find_channel, find_role and find_emoji look things up here instead of
+scanning the guild's lists. An index is built the first time a guild is looked
+up and MainBot keeps it current from the create/update/delete gateway events."""
+import logging
+
+
+logger = logging.getLogger('discord.' + __name__)
+_indexes = dict()  # guild id -> GuildIndex
+
+
+def normalize(name):
+    """Normalized form of a name for case/whitespace insensitive lookups"""
+    return name.lower().strip()
+
+
+class _Table:
+    """Lookup of one kind of guild object by id and by name"""
+    def __init__(self, items=(), fold=True):
+        self.fold = fold
+        self.ids = dict()
+        self.names = dict()
+        self._keys = dict()  # id -> name key the object is stored under
+        for item in items:
+            self.add(item)
+
+    def key(self, name):
+        return normalize(name) if self.fold else name
+
+    def add(self, item):
+        if item.id in self.ids:
+            self.remove(item)
+        key = self.key(item.name)
+        self.ids[item.id] = item
+        self._keys[item.id] = key
+        self.names.setdefault(key, []).append(item)
+
+    def remove(self, item):
+        self.ids.pop(item.id, None)
+        key = self._keys.pop(item.id, None)
+        same = [i for i in self.names.get(key, []) if i.id != item.id]
+        if same:
+            self.names[key] = same
+        else:
+            self.names.pop(key, None)
+
+    def update(self, before, after):
+        self.remove(before)
+        self.add(after)
+
+    def by_id(self, idn):
+        return self.ids.get(idn)
+
+    def by_name(self, name):
+        try:
+            return self.names[self.key(name)][0]
+        except (KeyError, IndexError):
+            return None
+
+
+class GuildIndex:
+    """Channels, roles and emojis of a guild by id and normalized name
+    (emoji names are case sensitive, like the scans they replace)"""
+    def __init__(self, guild):
+        self.guild = guild
+        self.channels = _Table(guild.channels)
+        self.roles = _Table(guild.roles)
+        self.emojis = _Table(guild.emojis, fold=False)
+
+    def reset_emojis(self, emojis=None):
+        self.emojis = _Table(self.guild.emojis if emojis is None else emojis, fold=False)
+
+
+def get(guild):
+    """Return the index for a guild, (re)building it if needed"""
+    index = _indexes.get(guild.id)
+    # a new guild object means discord.py rebuilt its cache, so follow suit
+    if index is None or index.guild is not guild:
+        index = rebuild(guild)
+    return index
+
+
+def rebuild(guild):
+    index = GuildIndex(guild)
+    _indexes[guild.id] = index
+    logger.debug('Indexed guild {0}: {1} channels, {2} roles, {3} emojis'.format(
+        guild, len(index.channels.ids), len(index.roles.ids), len(index.emojis.ids)))
+    return index
+
+
+def drop(guild):
+    _indexes.pop(getattr(guild, 'id', guild), None)
+
+
+def _existing(guild):
+    """Index for a guild only if it is already built (events don't need to build it)"""
+    index = _indexes.get(guild.id)
+    if index is not None and index.guild is guild:
+        return index
+
+
+def channel_added(channel):
+    index = _existing(channel.guild)
+    if index:
+        index.channels.add(channel)
+
+
+def channel_removed(channel):
+    index = _existing(channel.guild)
+    if index:
+        index.channels.remove(channel)
+
+
+def channel_updated(before, after):
+    index = _existing(after.guild)
+    if index:
+        index.channels.update(before, after)
+
+
+def role_added(role):
+    index = _existing(role.guild)
+    if index:
+        index.roles.add(role)
+
+
+def role_removed(role):
+    index = _existing(role.guild)
+    if index:
+        index.roles.remove(role)
+
+
+def role_updated(before, after):
+    index = _existing(after.guild)
+    if index:
+        index.roles.update(before, after)
+
+
+def emojis_updated(guild, after):
+    index = _existing(guild)
+    if index:
+        index.reset_emojis(after)
@@ -1,5 +1,6 @@
 from .param import rc as _rc
 from . import param
+from . import guild_index
 import re
 import datetime
 import pytz
@@ -20,19 +21,15 @@ def find_channel(guild, channel=None):
         channel = _rc('channel')
     if type(channel) not in [str, int]:
         return channel
+    index = guild_index.get(guild)
     try:
         channel = int(channel)
-        try:
-            return [i for i in guild.channels if i.id == channel][0]
-        except IndexError:
-            return
+        return index.channels.by_id(channel)
     except ValueError:
         pass
-    try:
-        return [i for i in guild.channels
-                if i.name.lower().strip() == channel.lower().strip()][0]
-    except IndexError:
-        pass
+    out = index.channels.by_name(channel)
+    if out is not None:
+        return out
     if channel.startswith('#'):
         return find_channel(guild, channel.lstrip('#'))
     if channel.startswith('<#') and channel.endswith('>'):
@@ -44,13 +41,18 @@ def find_channel(guild, channel=None):
 
 def find_role(guild, name):
     """Find a role in a guild based on its name"""
-    try:
-        if isinstance(name, int):
-            return [i for i in guild.roles if i.id == name][0]
-        else:
-            return [i for i in guild.roles if i.name.lower() == name.lower()][0]
-    except IndexError:
-        return
+    index = guild_index.get(guild)
+    if isinstance(name, int):
+        return index.roles.by_id(name)
+    return index.roles.by_name(name)
+
+
+def find_emoji(guild, name):
+    """Find a custom emoji in a guild based on its name (case sensitive) or id"""
+    index = guild_index.get(guild)
+    if isinstance(name, int):
+        return index.emojis.by_id(name)
+    return index.emojis.by_name(name)
 
 
 _regex = re.compile(
@@ -112,7 +114,8 @@ def parse_filetype(filepath: str, force_list=True):
 
 def parse_message(message):
     out = dict()
-    out['urls'] = [i for i in message.content.split(' ') if valid_url(i)]
+    # only tokens with a scheme can pass the url regex, so skip the rest cheaply
+    out['urls'] = [i for i in message.content.split(' ') if '://' in i and valid_url(i)]
     try:
         out['attachments'] = [[i] + parse_filetype(i.filename, force_list=True)
                               for i in message.attachments]
@@ -132,6 +135,45 @@ def parse_message(message):
     return out
 
 
+class MessageInfo:
+    """Read only classification of a message that all on_message listeners share.
+    The flags are set up front, the url/attachment parse happens on first use."""
+    __slots__ = ('message', 'is_self', 'is_bot', 'is_command', 'is_dm', '_parsed')
+
+    def __init__(self, message, bot_user=None, prefixes=()):
+        author = message.author
+        values = dict(message=message,
+                      is_self=bot_user is not None and author == bot_user,
+                      is_bot=bool(getattr(author, 'bot', False)),
+                      is_command=bool(prefixes) and message.content.startswith(prefixes),
+                      is_dm=getattr(message, 'guild', None) is None,
+                      _parsed=None)
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('MessageInfo is read only')
+
+    @property
+    def parsed(self):
+        """Output of parse_message, computed once"""
+        if self._parsed is None:
+            object.__setattr__(self, '_parsed', parse_message(self.message))
+        return self._parsed
+
+    @property
+    def urls(self):
+        return self.parsed['urls']
+
+    @property
+    def attachments(self):
+        return self.parsed['attachments']
+
+    @property
+    def type(self):
+        return self.parsed['type']
+
+
 def emotes_equal(a, b):
     alist = [a] + [getattr(a, attr, None) for attr in ['id', 'name']] + [str(a)]
     alist = [i for i in alist if i]
@@ -147,6 +189,28 @@ def emotes_equal(a, b):
     return False
 
 
+_custom_emoji = re.compile(r'^<a?:(\w+):(\d+)>$')
+
+
+def emoji_keys(emoji):
+    """Return the canonical keys an emoji can be looked up by (id, name, text).
+    Two emojis that share a key are equal as far as emotes_equal is concerned."""
+    out = []
+    if isinstance(emoji, int):
+        return [emoji]
+    match = _custom_emoji.match(emoji.strip()) if isinstance(emoji, str) else None
+    if match:
+        return [int(match.group(2)), match.group(1)]
+    for attr in ['id', 'name']:
+        value = getattr(emoji, attr, None)
+        if value:
+            out.append(value)
+    text = str(emoji)
+    if text and text not in out:
+        out.append(text)
+    return out
+
+
 def int_time(in_time=None, t0=None):
     if in_time is None:
         in_time = datetime.datetime.utcnow()
@@ -230,3 +294,60 @@ def delocalize(dt):
 def clean_string(string):
     """Remove all non-alphanumeric characters except spaces and underscores"""
     return re.sub(r'[^\w\s]', '', string).strip().lower()
+
+
+class Chunker:
+    """Packs lines into message sized chunks of at most n characters.
+
+    feed() yields any chunks a line completes and flush() yields the rest, so
+    packing is linear in the total length. Lines longer than a chunk are hard
+    wrapped. Every chunk is wrapped in style; without a style, a ``` code block
+    left open at the end of a chunk is closed there and reopened in the next one."""
+    fence = '```'
+
+    def __init__(self, deliminator='\n', n=2000, style=''):
+        self.deliminator = deliminator
+        self.style = style
+        # room for the style on both ends, or for closing/reopening a code block
+        self.size = n - 2 * len(style) - (0 if style else 2 * (len(self.fence) + 1))
+        if self.size <= 0:
+            raise ValueError('Chunk size {} is too small for style "{}"'.format(n, style))
+        self.parts = []
+        self.length = 0
+        self.open = False    # content so far ends inside a code block
+        self.reopen = False  # current chunk starts inside a code block
+
+    def _add(self, line):
+        if self.parts:
+            self.length += len(self.deliminator)
+        self.parts.append(line)
+        self.length += len(line)
+        if not self.style and line.count(self.fence) % 2:
+            self.open = not self.open
+
+    def _emit(self):
+        body = self.deliminator.join(self.parts)
+        if self.reopen:
+            body = self.fence + '\n' + body
+        if self.open:
+            body += '\n' + self.fence
+        self.reopen = self.open
+        self.parts = []
+        self.length = 0
+        return self.style + body + self.style
+
+    def feed(self, line):
+        line = str(line)
+        while len(line) > self.size:
+            if self.parts:
+                yield self._emit()
+            self._add(line[:self.size])
+            line = line[self.size:]
+            yield self._emit()
+        if self.parts and self.length + len(self.deliminator) + len(line) > self.size:
+            yield self._emit()
+        self._add(line)
+
+    def flush(self):
+        if self.parts:
+            yield self._emit()
@@ -0,0 +1,110 @@
+"""Incremental, checkpointed crawl of channel histories.
+
+HistoryCrawler keeps a checkpoint per channel in a PermaDict (channel id ->
+dict), so every message is downloaded once across restarts:
+
+    newest      id of the newest message crawled, the next crawl only fetches
+                the messages after it
+    oldest      id of the oldest message the backfill got to
+    count       messages the backfill crawled
+    backfilled  whether the backfill is done
+
+The backfill is the first crawl of a channel, from the newest message back
+`depth` messages. If it is interrupted (reboot, budget) the next crawl goes on
+before `oldest`. Up to `concurrency` channels are crawled at once and a crawl
+stops making history requests after `budget` of them; the checkpoints let the
+next crawl pick up where it stopped.
+"""
+import asyncio
+import discord  # type: ignore
+import logging
+
+
+logger = logging.getLogger('discord.' + __name__)
+_page = 100        # messages per history request
+_checkpoint = 500  # messages between checkpoint writes
+
+
+class HistoryCrawler:
+    def __init__(self, marks, concurrency=4, budget=2000, depth=5000):
+        self.marks = marks
+        self.concurrency = concurrency
+        self.budget = budget
+        self.depth = depth
+        self.requests = 0  # history requests of the current (or last) crawl
+        self.messages = 0
+        self.exhausted = False
+
+    def _spend(self):
+        # one history request, False once the budget is used up
+        if self.requests >= self.budget:
+            self.exhausted = True
+            return False
+        self.requests += 1
+        return True
+
+    async def crawl(self, channels, callback):
+        """Call callback(message) for the messages of channels not crawled before, newest
+        ones of a channel first during its backfill and oldest first after that"""
+        self.requests = self.messages = 0
+        self.exhausted = False
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(channel):
+            async with semaphore:
+                await self._crawl(channel, callback)
+        await asyncio.gather(*[one(c) for c in channels])
+        logger.info('Crawled {} messages with {} history requests{}'.format(
+            self.messages, self.requests, ' (budget used up)' if self.exhausted else ''))
+
+    async def _crawl(self, channel, callback):
+        mark = self.marks.get(channel.id, None)
+        if mark is None or mark['newest'] is None:
+            mark = dict(newest=None, oldest=None, count=0, backfilled=False)
+        try:
+            if mark['newest'] is not None:
+                await self._after(channel, mark, callback)
+            if not mark['backfilled']:
+                await self._backfill(channel, mark, callback)
+        except discord.Forbidden:
+            logger.debug('Cannot read channel {}.'.format(channel))
+        except discord.HTTPException as e:
+            logger.warning('History crawl of {} stopped: {}'.format(channel, e))
+        finally:
+            self.marks[channel.id] = mark
+
+    async def _after(self, channel, mark, callback):
+        if not self._spend():
+            return
+        n = 0
+        async for msg in channel.history(limit=None, after=discord.Object(mark['newest']), oldest_first=True):
+            callback(msg)
+            mark['newest'] = msg.id
+            n += 1
+            if not self._step(channel, mark, n):
+                return
+
+    async def _backfill(self, channel, mark, callback):
+        remaining = self.depth - mark['count']
+        if remaining <= 0 or not self._spend():
+            mark['backfilled'] = remaining <= 0
+            return
+        before = discord.Object(mark['oldest']) if mark['oldest'] is not None else None
+        n = 0
+        async for msg in channel.history(limit=remaining, before=before):
+            if mark['newest'] is None:
+                mark['newest'] = msg.id
+            callback(msg)
+            mark['oldest'] = msg.id
+            mark['count'] += 1
+            n += 1
+            if not self._step(channel, mark, n):
+                return
+        mark['backfilled'] = True
+
+    def _step(self, channel, mark, n):
+        # after each message: checkpoint now and then, and pay for the next page
+        self.messages += 1
+        if n % _checkpoint == 0:
+            self.marks[channel.id] = mark
+        return n % _page != 0 or self._spend()
@@ -1,4 +1,5 @@
 import logging
+from . import metrics
 
 
 logger = logging.getLogger('discord')
@@ -87,3 +88,4 @@ def init_logging(logfile=None, visual_log_level=logging.PRINTV, verbose=False, *
         c_handler.setLevel(0)
         c_handler.setFormatter(logging.Formatter('%(levelname)s:%(name)s: %(message)s'))
     logger.addHandler(c_handler)
+    logger.addHandler(metrics.LogCounter(logging.WARNING))  # counts warnings and errors for the stats
@@ -0,0 +1,248 @@
+"""Resumable bulk role changes.
+
+A job is planned up front as a list of operations, one per member, so it can be
+shown as a dry run (diff) first; planned jobs are only kept in memory. Running
+a job saves it to config/member_jobs.sqlite3 and applies the operations with
+bounded concurrency, paced by a token bucket below the member edit rate limit,
+through the bot's role queue (so they merge with the other role changes of the
+member), and edits a single status message with the progress. Progress is
+checkpointed with every status update; a job interrupted by a reboot is
+resumed by the warm-up. The operations are idempotent (roles already added or
+removed are left alone), so work done since the last checkpoint is safely
+repeated.
+
+    ops = [member_jobs.roles_op(m, add=[recruit], remove=old, note='last active ...') for m in ...]
+    job = bot.member_jobs.plan(ctx.guild, 'purge', ops)
+    await split_send(ctx, bot.member_jobs.diff(job))
+    await bot.member_jobs.run(job, ctx.channel)
+"""
+import asyncio
+import collections
+import datetime
+import discord  # type: ignore
+import logging
+import os
+import time
+from . import outbound
+from .permadict import PermaDict
+
+
+logger = logging.getLogger('discord.' + __name__)
+_fn = os.path.join(os.path.split(os.path.realpath(__file__))[0], 'config', 'member_jobs')
+
+# op states
+PENDING = 'pending'
+DONE = 'done'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+# job states
+PLANNED = 'planned'
+RUNNING = 'running'
+FINISHED = 'finished'
+CANCELLED = 'cancelled'
+
+
+def roles_op(member, add=(), remove=(), reason=None, note=None):
+    """Operation adding and removing roles of member (in one edit)"""
+    return dict(kind='roles', user=member.id, name=str(member), add=[r.id for r in add],
+                remove=[r.id for r in remove], reason=reason, note=note, state=PENDING, error=None)
+
+
+class MemberJobs:
+    def __init__(self, bot, fn=_fn, concurrency=3, rate=10, per=10.0, status_every=3.0):
+        self.bot = bot
+        self.jobs = PermaDict(fn)  # job id -> job dict, of the jobs that were run
+        self._planned = dict()   # job id -> job dict, of the jobs planned and not run yet
+        self.concurrency = concurrency
+        self.rate = rate
+        self.per = per
+        self.status_every = status_every
+        self._running = dict()   # job id -> (job, task running it)
+        self._messages = dict()  # job id -> its status message
+
+    def plan(self, guild, title, ops):
+        """A new job running ops in guild, nothing is changed (or saved) until it's run"""
+        base = job_id = '{}-{}'.format(title, datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S'))
+        n = 1
+        while job_id in self._planned or job_id in self.jobs:
+            n += 1
+            job_id = '{}-{}'.format(base, n)
+        job = dict(id=job_id, title=title, guild=guild.id, channel=None, message=None,
+                   created=time.time(), state=PLANNED, ops=ops)
+        self._planned[job_id] = job
+        return job
+
+    def get(self, job_id):
+        """The job, as it is while running"""
+        if job_id in self._running:
+            return self._running[job_id][0]
+        if job_id in self._planned:
+            return self._planned[job_id]
+        return self.jobs.get(job_id, None)
+
+    def ids(self):
+        """Ids of the planned and saved jobs"""
+        return sorted(set(self._planned) | set(self.jobs.keys()))
+
+    def counts(self, job):
+        return collections.Counter(op['state'] for op in job['ops'])
+
+    def summary(self, job):
+        counts = self.counts(job)
+        return 'Job {}: {}, {}/{} done, {} skipped, {} failed'.format(
+            job['id'], job['state'], counts[DONE], len(job['ops']), counts[SKIPPED], counts[FAILED])
+
+    def failures(self, job):
+        return ['{}: {}'.format(op['name'], op['error']) for op in job['ops'] if op['state'] == FAILED]
+
+    def diff(self, job, pending_only=True):
+        """Lines describing the changes of the job (only the ones still to do by default)"""
+        guild = self.bot.get_guild(job['guild'])
+
+        def name(role_id):
+            role = guild.get_role(role_id) if guild is not None else None
+            return role.name if role is not None else str(role_id)
+
+        out = []
+        for op in job['ops']:
+            if pending_only and op['state'] != PENDING:
+                continue
+            changes = ['-' + name(r) for r in op['remove']] + ['+' + name(r) for r in op['add']]
+            line = '{}: {}'.format(op['name'], ' '.join(changes))
+            if op['note']:
+                line += ' ({})'.format(op['note'])
+            out.append(line)
+        return out
+
+    def _checkpoint(self, job):
+        self.jobs[job['id']] = job
+
+    async def run(self, job, channel=None):
+        """Run (or resume) the pending operations of job, reporting progress in channel.
+        Returns the job once it's finished or cancelled."""
+        if isinstance(job, str):
+            job = self.get(job)
+        if job['id'] in self._running:
+            raise ValueError('Job {} is already running'.format(job['id']))
+        guild = self.bot.get_guild(job['guild'])
+        if guild is None:
+            raise ValueError('Guild of job {} not found'.format(job['id']))
+        if channel is not None and channel.id != job['channel']:
+            job['channel'], job['message'] = channel.id, None
+        job['state'] = RUNNING
+        self._checkpoint(job)
+        self._planned.pop(job['id'], None)
+        task = asyncio.ensure_future(self._run(job, guild))
+        self._running[job['id']] = job, task
+        task.add_done_callback(lambda _: self._running.pop(job['id'], None))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise  # our caller was cancelled, not the job
+            return job
+
+    async def _run(self, job, guild):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = outbound._Bucket(self.rate, self.per)
+
+        async def one(op):
+            async with semaphore:
+                await bucket.acquire()
+                op['state'], op['error'] = await self._apply(guild, op)
+
+        status = asyncio.ensure_future(self._report(job))
+        try:
+            await asyncio.gather(*[one(op) for op in job['ops'] if op['state'] == PENDING])
+            job['state'] = FINISHED
+        finally:
+            status.cancel()
+            self._checkpoint(job)
+            await self._status(job)
+        failed = self.failures(job)
+        if failed:
+            logger.warning('{}, failures:\n{}'.format(self.summary(job), '\n'.join(failed)))
+        return job
+
+    async def _apply(self, guild, op):
+        """Apply op, returns its new (state, error)"""
+        try:
+            member = guild.get_member(op['user']) or await self.bot.resolver.resolve(op['user'], guild)
+            if member is None:
+                return SKIPPED, 'not a member'
+            current = {r.id for r in member.roles}
+            remove = [r for r in member.roles if r.id in op['remove']]
+            add = [guild.get_role(i) for i in op['add'] if i not in current]
+            add = [r for r in add if r is not None]
+            if not add and not remove:
+                return SKIPPED, 'no change'
+            # merged with the other role changes of the member, see role_queue.py
+            # shielded, cancelling the job mustn't cancel the edit other callers merged into
+            edit = self.bot.role_queue.change(member, add=add, remove=remove, reason=op['reason'])
+            if await asyncio.shield(edit) is None:
+                return FAILED, 'role edit failed, see the log'
+            return DONE, None
+        except discord.NotFound:
+            return SKIPPED, 'not found'
+        except discord.HTTPException as e:
+            return FAILED, str(e)
+
+    async def _report(self, job):
+        # checkpoint and update the status message while the job runs
+        while True:
+            await asyncio.sleep(self.status_every)
+            self._checkpoint(job)
+            await self._status(job)
+
+    async def _status(self, job):
+        channel = self.bot.get_channel(job['channel']) if job['channel'] else None
+        if channel is None:
+            return
+        text = self.summary(job)
+        try:
+            message = self._messages.get(job['id'])
+            if message is None and job['message'] is not None:
+                message = await channel.fetch_message(job['message'])
+            if message is not None:
+                await message.edit(content=text)
+                self._messages[job['id']] = message
+                return
+        except discord.HTTPException:
+            pass
+        try:
+            message = await outbound.send(channel, text, priority=outbound.MODERATION, merge=False)
+            job['message'] = message.id
+            self._messages[job['id']] = message
+        except discord.HTTPException as e:
+            logger.warning('Could not report the progress of job {}: {}'.format(job['id'], e))
+
+    def cancel(self, job_id):
+        """Stop a job, the operations done so far stay done. Returns the job, None if there is none."""
+        if job_id in self._planned:
+            job = self._planned.pop(job_id)
+            job['state'] = CANCELLED
+            return job
+        job, task = self._running.pop(job_id, (self.jobs.get(job_id), None))
+        if job is None:
+            return None
+        job['state'] = CANCELLED
+        if task is not None:
+            task.cancel()  # checkpoints the job on the way out, run returns it
+        else:
+            self._checkpoint(job)
+        return job
+
+    def forget(self, job_id):
+        if job_id in self._running:
+            self.cancel(job_id)
+        if self._planned.pop(job_id, None) is None:
+            self.jobs.delete(job_id)
+        self._messages.pop(job_id, None)
+
+    async def resume(self):
+        """Resume the jobs interrupted by a reboot (in the background)"""
+        for job_id, job in self.jobs.items():
+            if job['state'] == RUNNING and job_id not in self._running:
+                logger.info('Resuming ' + self.summary(job))
+                asyncio.ensure_future(self.run(job))
@@ -0,0 +1,240 @@
+"""Handler metrics.
+
+Every cog listener and command run is timed into a latency histogram, next to
+its call, error and REST request counts, and every dispatched gateway event is
+counted. REST requests are attributed to the handler making them through a
+context variable, which tasks started by the handler inherit.
+
+Shown by the stats command of Debugging and served as text on
+http://127.0.0.1:<metrics_port>/metrics for scraping (set metrics_port to 0 to
+turn the endpoint off).
+"""
+import bisect
+import collections
+import contextlib
+import contextvars
+import logging
+import time
+from . import aio
+
+
+logger = logging.getLogger('discord.' + __name__)
+# upper bounds of the latency buckets in seconds, 1 ms to about a minute
+_bounds = [0.001 * 2 ** i for i in range(17)]
+_slow = 10.0  # handlers taking longer than this many seconds are logged
+
+# the HandlerStats of the running handler, REST requests are counted on it
+current = contextvars.ContextVar('metrics_handler', default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(_bounds) + 1)  # the last bucket is everything above _bounds
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(_bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding quantile q (0 < q <= 1), capped at the largest value seen"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(_bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class HandlerStats:
+    def __init__(self, kind, name):
+        self.kind = kind  # 'listener' or 'command'
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.rest = 0
+        self.latency = Histogram()
+
+    def row(self):
+        p = [self.latency.percentile(q) for q in (0.5, 0.95, 0.99)]
+        return dict(kind=self.kind, name=self.name, calls=self.calls, errors=self.errors, rest=self.rest,
+                    p50=p[0], p95=p[1], p99=p[2], max=self.latency.max, total=self.latency.total)
+
+
+class LogCounter(logging.Handler):
+    """Counts the warnings and errors logged, see log_init.init_logging"""
+    def emit(self, record):
+        registry().logs[record.levelname, record.name] += 1
+
+
+class Metrics:
+    def __init__(self):
+        self.handlers = dict()                 # (kind, name) -> HandlerStats
+        self.events = collections.Counter()    # gateway event name -> dispatches
+        self.logs = collections.Counter()      # (level, logger name) -> records
+        self.rest = 0
+        self.active = 0  # handlers running right now
+        self.loop_lag = Histogram()  # how late the watchdog's heartbeat woke up, see watchdog.py
+        self.stalls = 0
+        self.started = time.time()
+        self._runner = None
+
+    def handler(self, kind, name):
+        stats = self.handlers.get((kind, name))
+        if stats is None:
+            stats = self.handlers[kind, name] = HandlerStats(kind, name)
+        return stats
+
+    @contextlib.contextmanager
+    def timed(self, kind, name):
+        """Time the body as a run of handler name, REST requests made in it are counted on the handler"""
+        stats = self.handler(kind, name)
+        token = current.set(stats)
+        start = time.perf_counter()
+        self.active += 1
+        try:
+            yield stats
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            self.active -= 1
+            current.reset(token)
+            dt = time.perf_counter() - start
+            stats.calls += 1
+            stats.latency.observe(dt)
+            if dt > _slow:
+                logger.warning('{} {} took {:.1f} s'.format(kind.capitalize(), name, dt))
+
+    def error(self):
+        """Count an error the running handler handled itself (e.g. through on_error)"""
+        stats = current.get()
+        if stats is not None:
+            stats.errors += 1
+
+    def event(self, name):
+        self.events[name] += 1
+
+    def wrap_request(self, request):
+        """Wrap discord's HTTPClient.request so every REST call is counted"""
+        async def counted(*args, **kwargs):
+            self.rest += 1
+            stats = current.get()
+            if stats is not None:
+                stats.rest += 1
+            return await request(*args, **kwargs)
+        return counted
+
+    def rows(self, sort='p95'):
+        rows = [s.row() for s in self.handlers.values()]
+        return sorted(rows, key=lambda x: x[sort] or 0, reverse=True)
+
+    def render(self):
+        """The metrics in Prometheus' text format"""
+        out = []
+
+        def metric(name, kind, help_):
+            out.append('# HELP tdt_{} {}'.format(name, help_))
+            out.append('# TYPE tdt_{} {}'.format(name, kind))
+
+        def labels(**kwargs):
+            return ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                            for k, v in kwargs.items())
+
+        handlers = sorted(self.handlers.values(), key=lambda x: (x.kind, x.name))
+        for attr, help_ in [('calls', 'Handler runs'), ('errors', 'Handler runs that failed'),
+                            ('rest', 'REST requests made by the handler')]:
+            metric('handler_{}_total'.format(attr), 'counter', help_)
+            for s in handlers:
+                out.append('tdt_handler_{}_total{{{}}} {}'.format(
+                    attr, labels(kind=s.kind, handler=s.name), getattr(s, attr)))
+        metric('handler_latency_seconds', 'histogram', 'Handler run time')
+        for s in handlers:
+            seen = 0
+            for bound, n in zip(_bounds + ['+Inf'], s.latency.counts):
+                seen += n
+                out.append('tdt_handler_latency_seconds_bucket{{{}}} {}'.format(
+                    labels(kind=s.kind, handler=s.name, le=bound), seen))
+            lbl = labels(kind=s.kind, handler=s.name)
+            out.append('tdt_handler_latency_seconds_sum{{{}}} {}'.format(lbl, s.latency.total))
+            out.append('tdt_handler_latency_seconds_count{{{}}} {}'.format(lbl, s.latency.count))
+        metric('gateway_events_total', 'counter', 'Gateway events dispatched')
+        for name, n in sorted(self.events.items()):
+            out.append('tdt_gateway_events_total{{{}}} {}'.format(labels(event=name), n))
+        metric('rest_requests_total', 'counter', 'REST requests made')
+        out.append('tdt_rest_requests_total {}'.format(self.rest))
+        metric('log_records_total', 'counter', 'Warnings and errors logged')
+        for (level, name), n in sorted(self.logs.items()):
+            out.append('tdt_log_records_total{{{}}} {}'.format(labels(level=level, logger=name), n))
+        metric('loop_lag_seconds', 'histogram', 'How late the event loop ran a timer')
+        seen = 0
+        for bound, n in zip(_bounds + ['+Inf'], self.loop_lag.counts):
+            seen += n
+            out.append('tdt_loop_lag_seconds_bucket{{{}}} {}'.format(labels(le=bound), seen))
+        out.append('tdt_loop_lag_seconds_sum {}'.format(self.loop_lag.total))
+        out.append('tdt_loop_lag_seconds_count {}'.format(self.loop_lag.count))
+        metric('loop_stalls_total', 'counter', 'Times the event loop was blocked past the watchdog threshold')
+        out.append('tdt_loop_stalls_total {}'.format(self.stalls))
+        pools = aio.stats()
+        for name, key, kind, help_ in [
+                ('io_queued', 'queued', 'gauge', 'Blocking calls waiting for a thread'),
+                ('io_running', 'running', 'gauge', 'Blocking calls running'),
+                ('io_calls_total', 'done', 'counter', 'Blocking calls finished'),
+                ('io_errors_total', 'errors', 'counter', 'Blocking calls that raised'),
+                ('io_wait_seconds_total', 'wait', 'counter', 'Seconds blocking calls waited for a thread'),
+                ('io_busy_seconds_total', 'busy', 'counter', 'Seconds spent in blocking calls')]:
+            metric(name, kind, help_ + ', per aio pool')
+            for p in pools:
+                out.append('tdt_{}{{{}}} {}'.format(name, labels(pool=p['pool']), p[key]))
+        metric('uptime_seconds', 'gauge', 'Seconds since the metrics were reset')
+        out.append('tdt_uptime_seconds {:.0f}'.format(time.time() - self.started))
+        return '\n'.join(out) + '\n'
+
+    async def serve(self, port, host='127.0.0.1'):
+        """Serve render() on http://host:port/metrics until stop"""
+        if not port or self._runner is not None:
+            return
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.render())
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port).start()
+        except OSError as e:
+            logger.warning('Could not serve metrics on {}:{}: {}'.format(host, port, e))
+            await runner.cleanup()
+            return
+        self._runner = runner
+        logger.info('Serving metrics on http://{}:{}/metrics'.format(host, port))
+
+    async def stop(self):
+        if self._runner is not None:
+            runner, self._runner = self._runner, None
+            await runner.cleanup()
+
+
+_registry = Metrics()
+
+
+def registry():
+    """The metrics of this process"""
+    return _registry
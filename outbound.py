@@ -0,0 +1,195 @@
+"""Central scheduler for outgoing messages.
+
+Each destination (channel, DM target) gets its own priority queue and worker, so
+a flood of messages in one channel never holds up another. Workers pace
+themselves with a per-channel token bucket matching Discord's message rate
+limit, send higher priority classes first, and merge runs of small text-only
+messages of the same priority into one payload. The buckets live as long as
+the scheduler and follow the X-RateLimit-Remaining/Reset-After headers of the
+message sends, where the HTTP client reports them (see trace_config).
+
+    msg = await outbound.send(channel, 'text', priority=outbound.ALERT)
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+
+
+logger = logging.getLogger('discord.' + __name__)
+
+# priority classes, lower goes first
+MODERATION = 0
+ALERT = 1
+GAME = 2
+FUN = 3
+
+_max_length = 2000  # discord message length limit
+_small = 500        # only messages up to this long are merged
+_messages_url = re.compile(r'/channels/(\d+)/messages$')
+
+
+class _Bucket:
+    """Token bucket allowing `rate` sends every `per` seconds"""
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = rate
+        self.stamp = time.monotonic()
+        self.reset = 0.0  # no sends before this time, set when discord says the limit is used up
+
+    def update(self, remaining, reset_after):
+        """Follow discord's count of the sends left (remaining) and the seconds until they're refilled"""
+        now = time.monotonic()
+        self.tokens = min(self.tokens, remaining)
+        self.stamp = now
+        if remaining < 1:
+            self.reset = max(self.reset, now + reset_after)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.reset:
+                await asyncio.sleep(self.reset - now)
+                continue
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate / self.per)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class _Item:
+    __slots__ = ['priority', 'seq', 'content', 'kwargs', 'future', 'merge']
+
+    def __init__(self, priority, seq, content, kwargs, future, merge):
+        self.priority = priority
+        self.seq = seq
+        self.content = content
+        self.kwargs = kwargs
+        self.future = future
+        self.merge = merge
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def mergeable(self):
+        return self.merge and not self.kwargs and isinstance(self.content, str) and len(self.content) <= _small
+
+
+class _ChannelQueue:
+    def __init__(self, target, rate, per):
+        self.target = target
+        self.heap = []
+        self.bucket = _Bucket(rate, per)
+        self.worker = None
+
+
+class Outbound:
+    def __init__(self, rate=5, per=5.0):
+        self.loop = asyncio.get_event_loop()
+        self.rate = rate
+        self.per = per
+        self._queues = dict()  # destination id -> _ChannelQueue, kept for the buckets
+        self._channels = dict()  # channel id the messages of a queue went to -> _ChannelQueue
+        self._seq = itertools.count()
+        self.sent = 0
+        self.merged = 0
+
+    @staticmethod
+    def _key(target):
+        # commands.Context sends to its channel; channel, user and member ids are unique snowflakes
+        channel = getattr(target, 'channel', None)
+        if channel is not None and hasattr(target, 'command'):
+            return channel.id
+        return target.id
+
+    def send(self, target, content=None, priority=FUN, merge=True, **kwargs):
+        """Queue a message for target, returns a future for the sent discord.Message
+        (shared by all messages merged into the same payload)"""
+        key = self._key(target)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _ChannelQueue(target, self.rate, self.per)
+        future = self.loop.create_future()
+        heapq.heappush(queue.heap, _Item(priority, next(self._seq), content, kwargs, future, merge))
+        if queue.worker is None or queue.worker.done():
+            queue.worker = asyncio.ensure_future(self._work(key, queue))
+        return future
+
+    async def _work(self, key, queue):
+        while queue.heap:
+            await queue.bucket.acquire()
+            batch = [heapq.heappop(queue.heap)]
+            if batch[0].mergeable():
+                length = len(batch[0].content)
+                while queue.heap and queue.heap[0].mergeable() and queue.heap[0].priority == batch[0].priority and \
+                        length + 1 + len(queue.heap[0].content) <= _max_length:
+                    batch.append(heapq.heappop(queue.heap))
+                    length += 1 + len(batch[-1].content)
+            content = '\n'.join(i.content for i in batch) if len(batch) > 1 else batch[0].content
+            try:
+                msg = await queue.target.send(content, **batch[0].kwargs)
+            except Exception as e:
+                for i in batch:
+                    if not i.future.done():
+                        i.future.set_exception(e)
+                continue
+            self.sent += 1
+            self.merged += len(batch) - 1
+            # a DM target's queue is keyed by the user, the rate limit headers name the channel
+            self._channels[msg.channel.id] = queue
+            for i in batch:
+                if not i.future.done():
+                    i.future.set_result(msg)
+
+    def rate_limit(self, channel_id, remaining, reset_after):
+        """Rate limit headers of a message send to channel_id, see _Bucket.update"""
+        queue = self._channels.get(channel_id) or self._queues.get(channel_id)
+        if queue is not None:
+            queue.bucket.update(remaining, reset_after)
+
+    def stats(self):
+        busy = [q for q in self._queues.values() if q.heap or (q.worker is not None and not q.worker.done())]
+        return dict(sent=self.sent, merged=self.merged, channels=len(busy),
+                    queued=sum(len(q.heap) for q in busy))
+
+
+_scheduler = None
+
+
+def scheduler():
+    """The scheduler for the running event loop (recreated when the bot restarts on a new loop)"""
+    global _scheduler
+    if _scheduler is None or _scheduler.loop is not asyncio.get_event_loop():
+        _scheduler = Outbound()
+    return _scheduler
+
+
+def trace_config():
+    """aiohttp.TraceConfig passing the rate limit headers of message sends to the scheduler,
+    for discord.py clients taking one (http_trace)"""
+    import aiohttp  # type: ignore
+
+    async def on_request_end(session, context, params):
+        match = _messages_url.search(params.url.path)
+        headers = params.response.headers
+        if params.method != 'POST' or match is None or 'X-RateLimit-Remaining' not in headers:
+            return
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset_after = float(headers.get('X-RateLimit-Reset-After', 0))
+        except ValueError:
+            return
+        scheduler().rate_limit(int(match.group(1)), remaining, reset_after)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_end.append(on_request_end)
+    return config
+
+
+def send(target, content=None, priority=FUN, merge=True, **kwargs):
+    return scheduler().send(target, content, priority=priority, merge=merge, **kwargs)
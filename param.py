@@ -1,6 +1,10 @@
+import asyncio
+import atexit
 import os
 import json
-import shelve
+import weakref
+from . import aio
+from .permadict import PermaDict, IntPermaDict  # noqa: F401
 
 _dir = os.path.split(os.path.realpath(__file__))[0]
 _config = os.path.join(_dir, 'config')
@@ -140,14 +144,79 @@ defaults = {
     'event_reminders': [360, 60, 0],  # in minutes
     'timezone':        'US/Pacific',
     'logfile':         os.path.join(_dir, 'logs', 'tdt.log'),
+    'metrics_port':    9337,  # local port of the metrics endpoint, 0 turns it off
+    'event_record':    None,  # file to record gateway events to, see replay.py
 }
 
 
+_flush_delay = 5.0  # seconds changes to DataContainers wait to be written together
+_live = weakref.WeakValueDictionary()  # file name -> _Shared data of its DataContainers
+_writing = dict()  # file name -> _Shared with writes still queued, kept alive until they're done
+_dirty = set()  # DataContainers (or other objects with a flush method) with unsaved changes
+_flush_handle = None
+
+
+def flush_all():
+    """Write out all DataContainers with unsaved changes (on aio's disk threads if the loop runs)"""
+    global _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    dirty = list(_dirty)
+    _dirty.clear()
+    for container in dirty:
+        container.flush()
+
+
+atexit.register(flush_all)
+
+
+def mark_dirty(obj):
+    """Have obj.flush() called with the next flush_all, within _flush_delay seconds"""
+    _dirty.add(obj)
+    _schedule_flush()
+
+
+def _schedule_flush():
+    global _flush_handle
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_all()
+        return
+    if _flush_handle is None:
+        _flush_handle = loop.call_later(_flush_delay, flush_all)
+
+
+class _Shared:
+    """Data of a file, shared by all its DataContainers"""
+    def __init__(self, data):
+        self.data = data
+        self.file_data = None
+        self.writes = 0  # writes queued on aio and not done yet
+
+
 class DataContainer:
-    def __init__(self, fn):
+    """Dict-like contents of a JSON file. The in-memory data is authoritative: changes are
+    written out within _flush_delay seconds, all containers of a file share the same data.
+    The shared data outlives the containers until its writes are done, so a new container
+    never reads a file that is behind."""
+    def __init__(self, fn, data=None):
+        """data, if given, is used as the already loaded contents of fn"""
         self.fn = fn
+        self.dirty = False
+        shared = _live.get(fn)
+        if shared is not None:
+            self._shared = shared
+            self.data = shared.data
+            self._file_data = shared.file_data
+            return
         self.data = dict()
-        self._file_data = self._load_own_data()
+        self._file_data = None
+        # registered before loading, loading can already save
+        self._shared = _live[fn] = _Shared(self.data)
+        self._file_data = self._load_own_data() if data is None else data
+        self._shared.file_data = self._file_data
         if self._file_data is not None:
             for i in self._file_data:
                 self.data[i] = self._file_data[i]
@@ -190,18 +259,49 @@ class DataContainer:
                 return json.load(f)
         except IOError:
             self._gen_data(None)
-            self._save()
+            # don't create files for containers that are only read
+            if self.data:
+                self._save()
 
     def _save(self):
-        with open(self.fn, 'w') as f:
-            f.write(json.dumps(self.data, indent=4))
-        self._file_data = self._load_own_data()
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        """Have the data written out, e.g. after changing a list or dict in it in place"""
+        self.dirty = True
+        mark_dirty(self)
+
+    def flush(self):
+        """Write the data now if it has unsaved changes"""
+        if not self.dirty:
+            return
+        self.dirty = False
+        _dirty.discard(self)
+        self._write()
+
+    def _write(self):
+        # written on aio's disk threads, in order with the other writes to this file
+        self._writing(aio.write_soon(self.fn, json.dumps(self.data, indent=4)))
+
+    def _writing(self, future):
+        """Keep the shared data alive until the queued write (future, None if done) is done"""
+        if future is None:
+            return
+        fn, shared = self.fn, self._shared
+        shared.writes += 1
+        _writing[fn] = shared
+
+        def done(_):
+            shared.writes -= 1
+            if shared.writes == 0 and _writing.get(fn) is shared:
+                del _writing[fn]
+        future.add_done_callback(done)
 
     def _gen_data(self, *args):
         raise NotImplementedError
 
     def keys(self):
-        return set(list(self.data.keys()) + list(self._file_data.keys()))
+        return set(self.data.keys())
 
     def set_if_not_set(self, key, value):
         try:
@@ -293,46 +393,4 @@ class Parameters(dict):
                 self[key] = [users[i] for i in self[key].split(',')]
 
 
-class PermaDict:
-    def __init__(self, fn):
-        self.fn = fn
-        self.file = shelve.open(fn)
-
-    def __del__(self):
-        self.file.sync()
-        self.file.close()
-
-    def __getitem__(self, key):
-        return self.file[str(key)]
-
-    def __setitem__(self, key, value):
-        self.file[str(key)] = value
-
-    def get(self, key, default):
-        return self.file.get(str(key), default)
-
-    def __contains__(self, item):
-        return str(item) in self.file
-
-    def keys(self):
-        return list(self.file.keys())
-
-    def items(self):
-        return self.file.items()
-
-    def delete(self, key):
-        del self.file[str(key)]
-
-    def pop(self, key):
-        return self.file.pop(str(key))
-
-
-class IntPermaDict(PermaDict):
-    def __setitem__(self, key, value):
-        self.file[str(int(key))] = value
-
-    def keys(self):
-        return [int(k) for k in self.file.keys()]
-
-
 rc = Parameters(copy=defaults)
@@ -0,0 +1,230 @@
+"""Persistent dicts in SQLite.
+
+A PermaDict keeps one (key, pickled value) row per entry in a SQLite database
+next to the name it was given ("config/lfg.dbm" is kept in
+"config/lfg.sqlite3"). Keys are stored typed, as text in a PermaDict and as
+integers in an IntPermaDict, so lookups, `in` and keys() are indexed queries
+that need no conversion. Every change is its own transaction unless it is made
+in a batch:
+
+    with data.batch():
+        for user_id, t in seen.items():
+            data[user_id] = t
+
+Values are copies: changing a list or dict read from a PermaDict in place does
+nothing, write the changed value back or use update/edit:
+
+    data.update(user_id, lambda rows: rows + [row], [])
+    with data.edit(user_id, []) as rows:
+        rows.append(row)
+
+The shelve file a PermaDict used to be is imported the first time it is
+opened, or again with `python3 -m TDTbot.permadict --force`.
+"""
+import argparse
+import contextlib
+import dbm
+import logging
+import os
+import pickle
+import shelve
+import sqlite3
+import threading
+from . import aio
+
+
+logger = logging.getLogger('discord.' + __name__)
+_config = os.path.join(os.path.split(os.path.realpath(__file__))[0], 'config')
+
+_schema = """
+CREATE TABLE IF NOT EXISTS items (key {} PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def sqlite_path(fn):
+    """The database a PermaDict named fn is kept in"""
+    root, ext = os.path.splitext(fn)
+    return (root if ext == '.dbm' else fn) + '.sqlite3'
+
+
+class PermaDict:
+    key_type = 'TEXT'
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.closed = True  # until the database is open
+        # the loop and aio's disk threads (see run) take turns on the connection
+        self.lock = threading.RLock()
+        # autocommit, transactions are opened by batch
+        self.db = sqlite3.connect(sqlite_path(fn), check_same_thread=False, isolation_level=None)
+        self.closed = False
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(_schema.format(self.key_type))
+        if self._meta('shelve_migrated') is None:
+            self.migrate_shelve()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Close the database (a new PermaDict is needed to reopen it)"""
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.db.close()
+
+    def _key(self, key):
+        return str(key)
+
+    def _meta(self, key):
+        with self.lock:
+            row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Make the changes inside the with block in one transaction, rolled back on errors.
+        Batches can be nested, the outermost one commits."""
+        with self.lock:
+            outer = not self.db.in_transaction
+            if outer:
+                self.db.execute('BEGIN')
+            try:
+                yield self
+            except BaseException:
+                if outer:
+                    self.db.execute('ROLLBACK')
+                raise
+            if outer:
+                self.db.execute('COMMIT')
+
+    async def run(self, func, *args, **kwargs):
+        """Run func (e.g. a method of this dict doing several accesses) on aio's disk threads"""
+        def locked():
+            with self.lock:
+                return func(*args, **kwargs)
+        return await aio.run(aio.DISK, locked)
+
+    def __getitem__(self, key):
+        with self.lock:
+            row = self.db.execute('SELECT value FROM items WHERE key = ?', (self._key(key),)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return pickle.loads(row[0])
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO items (key, value) VALUES (?, ?)',
+                            (self._key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def update(self, key, func, default=None):
+        """Store func(current value, or default) as the value of key, returns it"""
+        with self.batch():
+            value = func(self.get(key, default))
+            self[key] = value
+        return value
+
+    @contextlib.contextmanager
+    def edit(self, key, default=None):
+        """Change the value of key (or default) in place inside the with block, it's written back after"""
+        with self.batch():
+            value = self.get(key, default)
+            yield value
+            self[key] = value
+
+    def __contains__(self, item):
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM items WHERE key = ?', (self._key(item),)).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        with self.lock:
+            return [k for k, in self.db.execute('SELECT key FROM items')]
+
+    def items(self):
+        with self.lock:
+            rows = self.db.execute('SELECT key, value FROM items').fetchall()
+        return [(k, pickle.loads(v)) for k, v in rows]
+
+    def delete(self, key):
+        with self.lock:
+            if self.db.execute('DELETE FROM items WHERE key = ?', (self._key(key),)).rowcount == 0:
+                raise KeyError(key)
+
+    def pop(self, key):
+        with self.batch():
+            value = self[key]
+            self.delete(key)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.db.execute('DELETE FROM items')
+
+    def migrate_shelve(self, fn=None):
+        """Import the entries of the shelve file fn (default: the one this dict was named after),
+        returns the number of entries imported"""
+        if fn is None:
+            fn = self.fn
+        n = 0
+        # whichdb is None without a file and '' if the file isn't a dbm
+        if dbm.whichdb(fn):
+            with shelve.open(fn, 'r') as shelf, self.batch():
+                for k in list(shelf.keys()):
+                    try:
+                        self[self._key(k)] = shelf[k]
+                    except Exception as e:
+                        logger.warning('Skipping {} of {}: {}'.format(k, fn, e))
+                        continue
+                    n += 1
+            logger.info('Imported {} entries of {} into {}'.format(n, fn, sqlite_path(self.fn)))
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('shelve_migrated', ?)", (str(n),))
+        return n
+
+
+class IntPermaDict(PermaDict):
+    key_type = 'INTEGER'
+
+    def _key(self, key):
+        return int(key)
+
+
+# the shelve files of the cogs and the key type they use
+_shelves = dict(activity=IntPermaDict, lfg=IntPermaDict, supporters=IntPermaDict,
+                direct_messages=IntPermaDict, fight_forever=IntPermaDict,
+                content_videos=PermaDict, admin_tools_sticky=PermaDict)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import the shelve (.dbm) files of the cogs into SQLite.')
+    parser.add_argument('names', nargs='*', default=sorted(_shelves),
+                        help='files in the config directory, without .dbm (default: all of them)')
+    parser.add_argument('--force', default=False, action='store_true',
+                        help='import again, overwriting the stored values of the same keys')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        fn = os.path.join(_config, name + '.dbm')
+        data = _shelves.get(name, PermaDict)(fn)
+        if args.force:
+            data.migrate_shelve()
+        print('{}: {} entries in {}'.format(name, len(data), sqlite_path(fn)))
+        data.close()
+
+
+if __name__ == '__main__':
+    main()
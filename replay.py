@@ -0,0 +1,309 @@
+"""Record gateway events and replay them against MainBot offline.
+
+With the event_record param set (e.g. "logs/events-{}.jsonl.gz", {} becomes the
+start time) the bot writes the gateway events it receives from startup on to a
+gzipped JSON lines file, one [seconds since start, event type, payload] per
+line. The startup events (READY, GUILD_CREATE, member chunks) give the replay
+its guilds and members. Note the file holds message contents.
+
+Replaying builds a MainBot with all cogs loaded, feeds it the recording at the
+recorded pace (times --speed) or as fast as possible and prints the handler
+throughput and latencies per cog from the bot's metrics. REST requests are
+answered by FakeRest, which makes sends succeed, lists empty and single
+objects not found, or with --server by a fake_discord.FakeDiscord seeded with
+the recording, which keeps state and rate limits like Discord. The replay
+runs in a temporary copy of the bot directory, so the cogs start from the
+data files in config/ and their writes leave the real ones alone; with
+--in-place it uses this directory's files.
+
+    python3 -m TDTbot.replay logs/events-20261018-120000.jsonl.gz --speed 1
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import gzip
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from . import metrics
+from . import param
+
+
+logger = logging.getLogger('discord.' + __name__)
+
+# gateway events recorded by default, the first three carry the guild state
+EVENTS = ['READY', 'GUILD_CREATE', 'GUILD_MEMBERS_CHUNK',
+          'MESSAGE_CREATE', 'MESSAGE_UPDATE', 'MESSAGE_DELETE', 'MESSAGE_DELETE_BULK',
+          'MESSAGE_REACTION_ADD', 'MESSAGE_REACTION_REMOVE',
+          'GUILD_MEMBER_ADD', 'GUILD_MEMBER_REMOVE', 'GUILD_MEMBER_UPDATE']
+_discord_epoch = 1420070400000  # ms, start of discord snowflakes
+
+
+class Recorder:
+    """Writes the gateway events parsed by a discord ConnectionState to fn"""
+    def __init__(self, state, fn, events=EVENTS):
+        self.state = state
+        self.fn = fn.format(datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+        self.events = list(events)
+        self.count = 0
+        self._file = None
+        self._start = None
+        self._parsers = dict()  # event type -> the parser we replaced
+
+    def start(self):
+        if self._file is not None:
+            return
+        self._file = gzip.open(self.fn, 'wt', encoding='utf-8')
+        self._start = time.monotonic()
+        # the websocket looks the parsers up in this dict for every event
+        parsers = self.state.parsers
+        for t in self.events:
+            if t in parsers:
+                self._parsers[t] = parsers[t]
+                parsers[t] = self._wrap(t, parsers[t])
+        logger.info('Recording gateway events to ' + self.fn)
+
+    def _wrap(self, t, parse):
+        def record(data):
+            self._file.write(json.dumps([round(time.monotonic() - self._start, 3), t, data],
+                                        separators=(',', ':')) + '\n')
+            self.count += 1
+            return parse(data)
+        return record
+
+    @property
+    def recording(self):
+        return self._file is not None
+
+    def stop(self):
+        if self._file is None:
+            return
+        self.state.parsers.update(self._parsers)
+        self._parsers = dict()
+        self._file.close()
+        self._file = None
+        logger.info('Recorded {} gateway events to {}'.format(self.count, self.fn))
+
+
+def read(fn):
+    """Yield the (seconds, event type, payload) recorded in fn, up to where it ends
+    (the last lines of a recording that wasn't stopped can be cut off)"""
+    with gzip.open(fn, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                yield json.loads(line)
+        except (EOFError, ValueError) as e:
+            logger.warning('Recording {} ends early: {}'.format(fn, e))
+
+
+class FakeRest:
+    """Stand-in for discord's HTTPClient.request: messages sent or edited come back as
+    sent by the bot, lists are empty and single objects aren't found"""
+    def __init__(self, state, latency=0.0):
+        self.state = state
+        self.latency = latency
+        self.requests = collections.Counter()  # 'METHOD /route/{param}' -> requests
+        self._seq = 0
+
+    def _snowflake(self):
+        self._seq += 1
+        return (int(time.time() * 1000) - _discord_epoch) << 22 | self._seq % 4096
+
+    def _message(self, route, payload):
+        user = self.state.user
+        author = dict(id=str(user.id), username=user.name, discriminator=user.discriminator,
+                      avatar=None, bot=True)
+        # edits keep the id at the end of the url
+        message_id = route.url.rsplit('/', 1)[-1] if route.method == 'PATCH' else self._snowflake()
+        return dict(id=str(message_id), channel_id=str(route.channel_id), author=author,
+                    content=payload.get('content') or '', embeds=payload.get('embeds') or [],
+                    attachments=[], mentions=[], mention_roles=[], mention_everyone=False,
+                    pinned=False, tts=False, type=0, flags=0, edited_timestamp=None,
+                    timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat())
+
+    async def request(self, route, **kwargs):
+        method, path = route.method, route.path
+        self.requests[method + ' ' + path] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if path.startswith('/channels/{channel_id}/messages') and '/reactions' not in path and \
+                method in ['POST', 'PATCH']:
+            return self._message(route, kwargs.get('json') or {})
+        if method != 'GET':
+            return None
+        if path.endswith('}') and '/reactions/' not in path:
+            import discord  # type: ignore
+            raise discord.NotFound(types.SimpleNamespace(status=404, reason='Not Found'),
+                                   '{} is not part of the replay'.format(path))
+        if path.endswith('/audit-logs'):
+            return dict(audit_log_entries=[], users=[], webhooks=[], threads=[],
+                        integrations=[], application_commands=[], auto_moderation_rules=[])
+        return []
+
+
+async def _nothing(*args, **kwargs):
+    pass
+
+
+async def replay(fn, speed=None, latency=0.0, drain=10.0, server=False):
+    """Replay the recording fn against a new MainBot, returns the report lines"""
+    from .bot import MainBot
+    from .version import usingV2
+    param.rc['metrics_port'] = 0
+    param.rc['event_record'] = None
+    bot = MainBot(loop=asyncio.get_event_loop(), chunk_guilds_at_startup=False)
+    # keep the replay's jobs out of config/jobs.json
+    bot.scheduler.fn = os.path.join(tempfile.mkdtemp(), 'jobs.json')
+    bot.change_presence = _nothing
+    if usingV2:
+        await bot._async_setup_hook()
+    if server:
+        from .fake_discord import FakeDiscord
+        rest = FakeDiscord(latency=latency)
+        rest.seed_recording(fn)
+        await rest.start()
+        rest.patch_discord()
+        if usingV2:
+            await bot.http.static_login('replay')
+        else:
+            await bot.http.static_login('replay', bot=True)
+    else:
+        rest = FakeRest(bot._connection, latency=latency)
+        bot.http.request = bot.metrics.wrap_request(rest.request)
+    # the cogs need bot.user, so they are loaded once the recorded READY set it
+    loaded = not usingV2
+    parsers = bot._connection.parsers
+    lag = metrics.Histogram()
+    n = 0
+    start = time.monotonic()
+    for dt, t, data in read(fn):
+        if speed:
+            wait = start + dt / speed - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            lag.observe(max(0, -wait))
+        else:
+            await asyncio.sleep(0)  # let the handlers of the previous events start
+        if t not in parsers:
+            continue
+        if server:
+            rest.seed(t, data)
+        try:
+            parsers[t](data)
+        except Exception as e:
+            logger.exception('Could not parse {} event: {}'.format(t, e))
+        n += 1
+        if not loaded and bot.user is not None:
+            loaded = True
+            load_start = time.monotonic()
+            await bot.load_cogs()
+            start += time.monotonic() - load_start
+    if not loaded:
+        logger.warning('{} has no READY event, the cogs were not loaded'.format(fn))
+    # wait until the handlers are done, or give up after drain seconds
+    end = time.monotonic() + drain
+    while True:
+        await asyncio.sleep(0.05)
+        if not bot.metrics.active or time.monotonic() > end:
+            break
+    elapsed = time.monotonic() - start
+    out = _report(bot, n, elapsed, lag if speed else None, rest)
+    await bot.close()
+    if server:
+        await rest.stop()
+    return out
+
+
+def _report(bot, n, elapsed, lag, rest):
+    def ms(value):
+        return '-' if value is None else '{:.0f}'.format(value * 1000)
+
+    cogs = dict()  # cog name -> [calls, errors, rest, merged latencies]
+    for s in bot.metrics.handlers.values():
+        if s.kind == 'command':
+            command = bot.get_command(s.name)
+            cog = command.cog_name if command is not None and command.cog_name else 'MainBot'
+        else:
+            cog = s.name.split('.')[0]
+        entry = cogs.setdefault(cog, [0, 0, 0, metrics.Histogram()])
+        entry[0] += s.calls
+        entry[1] += s.errors
+        entry[2] += s.rest
+        entry[3].merge(s.latency)
+    out = ['Replayed {} events in {:.1f} s ({:.0f} events/s), {} REST requests'.format(
+           n, elapsed, n / max(elapsed, 1e-9), bot.metrics.rest)]
+    if lag is not None and lag.count:
+        out.append('Dispatch lag p50 {} ms, p95 {} ms, max {} ms'.format(
+            ms(lag.percentile(0.5)), ms(lag.percentile(0.95)), ms(lag.max)))
+    fmt = '{:16} {:>7} {:>8} {:>5} {:>6} {:>6} {:>6} {:>6} {:>6}'
+    out.append(fmt.format('cog', 'calls', 'calls/s', 'err', 'rest', 'p50', 'p95', 'p99', 'max ms'))
+    for cog, (calls, errors, requests, hist) in sorted(cogs.items(), key=lambda x: -x[1][3].total):
+        out.append(fmt.format(cog, calls, '{:.1f}'.format(calls / max(elapsed, 1e-9)), errors, requests,
+                              ms(hist.percentile(0.5)), ms(hist.percentile(0.95)), ms(hist.percentile(0.99)),
+                              ms(hist.max)))
+    if rest.requests:
+        out.append('REST routes:')
+        out.extend('{:7} {}'.format(count, route) for route, count in rest.requests.most_common())
+    return out
+
+
+def _run_copy(args):
+    """Run the replay with --in-place in a temporary copy of the bot directory,
+    returns its exit code"""
+    src = os.path.split(os.path.realpath(__file__))[0]
+    package = os.path.basename(src)
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(src, os.path.join(tmp, package),
+                    ignore=shutil.ignore_patterns('.git', 'logs', 'tests', '__pycache__'))
+    cmd = [sys.executable, '-m', package + '.replay', os.path.abspath(args.file), '--in-place',
+           '--latency', str(args.latency), '--drain', str(args.drain)]
+    if args.speed:
+        cmd += ['--speed', str(args.speed)]
+    if args.server:
+        cmd.append('--server')
+    if args.verbose:
+        cmd.append('--verbose')
+    try:
+        return subprocess.call(cmd, cwd=tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay recorded gateway events against the bot.')
+    parser.add_argument('file', help='recording made with the event_record param')
+    parser.add_argument('-s', '--speed', type=float, default=None,
+                        help='replay at this multiple of the recorded pace (default: as fast as possible)')
+    parser.add_argument('-l', '--latency', type=float, default=0.0,
+                        help='seconds each fake REST request takes')
+    parser.add_argument('--server', default=False, action='store_true',
+                        help='answer REST requests with a local fake_discord server')
+    parser.add_argument('-d', '--drain', type=float, default=10.0,
+                        help='seconds to wait for handlers still running at the end')
+    parser.add_argument('--in-place', default=False, action='store_true',
+                        help="use this bot directory's data files instead of a temporary copy")
+    parser.add_argument('-v', '--verbose', default=False, action='store_true')
+    args = parser.parse_args(argv)
+    if not args.in_place:
+        sys.exit(_run_copy(args))
+    from . import log_init
+    log_init.init_logging(verbose=args.verbose)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        out = loop.run_until_complete(replay(args.file, speed=args.speed, latency=args.latency,
+                                             drain=args.drain, server=args.server))
+    finally:
+        loop.close()
+    print('\n'.join(out))
+
+
+if __name__ == '__main__':
+    main()
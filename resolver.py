@@ -0,0 +1,130 @@
+"""Cached member/user lookups behind MainBot.get_or_fetch_user.
+
+Lookups that miss discord.py's own cache go through MemberResolver, which
+remembers both hits and misses for a while and shares one REST call between
+concurrent lookups of the same id. resolve_many uses the gateway member query
+(100 ids per request) instead of one fetch_member call per id."""
+import asyncio
+import discord  # type: ignore
+import logging
+import time
+
+
+logger = logging.getLogger('discord.' + __name__)
+_missing = object()
+_chunk = 100  # max user ids per gateway member query
+
+
+class MemberResolver:
+    """TTL cache with single-flight fetches for members (per guild) and users"""
+    def __init__(self, bot, ttl=600, miss_ttl=120):
+        self.bot = bot
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._cache = dict()    # (guild id or None, user id) -> (expires, member/user or None)
+        self._pending = dict()  # (guild id or None, user id) -> fetch task
+        self.hits = 0
+        self.fetches = 0
+        self.shared = 0
+
+    def _get(self, key):
+        try:
+            expires, value = self._cache[key]
+        except KeyError:
+            return _missing
+        if expires < time.monotonic():
+            del self._cache[key]
+            return _missing
+        return value
+
+    def _put(self, key, value):
+        ttl = self.ttl if value is not None else self.miss_ttl
+        self._cache[key] = time.monotonic() + ttl, value
+
+    def forget(self, user_id, guild=None):
+        """Drop cached results for a user (in all guilds if guild is None)"""
+        if guild is not None:
+            self._cache.pop((guild.id, user_id), None)
+            return
+        for key in [k for k in self._cache if k[1] == user_id]:
+            del self._cache[key]
+
+    def clear(self):
+        self._cache.clear()
+
+    def _local(self, user_id, guild):
+        """Lookup in discord.py's cache and then ours, no REST calls"""
+        if guild is not None:
+            out = guild.get_member(user_id)
+        else:
+            out = self.bot.get_user(user_id)
+        if out is not None:
+            return out
+        out = self._get((getattr(guild, 'id', None), user_id))
+        if out is not _missing:
+            self.hits += 1
+        return out
+
+    async def _fetch(self, user_id, guild):
+        key = getattr(guild, 'id', None), user_id
+        self.fetches += 1
+        try:
+            if guild is not None:
+                out = await guild.fetch_member(user_id)
+            else:
+                out = await self.bot.fetch_user(user_id)
+        except discord.NotFound:
+            out = None
+        except discord.HTTPException as e:
+            # don't remember transient failures
+            logger.info('Failed to fetch {} ({}): {}'.format(user_id, guild, e))
+            return None
+        self._put(key, out)
+        return out
+
+    async def resolve(self, user_id, guild=None):
+        """Return the member of guild (or user if guild is None) with the given id,
+        or None if there isn't one"""
+        out = self._local(user_id, guild)
+        if out is not _missing:
+            return out
+        key = getattr(guild, 'id', None), user_id
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(user_id, guild))
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._pending.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    async def resolve_many(self, ids, guild):
+        """Return a dict of id -> member (or None) for all ids, querying the
+        ones we don't know over the gateway in chunks"""
+        out = dict()
+        missing = []
+        for i in ids:
+            member = self._local(i, guild)
+            if member is _missing:
+                missing.append(i)
+            else:
+                out[i] = member
+        for n in range(0, len(missing), _chunk):
+            chunk = missing[n:n + _chunk]
+            try:
+                found = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=True)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                logger.info('Member query failed ({}), fetching one by one.'.format(e))
+                found = [m for m in await asyncio.gather(*[self.resolve(i, guild) for i in chunk])
+                         if m is not None]
+            self.fetches += 1
+            found = {m.id: m for m in found}
+            for i in chunk:
+                member = found.get(i)
+                self._put((guild.id, i), member)
+                out[i] = member
+        return out
+
+    def stats(self):
+        return dict(cached=len(self._cache), pending=len(self._pending), hits=self.hits,
+                    fetches=self.fetches, shared=self.shared)
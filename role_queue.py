@@ -0,0 +1,112 @@
+"""Per-member queue that merges role changes into single member.edit calls.
+
+Changes requested for a member within `delay` seconds of each other are
+collected, applied in the order they were requested (so the last add/remove of
+a role wins) and sent as one member.edit(roles=...). Edits for the same member
+never overlap, and nothing is sent if the final roles equal the current ones."""
+import asyncio
+import discord  # type: ignore
+import logging
+
+
+logger = logging.getLogger('discord.' + __name__)
+
+
+def _retrieve(future):
+    # most callers never await the future, the error was logged by _flush_later
+    if not future.cancelled():
+        future.exception()
+
+
+class _Pending:
+    def __init__(self, member):
+        self.member = member
+        self.changes = dict()  # role id -> (role, True to add / False to remove)
+        self.reasons = []
+        self.future = asyncio.get_event_loop().create_future()
+        self.future.add_done_callback(_retrieve)
+
+
+class RoleEditQueue:
+    def __init__(self, delay=1.0):
+        self.delay = delay
+        self._pending = dict()  # (guild id, member id) -> _Pending
+        self._locks = dict()    # (guild id, member id) -> asyncio.Lock, while the member has edits
+        self.requested = 0  # role additions/removals asked for (one API call each without the queue)
+        self.issued = 0     # member.edit calls made
+        self.skipped = 0    # flushes that needed no call
+
+    def change(self, member, add=(), remove=(), reason=None):
+        """Queue role changes for member (removes are applied before adds).
+        Returns a future with the member's final roles, or None if discord refused the edit
+        (other errors are set on the future)."""
+        key = member.guild.id, member.id
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = _Pending(member)
+            asyncio.ensure_future(self._flush_later(key))
+        entry.member = member
+        for role in remove:
+            entry.changes[role.id] = role, False
+        for role in add:
+            entry.changes[role.id] = role, True
+        if reason and reason not in entry.reasons:
+            entry.reasons.append(reason)
+        self.requested += len(add) + len(remove)
+        return entry.future
+
+    def add(self, member, *roles, reason=None):
+        return self.change(member, add=roles, reason=reason)
+
+    def remove(self, member, *roles, reason=None):
+        return self.change(member, remove=roles, reason=reason)
+
+    async def _flush_later(self, key):
+        await asyncio.sleep(self.delay)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                await self._flush(key)
+        finally:
+            # a flush waiting for the lock has its entry pending, otherwise nobody needs the lock
+            if key not in self._pending and self._locks.get(key) is lock:
+                del self._locks[key]
+
+    async def _flush(self, key):
+        entry = self._pending.pop(key)
+        # the future can be cancelled by one of the callers sharing it
+        try:
+            result = await self._apply(entry)
+        except discord.HTTPException as e:
+            logger.warning('Role edit for {} failed: {}'.format(entry.member, e))
+            result = None
+        except Exception as e:
+            # anything else is a bug, but whoever waits for the edit must not hang
+            logger.exception('Role edit for {} failed'.format(entry.member))
+            if not entry.future.done():
+                entry.future.set_exception(e)
+            return
+        if not entry.future.done():
+            entry.future.set_result(result)
+
+    async def _apply(self, entry):
+        member = entry.member
+        # prefer the cached member, it has the roles from the latest member update
+        member = member.guild.get_member(member.id) or member
+        current = {r.id: r for r in member.roles if not r.is_default()}
+        final = dict(current)
+        for role_id, (role, keep) in entry.changes.items():
+            if keep:
+                final[role_id] = role
+            else:
+                final.pop(role_id, None)
+        if final.keys() == current.keys():
+            self.skipped += 1
+            return member.roles
+        self.issued += 1
+        await member.edit(roles=list(final.values()), reason='; '.join(entry.reasons) or None)
+        return list(final.values())
+
+    def stats(self):
+        return dict(requested=self.requested, issued=self.issued, skipped=self.skipped,
+                    saved=self.requested - self.issued, pending=len(self._pending))
@@ -0,0 +1,176 @@
+"""Persistent job scheduler.
+
+Timed behavior (reminders, chron tasks, game timers) is scheduled here instead
+of in loose tasks sleeping until their time. Jobs live in a min-heap served by a
+single sleeping task and are saved to config/jobs.json, so they survive reboots.
+
+A job is a unique key, the name of a handler, a time and JSON-able keyword
+arguments. Cogs register their handlers by name (again after a reload) and
+jobs whose handler isn't registered yet wait for it. Scheduling an existing key
+replaces the job, or keeps it with replace=False, which makes re-scheduling on
+startup idempotent. catch_up is how late (in seconds) a job may still run, e.g.
+after downtime; None always runs it, once.
+
+    bot.scheduler.handler('events.alert', self._alert_job)
+    bot.scheduler.schedule('event:123:alert:60', 'events.alert', when, message_id=123)
+"""
+import asyncio
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from . import aio
+
+
+logger = logging.getLogger('discord.' + __name__)
+_fn = os.path.join(os.path.split(os.path.realpath(__file__))[0], 'config', 'jobs.json')
+_max_sleep = 3600  # wake up at least this often, clock changes can't stall us for long
+
+
+def timestamp(when):
+    """Epoch seconds of a datetime (naive ones are UTC), a timedelta from now, or a number"""
+    if isinstance(when, datetime.timedelta):
+        return time.time() + when.total_seconds()
+    if isinstance(when, datetime.datetime):
+        if when.tzinfo is None or when.tzinfo.utcoffset(when) is None:
+            when = when.replace(tzinfo=datetime.timezone.utc)
+        return when.timestamp()
+    return float(when)
+
+
+class Scheduler:
+    def __init__(self, fn=_fn):
+        self.fn = fn
+        self.jobs = dict()      # key -> dict(handler, when, catch_up, kwargs)
+        self._handlers = dict()  # handler name -> coroutine function
+        self._heap = []          # (when, seq, key), entries of replaced/cancelled jobs are skipped
+        self._seq = itertools.count()
+        self._wake = None
+        self._runner = None
+        self._save_pending = False
+        self.ran = 0
+        self.skipped = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.fn, 'r') as f:
+                self.jobs = json.load(f)
+        except IOError:
+            return
+        except ValueError as e:
+            logger.error('Could not read {}: {}'.format(self.fn, e))
+            return
+        for key, job in self.jobs.items():
+            heapq.heappush(self._heap, (job['when'], next(self._seq), key))
+
+    def _save(self):
+        # serialized here, the jobs can change while aio's disk threads write the file
+        self._save_pending = False
+        aio.write_soon(self.fn, json.dumps(self.jobs, indent=1))
+
+    def _changed(self):
+        # many jobs are often scheduled at once, write the file once for all of them
+        if not self._save_pending:
+            self._save_pending = True
+            asyncio.get_event_loop().call_soon(self._save)
+        if self._wake is not None:
+            self._wake.set()
+
+    def handler(self, name, func):
+        """Register the coroutine function run (with the job's kwargs) for jobs named name"""
+        self._handlers[name] = func
+        if self._wake is not None:
+            self._wake.set()
+
+    def schedule(self, key, handler, when, catch_up=None, replace=True, **kwargs):
+        """Schedule a job, returns False if replace is False and key is already scheduled"""
+        if key in self.jobs and not replace:
+            return False
+        job = dict(handler=handler, when=timestamp(when), catch_up=catch_up, kwargs=kwargs)
+        self.jobs[key] = job
+        heapq.heappush(self._heap, (job['when'], next(self._seq), key))
+        self._changed()
+        return True
+
+    def cancel(self, key):
+        """Cancel a job, returns whether it was scheduled"""
+        if self.jobs.pop(key, None) is None:
+            return False
+        self._changed()
+        return True
+
+    def cancel_prefix(self, prefix):
+        keys = [k for k in self.jobs if k.startswith(prefix)]
+        for key in keys:
+            del self.jobs[key]
+        if keys:
+            self._changed()
+        return len(keys)
+
+    def __contains__(self, key):
+        return key in self.jobs
+
+    def start(self):
+        if self._runner is None or self._runner.done():
+            self._wake = asyncio.Event()
+            self._runner = asyncio.ensure_future(self._run())
+
+    def _next(self):
+        """Return (time, key) of the next runnable job, dropping stale heap entries"""
+        waiting = []  # jobs whose handler isn't registered
+        out = None
+        while self._heap:
+            when, seq, key = self._heap[0]
+            job = self.jobs.get(key)
+            if job is None or job['when'] != when:
+                heapq.heappop(self._heap)
+                continue
+            if job['handler'] not in self._handlers:
+                waiting.append(heapq.heappop(self._heap))
+                continue
+            out = when, key
+            break
+        for item in waiting:
+            heapq.heappush(self._heap, item)
+        return out
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            item = self._next()
+            delay = _max_sleep if item is None else min(item[0] - time.time(), _max_sleep)
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            key = item[1]
+            job = self.jobs.pop(key)
+            self._changed()
+            late = time.time() - job['when']
+            if job['catch_up'] is not None and late > job['catch_up']:
+                self.skipped += 1
+                logger.info('Skipping job {} ({:.0f} s late)'.format(key, late))
+                continue
+            asyncio.ensure_future(self._call(key, job))
+
+    async def _call(self, key, job):
+        self.ran += 1
+        try:
+            await self._handlers[job['handler']](**job['kwargs'])
+        except Exception as e:
+            logger.exception('Job {} failed: {}'.format(key, e))
+
+    def stats(self):
+        pending = sorted(self.jobs.items(), key=lambda x: x[1]['when'])
+        nxt = None
+        if pending:
+            nxt = '{} in {:.0f} s'.format(pending[0][0], pending[0][1]['when'] - time.time())
+        return dict(pending=len(pending), ran=self.ran, skipped=self.skipped, next=nxt,
+                    handlers=len(self._handlers))
@@ -0,0 +1,32 @@
+"""The write-behind activity times of the Activity cog"""
+import asyncio
+import datetime
+import os
+import time
+import pytest
+
+pytest.importorskip('discord')
+from .. import aio  # noqa: E402
+from ..cogs.activity import _ActivityFile  # noqa: E402
+from ..helpers import epoch  # noqa: E402
+
+
+def test_close_writes_queued_updates(tmp_path):
+    fn = os.path.join(str(tmp_path), 'activity.dbm')
+
+    async def run():
+        data = _ActivityFile(fn, None)
+        for _ in range(aio.pool(aio.DISK).size):
+            aio.start(aio.DISK, time.sleep, 0.2)  # keep the disk threads busy
+        data.update_activity(1, epoch + datetime.timedelta(seconds=100))
+        data.flush()  # queued behind the sleeps
+        data.update_activity(2, epoch + datetime.timedelta(seconds=200))
+        assert data._queued and data._pending
+        data.close()
+        await aio.flush()  # the cancelled write doesn't run on the closed database
+        return data
+    data = asyncio.run(run())
+    assert data.closed and not data._queued
+    again = _ActivityFile(fn, None)
+    assert again.times == {1: 100, 2: 200}
+    again.close()
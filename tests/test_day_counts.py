@@ -0,0 +1,40 @@
+"""DayCounts in a temporary directory"""
+import time
+import pytest
+
+np = pytest.importorskip('numpy')
+from ..day_counts import DayCounts, MESSAGES, REACTIONS  # noqa: E402
+
+
+def test_counts_and_growth(tmp_path):
+    days = DayCounts(days=14, capacity=4, directory=str(tmp_path))
+    now = time.time()
+    for user_id in range(10):  # grows the files twice
+        days.add(user_id, when=now, n=user_id + 1)
+    days.add(3, REACTIONS, when=now - 8 * 86400)
+    assert days.counts.shape[0] == 16 and days.n == 10
+    assert days.totals(0, 1).tolist() == list(range(1, 11))
+    assert days.weekly(2, REACTIONS)[days.rows_of([3])[0]].tolist() == [0, 1]
+    days.flush()
+    days._sync()
+
+    again = DayCounts(days=14, directory=str(tmp_path))
+    assert again.n == 10 and again.counts.shape[0] == 16
+    assert again.totals(0, 1).tolist() == list(range(1, 11))
+    assert again.rows_of([9, 42]).tolist() == [9, -1]
+
+
+def test_history_boundaries(tmp_path):
+    days = DayCounts(days=14, directory=str(tmp_path))
+    days.add(1)  # counted live, sets the time of the last count
+    days.meta[2] -= 100  # counting started before that
+    days._sync()
+    last = int(days.meta[3])
+
+    days = DayCounts(days=14, directory=str(tmp_path))
+    days._open()
+    days.opened = last + 10
+    for t in [last - 1, last, last + 5, last + 10]:
+        days.add_history(2, t)
+    # the second of the last count is counted again, the time this run started belongs to it
+    assert days.totals(0, days.days, MESSAGES)[days.rows_of([2])[0]] == 2
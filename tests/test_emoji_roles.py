@@ -0,0 +1,54 @@
+"""Emoji role enrollments of MainBot across cog reloads"""
+import asyncio
+import types
+import pytest
+
+pytest.importorskip('discord')
+from .. import bot  # noqa: E402
+
+
+def _bot():
+    # just the enrollment bookkeeping, no client
+    b = object.__new__(bot.MainBot)
+    b._emoji_role_data = []
+    b._emoji_role_index = {}
+    b._emoji_role_cogs = {}
+    return b
+
+
+def _targets(b, message_id, emoji):
+    payload = types.SimpleNamespace(message_id=message_id, emoji=emoji)
+    return [args[0] for args, kwargs in b._emoji_role_targets(payload)]
+
+
+def test_reload_replaces_enrollments():
+    b = _bot()
+    old, new = types.SimpleNamespace(qualified_name='Games'), types.SimpleNamespace(qualified_name='Games')
+    b.enroll_emoji_role({'👍': 'old'}, message_id=1, cog=old)
+    b.enroll_emoji_role({'🏆': 'kept'}, message_id=1)
+    assert _targets(b, 1, '👍') == [{'👍': 'old'}]
+    b.drop_emoji_roles('Games')  # what remove_cog does when the cog is reloaded
+    b.enroll_emoji_role({'🎨': 'new'}, message_id=1, cog=new)
+    assert _targets(b, 1, '👍') == []
+    assert _targets(b, 1, '🎨') == [{'🎨': 'new'}]
+    assert _targets(b, 1, '🏆') == [{'🏆': 'kept'}]
+    assert len(b._emoji_role_data) == 2
+
+
+def test_remove_cog_drops_enrollments(monkeypatch):
+    b = _bot()
+    b.enroll_emoji_role({'👍': 'role'}, message_id=1, cog=types.SimpleNamespace(qualified_name='Games'))
+    removed = []
+
+    def remove_cog(self, name, **kwargs):
+        removed.append(name)
+    base = bot.commands.Bot
+    if bot.usingV2:
+        async def remove_cog_v2(self, name, **kwargs):
+            remove_cog(self, name)
+        monkeypatch.setattr(base, 'remove_cog', remove_cog_v2)
+        asyncio.run(b.remove_cog('Games'))
+    else:
+        monkeypatch.setattr(base, 'remove_cog', remove_cog)
+        b.remove_cog('Games')
+    assert removed == ['Games'] and b._emoji_role_index == {} and b._emoji_role_data == []
@@ -0,0 +1,55 @@
+"""Scheduled event alerts"""
+import asyncio
+import datetime
+import types
+import pytest
+
+pytest.importorskip('discord')
+from ..cogs import events  # noqa: E402
+
+
+class _Channel:
+    id = 1
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content, **kwargs):
+        self.sent.append(content)
+        return types.SimpleNamespace(id=len(self.sent), channel=self, content=content)
+
+
+def _event(starts_in):
+    channel = _Channel()
+    cog = types.SimpleNamespace(channel=channel, bot=types.SimpleNamespace(find_channel=lambda c: c))
+    event = events._Event.__new__(events._Event)
+    event.update(id=1, name='Raid', datetime=datetime.datetime.utcnow() + starts_in)
+    event.cog = cog
+    event.children = []
+    event.calls = []
+
+    async def attendees():
+        return []
+
+    async def make_stale():
+        event.calls.append('stale')
+    event.attendees = attendees
+    event.make_stale = make_stale
+    event.schedule_clear = lambda: event.calls.append('clear')
+    return event, channel
+
+
+@pytest.mark.parametrize('dt_min, eta, calls', [(0, 'is starting now.', ['stale', 'clear']),
+                                                (60, 'is starting in an hour.', [])])
+def test_late_scheduled_alert(dt_min, eta, calls):
+    # the job fires a few seconds after it was due
+    event, channel = _event(datetime.timedelta(minutes=dt_min, seconds=-3))
+    asyncio.run(event.alert(dt_min, wait=False))
+    assert channel.sent == ['Your event "Raid" ' + eta]
+    assert event.calls == calls
+
+
+def test_very_late_alert_says_what_is_left():
+    event, channel = _event(datetime.timedelta(minutes=30, seconds=10))
+    asyncio.run(event.alert(60, wait=False))
+    assert channel.sent == ['Your event "Raid" is starting in 30 minutes.']
@@ -0,0 +1,133 @@
+"""MemberJobs with in-memory members, saving to a temporary directory"""
+import asyncio
+import os
+import types
+import pytest
+
+pytest.importorskip('discord')
+from .. import member_jobs  # noqa: E402
+from ..role_queue import RoleEditQueue  # noqa: E402
+
+
+class _Role:
+    def __init__(self, role_id):
+        self.id = role_id
+        self.name = 'role {}'.format(role_id)
+
+    def is_default(self):
+        return self.id == 0
+
+
+class _Member:
+    def __init__(self, member_id, guild, roles):
+        self.id = member_id
+        self.guild = guild
+        self.roles = [guild.get_role(i) for i in [0] + roles]
+        self.edits = 0
+
+    async def edit(self, roles, reason=None):
+        await asyncio.sleep(0.01)
+        self.edits += 1
+        self.roles = [self.guild.get_role(0)] + roles
+
+    def __str__(self):
+        return 'member {}'.format(self.id)
+
+
+class _Guild:
+    id = 1
+
+    def __init__(self, n):
+        self.roles = {i: _Role(i) for i in range(4)}
+        self.members = {i: _Member(i, self, [1]) for i in range(n)}
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+
+def _jobs(tmp_path, guild, **kwargs):
+    bot = types.SimpleNamespace(get_guild=lambda i: guild, get_channel=lambda i: None,
+                                role_queue=RoleEditQueue(delay=0.01))
+    return member_jobs.MemberJobs(bot, fn=os.path.join(str(tmp_path), 'jobs'), **kwargs)
+
+
+def _ops(guild):
+    return [member_jobs.roles_op(m, add=[guild.get_role(2)], remove=[guild.get_role(1)])
+            for m in guild.members.values()]
+
+
+def test_plan_diff_run(tmp_path):
+    guild = _Guild(5)
+    guild.members[4].roles = [guild.get_role(0), guild.get_role(2)]  # nothing to do for this one
+    jobs = _jobs(tmp_path, guild)
+    job = jobs.plan(guild, 'test', _ops(guild))
+    assert jobs.diff(job)[0] == 'member 0: -role 1 +role 2'
+    assert job['id'] not in jobs.jobs  # dry runs aren't saved
+    job = asyncio.run(jobs.run(job))
+    assert job['state'] == member_jobs.FINISHED
+    assert jobs.counts(job)[member_jobs.DONE] == 4 and jobs.counts(job)[member_jobs.SKIPPED] == 1
+    assert all([r.id for r in m.roles] == [0, 2] for m in guild.members.values())
+    assert jobs.jobs[job['id']]['state'] == member_jobs.FINISHED
+    jobs.jobs.close()
+
+
+def test_cancel_and_resume(tmp_path):
+    guild = _Guild(20)
+    jobs = _jobs(tmp_path, guild, concurrency=1, rate=10, per=1.0)
+
+    async def run():
+        job = jobs.plan(guild, 'test', _ops(guild))
+        task = asyncio.ensure_future(jobs.run(job))
+        await asyncio.sleep(0.3)
+        jobs.cancel(job['id'])
+        cancelled = await task  # the job, not a CancelledError
+        assert cancelled['state'] == member_jobs.CANCELLED
+        assert 0 < jobs.counts(cancelled)[member_jobs.DONE] < 20
+        assert jobs.jobs[job['id']]['state'] == member_jobs.CANCELLED
+        return await jobs.run(job['id'])
+    job = asyncio.run(run())
+    assert job['state'] == member_jobs.FINISHED
+    assert jobs.counts(job)[member_jobs.DONE] == 20
+    assert all(m.edits == 1 for m in guild.members.values())
+    jobs.jobs.close()
+
+
+def test_merges_with_the_role_queue(tmp_path):
+    guild = _Guild(1)
+    member = guild.members[0]
+    jobs = _jobs(tmp_path, guild)
+
+    async def run():
+        # a role change queued elsewhere isn't overwritten by the job
+        other = jobs.bot.role_queue.add(member, guild.get_role(3))
+        job = await jobs.run(jobs.plan(guild, 'test', _ops(guild)))
+        await other
+        return job
+    job = asyncio.run(run())
+    assert jobs.counts(job)[member_jobs.DONE] == 1
+    assert sorted(r.id for r in member.roles) == [0, 2, 3]
+    assert member.edits == 1
+    jobs.jobs.close()
+
+
+def test_cancel_leaves_shared_edits_alone(tmp_path):
+    guild = _Guild(1)
+    member = guild.members[0]
+    jobs = _jobs(tmp_path, guild)
+    jobs.bot.role_queue.delay = 0.2
+
+    async def run():
+        job = jobs.plan(guild, 'test', _ops(guild))
+        task = asyncio.ensure_future(jobs.run(job))
+        other = jobs.bot.role_queue.add(member, guild.get_role(3))  # merged into the job's edit
+        await asyncio.sleep(0.1)
+        jobs.cancel(job['id'])
+        assert (await task)['state'] == member_jobs.CANCELLED
+        return await asyncio.wait_for(other, 1)
+    roles = asyncio.run(run())
+    assert sorted(r.id for r in roles) == [2, 3]
+    assert jobs.cancel('no such job') is None
+    jobs.jobs.close()
@@ -0,0 +1,82 @@
+"""Outbound against in-memory channels and against fake_discord"""
+import asyncio
+import time
+import types
+import pytest
+from .. import outbound
+
+
+class _Channel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = []  # (time, content)
+
+    async def send(self, content, **kwargs):
+        self.sent.append((time.monotonic(), content))
+        return types.SimpleNamespace(id=len(self.sent), channel=self, content=content)
+
+
+def test_priority_and_merging():
+    async def run():
+        out = outbound.Outbound()
+        channel = _Channel(1)
+        futures = [out.send(channel, 'fun 1'), out.send(channel, 'alert 1', priority=outbound.ALERT),
+                   out.send(channel, 'fun 2'), out.send(channel, 'alert 2', priority=outbound.ALERT),
+                   out.send(channel, 'not merged', priority=outbound.ALERT, merge=False)]
+        await asyncio.gather(*futures)
+        return [c for _, c in channel.sent], out.stats()
+    sent, stats = asyncio.run(run())
+    assert sent == ['alert 1\nalert 2', 'not merged', 'fun 1\nfun 2']
+    assert stats['sent'] == 3 and stats['merged'] == 2 and stats['queued'] == 0
+
+
+def test_bucket_outlives_the_queue():
+    async def run():
+        out = outbound.Outbound(rate=2, per=1.0)
+        channel = _Channel(1)
+        for i in range(4):
+            await out.send(channel, str(i))  # the queue drains after every message
+        return [t - channel.sent[0][0] for t, _ in channel.sent]
+    times = asyncio.run(run())
+    assert times[2] >= 0.4 and times[3] >= 0.9
+
+
+def test_rate_limit_headers():
+    async def run():
+        out = outbound.Outbound(rate=5, per=5.0)
+        channel = _Channel(1)
+        await out.send(channel, 'first')
+        out.rate_limit(1, 0, 0.3)
+        start = time.monotonic()
+        await out.send(channel, 'second')
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.25
+
+
+def test_fake_discord_headers():
+    discord = pytest.importorskip('discord')
+    from ..fake_discord import FakeDiscord, snowflake
+
+    guild_id, channel_id = str(snowflake()), str(snowflake())
+
+    async def run():
+        server = FakeDiscord(limits={'POST /channels/{channel_id}/messages': (2, 1.0)})
+        server.seed('GUILD_CREATE', dict(id=guild_id, name='test', roles=[], channels=[
+            dict(id=channel_id, type=0, name='general', position=0, permission_overwrites=[])]))
+        await server.start()
+        base = discord.http.Route.BASE
+        server.patch_discord()
+        client = discord.Client(intents=discord.Intents.none(), http_trace=outbound.trace_config())
+        try:
+            await client.login('token')
+            channel = await client.fetch_channel(int(channel_id))
+            await asyncio.gather(*[outbound.send(channel, str(i), merge=False) for i in range(3)])
+            bucket = outbound.scheduler()._queues[channel.id].bucket
+        finally:
+            await client.close()
+            await server.stop()
+        assert discord.http.Route.BASE == base
+        return server, bucket
+    server, bucket = asyncio.run(run())
+    assert server.requests['POST /channels/{channel_id}/messages'] == 3
+    assert bucket.reset > 0  # the window of two sends was used up
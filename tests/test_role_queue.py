@@ -0,0 +1,48 @@
+"""RoleEditQueue with in-memory members"""
+import asyncio
+import gc
+import pytest
+
+pytest.importorskip('discord')
+from .. import role_queue  # noqa: E402
+from ..role_queue import RoleEditQueue  # noqa: E402
+from .test_member_jobs import _Guild  # noqa: E402
+
+
+def test_role_queue_errors_reach_the_caller():
+    guild = _Guild(1)
+    member = guild.members[0]
+
+    async def edit(roles, reason=None):
+        raise RuntimeError('broken')
+    member.edit = edit
+
+    async def run():
+        queue = RoleEditQueue(delay=0.01)
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(queue.add(member, guild.get_role(2)), 1)
+    asyncio.run(run())
+
+
+def test_unawaited_errors_are_retrieved_and_locks_dropped(monkeypatch):
+    # captured log records would keep the future (through the traceback) alive
+    monkeypatch.setattr(role_queue.logger, 'disabled', True)
+    guild = _Guild(2)
+    member = guild.members[0]
+
+    async def edit(roles, reason=None):
+        raise RuntimeError('broken')
+    member.edit = edit
+    unretrieved = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        queue = RoleEditQueue(delay=0.01)
+        queue.add(member, guild.get_role(2))  # fire and forget, like emoji2role
+        await asyncio.wait_for(queue.add(guild.members[1], guild.get_role(2)), 1)
+        await asyncio.sleep(0.05)
+        return queue
+    queue = asyncio.run(run())
+    gc.collect()
+    assert not unretrieved
+    assert queue._locks == {} and queue._pending == {}
@@ -0,0 +1,35 @@
+"""Scheduler saving to a temporary directory"""
+import asyncio
+import os
+import time
+from .. import aio
+from ..scheduler import Scheduler
+
+
+def test_jobs_are_saved_and_run(tmp_path):
+    fn = os.path.join(str(tmp_path), 'jobs.json')
+
+    async def schedule():
+        s = Scheduler(fn)
+        s.schedule('soon', 'test.run', time.time() + 0.1, value=1)
+        s.schedule('late', 'test.run', time.time() - 60, catch_up=10, value=2)
+        await asyncio.sleep(0)  # the file is written once for both
+        await aio.flush()
+    asyncio.run(schedule())
+
+    ran = []
+
+    async def run():
+        s = Scheduler(fn)  # a reboot
+        assert set(s.jobs) == {'soon', 'late'}
+
+        async def handler(value):
+            ran.append(value)
+        s.handler('test.run', handler)
+        s.start()
+        await asyncio.sleep(0.3)
+        await aio.flush()
+        return s
+    s = asyncio.run(run())
+    assert ran == [1] and s.skipped == 1
+    assert Scheduler(fn).jobs == {}
@@ -0,0 +1,86 @@
+"""UserStore and UserConfig in a temporary directory"""
+import asyncio
+import gc
+import importlib
+import json
+import os
+import threading
+import time
+import types
+import pytest
+from .. import aio
+from .. import param
+from ..config import users
+
+store_module = importlib.import_module(users.__name__ + '.store')
+
+
+@pytest.fixture
+def user_store(tmp_path, monkeypatch):
+    s = store_module.UserStore(os.path.join(str(tmp_path), 'users.sqlite3'))
+    monkeypatch.setattr(store_module, '_store', s)
+    monkeypatch.setattr(users, '_dir', str(tmp_path))
+    yield s
+    s.close()
+
+
+def test_save_load_query(user_store):
+    user_store.save(1, store_module.encode(dict(score=3, name='a')))
+    user_store.save(2, store_module.encode(dict(score=5)))
+    user_store.save(3, store_module.encode(dict(other=True)))
+    assert user_store.load(1) == dict(score=3, name='a')
+    assert user_store.load(4) == dict()
+    assert user_store.values('score') == {1: 3, 2: 5}
+    assert user_store.top('score', 1) == [(2, 5)]
+    assert user_store.top('score', ascending=True) == [(1, 3), (2, 5)]
+    assert set(user_store.load_all('score')) == {1, 2}
+    user_store.save(1, store_module.encode(dict(name='b')))
+    assert user_store.load(1) == dict(name='b')
+
+
+def test_migrate_json(tmp_path, user_store):
+    with open(os.path.join(str(tmp_path), '7.json'), 'w') as f:
+        json.dump(dict(score=1), f)
+    with open(os.path.join(str(tmp_path), 'broken.json'), 'w') as f:
+        f.write('{')
+    assert user_store.migrate_json(str(tmp_path)) == 1
+    assert user_store.load(7) == dict(score=1)
+
+
+def test_queued_saves_are_loaded(user_store):
+    user = types.SimpleNamespace(id=5)
+
+    async def run():
+        for _ in range(aio.pool(aio.DISK).size):
+            aio.start(aio.DISK, time.sleep, 0.2)  # keep the disk threads busy
+        config = users.UserConfig(user)
+        config['score'] = 1
+        del config
+        gc.collect()
+        param.flush_all()
+        # the save is still queued, the new config has to see it anyway
+        config = users.UserConfig(user)
+        config['other'] = 2
+        del config
+        param.flush_all()
+        await aio.flush()
+        return await user_store.aload_all()
+    assert asyncio.run(run()) == {5: dict(score=1, other=2)}
+
+
+def test_aload_reads_on_disk_threads(user_store, monkeypatch):
+    user_store.save(6, store_module.encode(dict(score=4)))
+    user = types.SimpleNamespace(id=6)
+    threads = []
+    load = user_store.load
+
+    def record(user_id):
+        threads.append(threading.current_thread())
+        return load(user_id)
+    monkeypatch.setattr(user_store, 'load', record)
+
+    async def run():
+        config = await users.UserConfig.aload(user)
+        return config['score']
+    assert asyncio.run(run()) == 4
+    assert threads and threads[0] is not threading.main_thread()
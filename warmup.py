@@ -0,0 +1,135 @@
+"""Startup warm-up of the cogs.
+
+Instead of every cog sleeping in on_ready and then scanning history at the same
+moment, cogs register their init coroutines here with a priority and the names
+of the tasks they have to wait for. Once the bot is ready, Warmup runs them in
+priority order with a limited number in flight and a minimum interval between
+starts, so moderation comes up first and cosmetic history scans run last.
+
+    bot.warmup.register('spam_filter', self._async_init, priority=warmup.MODERATION)
+"""
+import asyncio
+import itertools
+import logging
+import time
+
+
+logger = logging.getLogger('discord.' + __name__)
+
+# priorities, lower goes first
+MODERATION = 0
+CORE = 1
+GAME = 2
+COSMETIC = 3
+
+PENDING = 'pending'
+RUNNING = 'running'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class _Task:
+    def __init__(self, name, func, priority, after, order):
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.after = list(after)
+        self.order = order
+        self.state = PENDING
+        self.started = None
+        self.duration = None
+
+
+class Warmup:
+    def __init__(self, concurrency=2, interval=0.5, settle=2.0):
+        self.concurrency = concurrency
+        self.interval = interval  # minimum seconds between task starts
+        self.settle = settle      # seconds to wait after the first on_ready
+        self.tasks = dict()       # name -> _Task
+        self._order = itertools.count()
+        self._settled = False
+        self._runner = None
+        self._changed = None
+        self._active = 0
+        self._last_start = 0
+
+    def register(self, name, func, priority=CORE, after=()):
+        """Register (or replace, e.g. after a cog reload) the init coroutine function `func`,
+        to be run once the tasks named in `after` are finished"""
+        old = self.tasks.get(name)
+        if old is not None and old.state == RUNNING:
+            logger.warning('Warm-up task {} replaced while running'.format(name))
+        self.tasks[name] = _Task(name, func, priority, after, next(self._order))
+        if self._changed is not None:
+            self._changed.set()
+
+    def state(self, name):
+        task = self.tasks.get(name)
+        return task.state if task else None
+
+    def ready(self, name):
+        return self.state(name) == READY
+
+    def _done(self, name):
+        # tasks of cogs that aren't loaded never hold up the others
+        task = self.tasks.get(name)
+        return task is None or task.state in [READY, FAILED]
+
+    def _runnable(self):
+        return [t for t in self.tasks.values()
+                if t.state == PENDING and all(self._done(i) for i in t.after)]
+
+    def start(self):
+        """Run the pending tasks in the background (called when the bot is ready)"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.ensure_future(self._run())
+        return self._runner
+
+    async def _run(self):
+        self._changed = asyncio.Event()
+        slots = asyncio.Semaphore(self.concurrency)
+        if not self._settled:
+            await asyncio.sleep(self.settle)
+            self._settled = True
+        while True:
+            if not self._runnable():
+                if not self._active:
+                    break
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            await slots.acquire()
+            runnable = self._runnable()
+            if not runnable:
+                slots.release()
+                continue
+            wait = self._last_start + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            task = min(runnable, key=lambda t: (t.priority, t.order))
+            task.state = RUNNING
+            task.started = self._last_start = time.monotonic()
+            self._active += 1
+            asyncio.ensure_future(self._run_task(task, slots))
+        stuck = [t.name for t in self.tasks.values() if t.state == PENDING]
+        if stuck:
+            logger.warning('Warm-up tasks waiting on each other: ' + ', '.join(stuck))
+        logger.info('Warm-up finished')
+
+    async def _run_task(self, task, slots):
+        try:
+            await task.func()
+            task.state = READY
+        except Exception as e:
+            task.state = FAILED
+            logger.exception('Warm-up task {} failed: {}'.format(task.name, e))
+        finally:
+            task.duration = time.monotonic() - task.started
+            self._active -= 1
+            slots.release()
+            self._changed.set()
+
+    def status(self):
+        """List of (name, state, seconds taken) in the order the tasks run"""
+        tasks = sorted(self.tasks.values(), key=lambda t: (t.priority, t.order))
+        return [(t.name, t.state, t.duration) for t in tasks]
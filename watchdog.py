@@ -0,0 +1,117 @@
+"""Event loop stall detector.
+
+A heartbeat task wakes up every `interval` seconds and records how late it
+was in the loop lag histogram of the metrics. A thread watches the heartbeat:
+once it is `threshold` seconds overdue the loop is blocked, and the thread
+captures the stack of the loop's thread right then, which is the blocking call
+and the coroutine it was made from. When the loop gets going again the stall
+is logged and reported to the log channel, at most once per `cooldown`
+seconds (stalls in between are counted in the next report).
+
+    bot.watchdog = Watchdog(bot)
+    bot.watchdog.start()
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from . import metrics
+from . import outbound
+from . import param
+from .async_helpers import split_send
+
+
+logger = logging.getLogger('discord.' + __name__)
+_frames = 12  # innermost stack frames reported
+
+
+class Watchdog:
+    def __init__(self, bot, threshold=0.5, interval=0.1, cooldown=600):
+        self.bot = bot
+        self.threshold = threshold
+        self.interval = interval
+        self.cooldown = cooldown
+        self.stalls = 0
+        self.worst = 0.0
+        self._stamp = time.monotonic()  # when the heartbeat last ran
+        self._captured = None           # (task, stack) of the current stall
+        self._suppressed = 0
+        self._last_report = 0
+        self._loop = None
+        self._loop_thread = None
+        self._thread = None
+        self._beat = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start watching the running loop (no-op if already watching it)"""
+        loop = asyncio.get_event_loop()
+        if self._loop is loop and self._beat is not None and not self._beat.done():
+            return
+        self.stop()
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._stamp = time.monotonic()
+        self._stop = threading.Event()
+        self._beat = asyncio.ensure_future(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._beat is not None:
+            self._beat.cancel()
+            self._beat = None
+
+    async def _heartbeat(self):
+        lag_hist = metrics.registry().loop_lag
+        while True:
+            self._stamp = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - self._stamp - self.interval
+            lag_hist.observe(max(lag, 0))
+            captured, self._captured = self._captured, None
+            if lag > self.threshold:
+                await self._stalled(lag, captured)
+
+    def _watch(self):
+        # runs in its own thread, so it sees the loop while it's blocked
+        while not self._stop.wait(self.interval):
+            if self._captured is not None:
+                continue
+            if time.monotonic() - self._stamp - self.interval > self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is None:
+                    continue
+                stack = traceback.format_stack(frame)[-_frames:]
+                try:
+                    task = asyncio.current_task(self._loop)
+                except RuntimeError:
+                    task = None
+                self._captured = repr(task) if task is not None else 'a callback', ''.join(stack)
+
+    async def _stalled(self, lag, captured):
+        self.stalls += 1
+        self.worst = max(self.worst, lag)
+        metrics.registry().stalls += 1
+        task, stack = captured or ('unknown', 'stack not captured\n')
+        logger.warning('Event loop blocked for {:.2f} s in {}:\n{}'.format(lag, task, stack))
+        now = time.monotonic()
+        if now - self._last_report < self.cooldown:
+            self._suppressed += 1
+            return
+        self._last_report = now
+        channel = self.bot.find_channel(param.rc('log_channel'))
+        if channel is None:
+            return
+        msg = 'Event loop blocked for {:.2f} s in {}'.format(lag, task[:200])
+        if self._suppressed:
+            msg += ' ({} more stalls since the last report)'.format(self._suppressed)
+        self._suppressed = 0
+        try:
+            await outbound.send(channel, msg, priority=outbound.ALERT, merge=False)
+            await split_send(channel, stack, style='```', priority=outbound.ALERT)
+        except Exception as e:
+            logger.error('Could not report the stall: {}'.format(e))